@@ -1,28 +1,56 @@
+import time
+
+# 启动计时起点，用于统计导入耗时与首个窗口出现时间
+_STARTUP_T0 = time.perf_counter()
+
 import sys
 import os
-import io
+import json
+import platform
+import threading
 import ctypes
 from PySide6.QtWidgets import (
     QApplication, QWidget, QVBoxLayout, QHBoxLayout,
-    QPushButton, QListWidget, QListWidgetItem, QFileDialog,
-    QMessageBox, QLabel, QTextEdit, QProgressBar, QSpacerItem, QSizePolicy
+    QPushButton, QListView, QAbstractItemView, QFileDialog,
+    QMessageBox, QLabel, QTextEdit, QProgressBar, QSpacerItem, QSizePolicy, QSpinBox
 )
-from PySide6.QtCore import Qt, QThread, Signal, QPoint, QRectF
+from PySide6.QtCore import Qt, QThread, Signal, QPoint, QRectF, QTimer, QAbstractListModel, QModelIndex
 from PySide6.QtGui import (
     QFont, QColor, QPainter, QBrush, QPen, QIcon, QAction, QCursor,
     QPainterPath, QRegion
 )
-from pptx import Presentation
-from pptx.enum.shapes import MSO_SHAPE_TYPE
-from PIL import Image
-import pytesseract
-import torch
-from pix2tex.cli import LatexOCR
+# 识别核心不依赖GUI，extract_text_from_pptx 等在此重新导出以兼容旧的导入方式
+from ocr_core import (
+    get_cache, extract_text_from_pptx, ocr_image_multilang_with_latex,
+    make_scheduler, DEFAULT_MAX_WORKERS,
+)
+from ocr_scheduler import PRIORITY_URGENT, PRIORITY_NORMAL
+from ocr_server import DEFAULT_SERVER_URL, JobClient
+from ocr_models import get_latex_model, latex_model_load_seconds
+from ocr_metrics import metrics, DEFAULT_METRICS_PATH
+from ocr_output import build_document, slide_record, export_to_directory, export_combined_jsonl
+
+# 模块导入完成时间（torch、pix2tex、python-pptx 均已推迟到首次使用）
+_STARTUP_IMPORTED = time.perf_counter()
+
+# 进度条中每个文件占用的格数，用于显示文件内的逐页进度
+PROGRESS_STEPS = 100
 
+# 识别服务中的任务状态在列表中的显示
+REMOTE_STATUS = {"queued": "服务排队中", "running": "服务识别中..."}
 
-# 初始化pix2tex LatexOCR模型
-pix2tex_model = LatexOCR()
-device = torch.device('cuda' if torch.cuda.is_available() else 'cpu')
+# 文件状态：已结束的状态计入进度，可重新识别的状态在开始识别时加入队列
+STATUS_PENDING = "待处理"
+STATUS_DONE = "完成"
+STATUS_FAILED = "失败"
+STATUS_CANCELLED = "已取消"
+FINAL_STATUSES = (STATUS_DONE, STATUS_FAILED, STATUS_CANCELLED)
+RUNNABLE_STATUSES = (STATUS_PENDING, STATUS_CANCELLED)
+
+# 文件列表与进度条的刷新间隔（毫秒），期间的状态变化合并为一次刷新
+LIST_REFRESH_MS = 100
+# 移除选中文件时，不连续的区段超过该数量则整体重置列表
+REMOVE_RESET_RANGES = 32
 
 
 def enable_blur_behind_window(win):
@@ -51,77 +79,316 @@ def enable_blur_behind_window(win):
     dwmapi.DwmEnableBlurBehindWindow(hwnd, ctypes.byref(blur_behind))
 
 
-def ocr_image_multilang_with_latex(img: Image.Image) -> str:
-    """对图片进行OCR和LaTeX公式识别"""
-    try:
-        text_ocr = pytesseract.image_to_string(img, lang='eng+chi_sim')
-    except Exception:
-        text_ocr = ""
-
-    try:
-        latex_text = pix2tex_model(img)
-    except Exception:
-        latex_text = ""
-
-    combined = ""
-    if text_ocr.strip():
-        combined += "[OCR Text]\n" + text_ocr.strip() + "\n"
-    if latex_text.strip():
-        combined += "[LaTeX OCR]\n" + latex_text.strip() + "\n"
+class WorkerThread(QThread):
+    """驱动全局工作池处理一批文件，按图片粒度调度"""
+    progress = Signal(str, str)            # filepath, status message
+    slide_progress = Signal(str, int, int)  # filepath, done slides, total slides
+    document_ready = Signal(str, object)   # filepath, structured result
+    finished = Signal(str, str)            # filepath, recognized text
+    cancelled = Signal(str)                # filepath，因取消而未处理完
+    error = Signal(str)                    # error message
+    metrics_ready = Signal(object)         # 本批次的指标汇总行
+
+    def __init__(self, filepaths: list, max_workers: int = DEFAULT_MAX_WORKERS, priorities=None):
+        super().__init__()
+        self.filepaths = filepaths
+        self.priorities = priorities or {}
+        self.scheduler = make_scheduler(max_workers)
+        self._stop_remote = threading.Event()
+        self._lock = threading.Lock()
+        self._slides = {}   # filepath -> 结构化逐页结果
+        self._started = {}  # filepath -> 开始处理的时间
+        self._failed = set()
 
-    return combined.strip()
+    def run(self):
+        # 设置了 PPTEXOCR_SERVER 时交给识别服务处理
+        if DEFAULT_SERVER_URL:
+            self.run_remote(JobClient(DEFAULT_SERVER_URL))
+            return
+        # 每批重新统计，结束后汇总到日志并按需写入指标文件
+        metrics.reset()
+        self.scheduler.run(
+            self.filepaths,
+            on_progress=self.on_progress,
+            on_finished=self.on_finished,
+            on_error=self.on_error,
+            on_slide=self.on_slide,
+            on_cancelled=self.on_cancelled,
+            priorities=self.priorities,
+        )
+        if DEFAULT_METRICS_PATH:
+            try:
+                metrics.write(DEFAULT_METRICS_PATH)
+            except OSError as e:
+                self.error.emit(f"指标文件写入失败: {e}")
+        self.metrics_ready.emit(metrics.summary_lines())
+
+    def run_remote(self, client):
+        """提交到识别服务并轮询结果，发出的信号与本地处理相同"""
+        job_paths = {}
+        try:
+            urgent = [p for p in self.filepaths if p in self.priorities]
+            normal = [p for p in self.filepaths if p not in self.priorities]
+            for group, priority in ((urgent, PRIORITY_URGENT), (normal, PRIORITY_NORMAL)):
+                if group:
+                    job_paths.update(zip(client.submit(group, priority), group))
+        except (OSError, RuntimeError) as e:
+            self.error.emit(f"无法提交到识别服务 {DEFAULT_SERVER_URL}: {e}")
+            for path in self.filepaths:
+                if path not in job_paths.values():
+                    self.finished.emit(path, "")
+        done = set()
+
+        def on_status(job_id, status):
+            self.progress.emit(job_paths[job_id], REMOTE_STATUS.get(status, status))
+
+        def on_done(job_id, job):
+            done.add(job_id)
+            path = job_paths[job_id]
+            if job["status"] == "done":
+                if job.get("document") is not None:
+                    self.document_ready.emit(path, job["document"])
+                self.finished.emit(path, job.get("text") or "")
+            elif job["status"] == "cancelled":
+                self.cancelled.emit(path)
+            else:
+                self.error.emit(f"文件 {os.path.basename(path)} 识别失败: {job.get('error')}")
+                self.finished.emit(path, "")
 
+        try:
+            client.wait(list(job_paths), on_done, on_status, stop=self._stop_remote)
+        except (OSError, RuntimeError) as e:
+            self.error.emit(f"与识别服务的连接中断: {e}")
+        # 取消或连接中断时，未结束的任务在服务端取消
+        for job_id, path in job_paths.items():
+            if job_id not in done:
+                client.cancel(job_id)
+                self.cancelled.emit(path)
+
+    def cancel(self):
+        """在界面线程调用：未开始的文件与图片不再处理，正在识别的图片完成后结束"""
+        self._stop_remote.set()
+        self.scheduler.cancel()
+
+    def set_priority(self, path, priority):
+        self.scheduler.set_priority(path, priority)
+
+    # 以下回调在工作池线程中执行，只通过信号与界面交互
+    def on_progress(self, path, msg):
+        with self._lock:
+            first = path not in self._started
+            self._started.setdefault(path, time.perf_counter())
+        if first:
+            metrics.inc("files")
+        self.progress.emit(path, msg)
+
+    def on_error(self, path, e):
+        with self._lock:
+            self._failed.add(path)
+        self.error.emit(f"文件 {os.path.basename(path)} 识别失败: {e}")
+
+    def on_slide(self, path, slide_idx, slide_count, results):
+        with self._lock:
+            self._slides.setdefault(path, []).append(slide_record(slide_idx, results))
+        self.slide_progress.emit(path, slide_idx + 1, slide_count)
+
+    def on_finished(self, path, text):
+        with self._lock:
+            slides = self._slides.pop(path, [])
+            started = self._started.pop(path, time.perf_counter())
+            failed = path in self._failed or not text
+        peak_rss = self.scheduler.peak_rss(path)
+        metrics.observe("file_seconds", time.perf_counter() - started)
+        metrics.observe("file_peak_rss_bytes", peak_rss)
+        if failed:
+            metrics.inc("files_failed")
+        if text:
+            self.document_ready.emit(path, build_document(path, slides, (time.perf_counter() - started) * 1000,
+                                                          peak_rss))
+        self.finished.emit(path, text)
+
+    def on_cancelled(self, path):
+        with self._lock:
+            self._slides.pop(path, None)
+            self._started.pop(path, None)
+        metrics.inc("files_cancelled")
+        self.cancelled.emit(path)
+
+
+class FileListModel(QAbstractListModel):
+    """文件列表：按路径索引行，按状态计数，状态变化定时合并刷新
+
+    添加、查找与更新状态均为常数时间，数万个文件排队时界面也不会卡顿。
+    """
+    refreshed = Signal()  # 合并刷新完成，界面据此更新进度
+
+    def __init__(self, parent=None):
+        super().__init__(parent)
+        self._rows = []       # [filepath, status, recognized_text]
+        self._index = {}      # filepath -> 行号
+        self._counts = {}     # status -> 文件数
+        self._dirty = set()   # 待刷新显示的文件
+        self.urgent = set()   # 优先处理的文件
+        self._timer = QTimer(self)
+        self._timer.setSingleShot(True)
+        self._timer.setInterval(LIST_REFRESH_MS)
+        self._timer.timeout.connect(self.flush)
+
+    def rowCount(self, parent=QModelIndex()):
+        return 0 if parent.isValid() else len(self._rows)
+
+    def data(self, index, role=Qt.DisplayRole):
+        if not index.isValid() or index.row() >= len(self._rows):
+            return None
+        filepath, status, _ = self._rows[index.row()]
+        if role == Qt.DisplayRole:
+            mark = "[优先] " if filepath in self.urgent else ""
+            return f"{mark}{os.path.basename(filepath)}  [{status}]"
+        if role == Qt.ToolTipRole:
+            return filepath
+        return None
+
+    def _count(self, status, delta):
+        count = self._counts.get(status, 0) + delta
+        if count:
+            self._counts[status] = count
+        else:
+            self._counts.pop(status, None)
 
-def extract_text_from_pptx(path: str) -> str:
-    """提取pptx中的文本及对图片进行OCR识别"""
-    prs = Presentation(path)
-    all_text = []
+    def count(self, *statuses) -> int:
+        return sum(self._counts.get(status, 0) for status in statuses)
 
-    for slide_idx, slide in enumerate(prs.slides):
-        slide_texts = []
+    def done_count(self) -> int:
+        return self.count(*FINAL_STATUSES)
 
-        for shape in slide.shapes:
-            if shape.shape_type == MSO_SHAPE_TYPE.TEXT_BOX or shape.has_text_frame:
-                text_frame = shape.text_frame
-                if text_frame:
-                    texts = [p.text for p in text_frame.paragraphs if p.text.strip()]
-                    slide_texts.extend(texts)
+    def row_of(self, filepath) -> int:
+        return self._index.get(filepath, -1)
 
-            elif shape.shape_type == MSO_SHAPE_TYPE.PICTURE:
-                image = shape.image
-                image_bytes = image.blob
-                try:
-                    img = Image.open(io.BytesIO(image_bytes))
-                    ocr_result = ocr_image_multilang_with_latex(img)
-                    if ocr_result:
-                        slide_texts.append(ocr_result)
-                except Exception as e:
-                    slide_texts.append(f"[Error OCR Image: {e}]")
+    def path(self, row) -> str:
+        return self._rows[row][0]
 
-        if slide_texts:
-            all_text.append(f"--- Slide {slide_idx + 1} ---")
-            all_text.extend(slide_texts)
+    def status(self, filepath):
+        row = self._index.get(filepath)
+        return None if row is None else self._rows[row][1]
 
-    return "\n".join(all_text)
+    def text(self, filepath) -> str:
+        row = self._index.get(filepath)
+        return "" if row is None else self._rows[row][2]
 
+    def entries(self):
+        """按列表顺序的 (filepath, status, text)"""
+        return (tuple(row) for row in self._rows)
 
-class WorkerThread(QThread):
-    progress = Signal(str, str)  # filepath, status message
-    finished = Signal(str, str)  # filepath, recognized text
-    error = Signal(str)          # error message
-
-    def __init__(self, filepath: str):
-        super().__init__()
-        self.filepath = filepath
+    def add_files(self, files) -> int:
+        """追加未在列表中的文件，一次插入，返回新增数量"""
+        new, seen = [], set()
+        for f in files:
+            if f not in self._index and f not in seen:
+                seen.add(f)
+                new.append(f)
+        if not new:
+            return 0
+        first = len(self._rows)
+        self.beginInsertRows(QModelIndex(), first, first + len(new) - 1)
+        for row, f in enumerate(new, first):
+            self._rows.append([f, STATUS_PENDING, ""])
+            self._index[f] = row
+        self.endInsertRows()
+        self._count(STATUS_PENDING, len(new))
+        return len(new)
+
+    def remove_rows(self, rows):
+        """移除若干行：按连续区段移除，区段过多时整体重置，最后统一重建行号索引"""
+        rows = sorted(set(rows))
+        if not rows:
+            return
+        ranges = []
+        for row in rows:
+            if ranges and ranges[-1][1] == row - 1:
+                ranges[-1][1] = row
+            else:
+                ranges.append([row, row])
+        for row in rows:
+            filepath, status, _ = self._rows[row]
+            del self._index[filepath]
+            self._count(status, -1)
+            self.urgent.discard(filepath)
+            self._dirty.discard(filepath)
+        if len(ranges) > REMOVE_RESET_RANGES:
+            removed = set(rows)
+            self.beginResetModel()
+            self._rows = [entry for row, entry in enumerate(self._rows) if row not in removed]
+            self.endResetModel()
+        else:
+            for first, last in reversed(ranges):
+                self.beginRemoveRows(QModelIndex(), first, last)
+                del self._rows[first:last + 1]
+                self.endRemoveRows()
+        for row in range(rows[0], len(self._rows)):
+            self._index[self._rows[row][0]] = row
+
+    def set_status(self, filepath, status, text=None) -> bool:
+        """更新状态（及识别文本），显示在下次刷新时更新；文件不在列表中时返回False"""
+        row = self._index.get(filepath)
+        if row is None:
+            return False
+        entry = self._rows[row]
+        if entry[1] != status:
+            self._count(entry[1], -1)
+            self._count(status, 1)
+            entry[1] = status
+        if text is not None:
+            entry[2] = text
+        self.mark_dirty(filepath)
+        return True
+
+    def set_urgent(self, filepath, urgent: bool):
+        if urgent:
+            self.urgent.add(filepath)
+        else:
+            self.urgent.discard(filepath)
+        self.mark_dirty(filepath)
+
+    def mark_dirty(self, filepath=None):
+        """登记需要刷新的文件（不指定时只刷新进度），合并到下次定时刷新"""
+        if filepath is not None:
+            self._dirty.add(filepath)
+        if not self._timer.isActive():
+            self._timer.start()
+
+    def flush(self):
+        """把积累的状态变化一次性通知视图：只发一个覆盖所有变化行的 dataChanged"""
+        self._timer.stop()
+        rows = [self._index[f] for f in self._dirty if f in self._index]
+        self._dirty.clear()
+        if rows:
+            self.dataChanged.emit(self.index(min(rows)), self.index(max(rows)), [Qt.DisplayRole])
+        self.refreshed.emit()
+
+
+class ModelLoaderThread(QThread):
+    """后台预热公式模型，界面在加载期间保持可交互"""
+    loaded = Signal(float)  # 加载耗时（秒）
+    failed = Signal(str)    # error message
 
     def run(self):
         try:
-            self.progress.emit(self.filepath, "识别中...")
-            text = extract_text_from_pptx(self.filepath)
-            self.finished.emit(self.filepath, text)
+            get_latex_model()
         except Exception as e:
-            self.error.emit(f"文件 {os.path.basename(self.filepath)} 识别失败: {e}")
-            self.finished.emit(self.filepath, "")
+            self.failed.emit(str(e))
+            return
+        self.loaded.emit(latex_model_load_seconds() or 0.0)
+
+
+def startup_report(first_window_time: float) -> dict:
+    """启动耗时报告：模块导入耗时与首个窗口出现耗时（毫秒）"""
+    return {
+        "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "import_ms": round((_STARTUP_IMPORTED - _STARTUP_T0) * 1000, 1),
+        "first_window_ms": round((first_window_time - _STARTUP_T0) * 1000, 1),
+        "python": platform.python_version(),
+        "platform": sys.platform,
+    }
 
 
 class PPTOCRApp(QWidget):
@@ -134,8 +401,12 @@ class PPTOCRApp(QWidget):
         self.resize(900, 680)
         self.dragPos = QPoint()
 
-        self.file_list = []  # [filepath, status, recognized_text]
-        self.threads = []
+        self.file_model = FileListModel(self)  # 文件、状态与识别文本
+        self.file_model.refreshed.connect(self.update_progress)
+        self.worker = None
+        self.model_loader = None
+        self.slide_fraction = {}  # filepath -> 当前文件已完成页的比例，用于文件内进度
+        self.documents = {}       # filepath -> 结构化结果，用于JSON导出
 
         self.setAcceptDrops(True)  # 支持拖放
 
@@ -194,9 +465,14 @@ class PPTOCRApp(QWidget):
         self.btn_add = QPushButton("添加PPT文件")
         self.btn_remove = QPushButton("移除选中文件")
         self.btn_start = QPushButton("开始识别")
+        self.btn_cancel = QPushButton("取消识别")
+        self.btn_priority = QPushButton("设为优先")
         self.btn_export = QPushButton("导出选中文本")
+        self.btn_export_all = QPushButton("全部导出到目录")
+        self.btn_export_jsonl = QPushButton("导出为JSONL")
 
-        for btn in (self.btn_add, self.btn_remove, self.btn_start, self.btn_export):
+        for btn in (self.btn_add, self.btn_remove, self.btn_start, self.btn_cancel, self.btn_priority,
+                    self.btn_export, self.btn_export_all, self.btn_export_jsonl):
             btn.setMinimumHeight(36)
             btn.setCursor(Qt.PointingHandCursor)
             btn.setFont(QFont("Segoe UI", 11))
@@ -204,12 +480,29 @@ class PPTOCRApp(QWidget):
         btn_layout.addWidget(self.btn_add)
         btn_layout.addWidget(self.btn_remove)
         btn_layout.addWidget(self.btn_start)
+        btn_layout.addWidget(self.btn_cancel)
+        btn_layout.addWidget(self.btn_priority)
         btn_layout.addWidget(self.btn_export)
-
-        # 文件列表
-        self.list_widget = QListWidget()
-        self.list_widget.setSelectionMode(QListWidget.SelectionMode.ExtendedSelection)
-        self.list_widget.setFont(QFont("Segoe UI", 10))
+        btn_layout.addWidget(self.btn_export_all)
+        btn_layout.addWidget(self.btn_export_jsonl)
+
+        # 并发数：全局工作池的线程上限
+        self.workers_label = QLabel("并发数")
+        self.workers_label.setFont(QFont("Segoe UI", 11))
+        self.spin_workers = QSpinBox()
+        self.spin_workers.setRange(1, max(1, os.cpu_count() or 1))
+        self.spin_workers.setValue(min(DEFAULT_MAX_WORKERS, self.spin_workers.maximum()))
+        self.spin_workers.setMinimumHeight(36)
+        self.spin_workers.setToolTip("同时处理的图片任务数")
+        btn_layout.addWidget(self.workers_label)
+        btn_layout.addWidget(self.spin_workers)
+
+        # 文件列表：统一行高，视图只计算可见行
+        self.list_view = QListView()
+        self.list_view.setModel(self.file_model)
+        self.list_view.setSelectionMode(QAbstractItemView.SelectionMode.ExtendedSelection)
+        self.list_view.setUniformItemSizes(True)
+        self.list_view.setFont(QFont("Segoe UI", 10))
 
         # 状态区
         self.status_label = QLabel("准备就绪")
@@ -227,7 +520,7 @@ class PPTOCRApp(QWidget):
 
         main_layout.addWidget(self.title_bar, stretch=0)
         main_layout.addLayout(btn_layout)
-        main_layout.addWidget(self.list_widget, stretch=1)
+        main_layout.addWidget(self.list_view, stretch=1)
         main_layout.addWidget(self.status_label)
         main_layout.addWidget(self.progress_bar)
         main_layout.addWidget(QLabel("识别日志："))
@@ -237,7 +530,14 @@ class PPTOCRApp(QWidget):
         self.btn_add.clicked.connect(self.on_add_files_button_clicked)
         self.btn_remove.clicked.connect(self.remove_selected_files)
         self.btn_start.clicked.connect(self.start_recognition)
+        self.btn_cancel.clicked.connect(self.cancel_recognition)
+        self.btn_priority.clicked.connect(self.toggle_priority)
+        self.btn_cancel.setEnabled(False)
+        self.btn_cancel.setToolTip("停止识别：未开始的文件与图片不再处理")
+        self.btn_priority.setToolTip("选中文件优先处理，再次点击取消；识别过程中也可调整")
         self.btn_export.clicked.connect(self.export_selected_texts)
+        self.btn_export_all.clicked.connect(self.export_all_to_directory)
+        self.btn_export_jsonl.clicked.connect(self.export_all_to_jsonl)
 
     def apply_glass_style(self):
         """
@@ -259,8 +559,8 @@ class PPTOCRApp(QWidget):
         set_glass_style_recursive(self)
 
         # 特殊控件单独调整样式，覆盖统一透明背景
-        self.list_widget.setStyleSheet("""
-            QListWidget {
+        self.list_view.setStyleSheet("""
+            QListView {
                 background-color: rgba(40, 40, 40, 230);  /* 稍微更透明 */
                 border: 1px solid rgba(120, 120, 120, 90);
                 border-radius: 8px;
@@ -268,7 +568,7 @@ class PPTOCRApp(QWidget):
                 selection-background-color: rgba(50, 100, 255, 160);
                 padding: 5px;
             }
-            QListWidget::item:selected {
+            QListView::item:selected {
                 color: white;
                 background-color: rgba(70, 130, 255, 200);
                 border-radius: 4px;
@@ -318,7 +618,8 @@ class PPTOCRApp(QWidget):
                 background-color: rgba(50, 110, 220, 230); /* 按下更暗 */
             }
         """
-        for btn in (self.btn_add, self.btn_remove, self.btn_start, self.btn_export):
+        for btn in (self.btn_add, self.btn_remove, self.btn_start, self.btn_cancel, self.btn_priority,
+                    self.btn_export, self.btn_export_all, self.btn_export_jsonl):
             btn.setStyleSheet(btn_style)
 
         # 标题栏按钮
@@ -390,108 +691,161 @@ class PPTOCRApp(QWidget):
 
     # 添加文件到列表
     def add_files(self, files):
-        existing_files = {item[0] for item in self.file_list}
-        count_added = 0
-        for f in files:
-            if f not in existing_files:
-                self.file_list.append([f, "待处理", ""])
-                item = QListWidgetItem(os.path.basename(f) + "  [待处理]")
-                self.list_widget.addItem(item)
-                count_added += 1
-        if count_added:
+        if self.file_model.add_files(files):
             self.update_progress()
 
+    def selected_rows(self):
+        return sorted({idx.row() for idx in self.list_view.selectionModel().selectedIndexes()})
+
     def remove_selected_files(self):
-        selected = self.list_widget.selectedIndexes()
-        if not selected:
+        rows = self.selected_rows()
+        if not rows:
             return
-        rows = sorted({idx.row() for idx in selected}, reverse=True)
         for row in rows:
-            self.list_widget.takeItem(row)
-            del self.file_list[row]
+            self.documents.pop(self.file_model.path(row), None)
+        self.file_model.remove_rows(rows)
         self.update_progress()
 
     def start_recognition(self):
-        if not self.file_list:
+        if not self.file_model.rowCount():
             QMessageBox.warning(self, "提示", "请先添加PPTX文件")
             return
 
+        pending = [filepath for filepath, status, _ in self.file_model.entries() if status in RUNNABLE_STATUSES]
+        if not pending:
+            QMessageBox.warning(self, "提示", "没有待处理的文件")
+            return
+
         # 禁用按钮防止重复操作
         self.btn_add.setEnabled(False)
         self.btn_remove.setEnabled(False)
         self.btn_start.setEnabled(False)
+        self.btn_cancel.setEnabled(True)
         self.btn_export.setEnabled(False)
+        self.btn_export_all.setEnabled(False)
+        self.btn_export_jsonl.setEnabled(False)
 
         self.log_text.clear()
         self.status_label.setText("开始识别任务...")
-        self.progress_bar.setMaximum(len(self.file_list))
-        self.progress_bar.setValue(0)
-        self.progress_bar.setFormat(f"0 / {len(self.file_list)}")
-
-        self.threads = []
-
-        for idx, (filepath, status, _) in enumerate(self.file_list):
-            if status == "待处理":
-                worker = WorkerThread(filepath)
-                worker.progress.connect(self.on_worker_progress)
-                worker.finished.connect(self.on_worker_finished)
-                worker.error.connect(self.on_worker_error)
-                self.threads.append(worker)
-                self.file_list[idx][1] = "排队中"
-                self.update_list_item(idx)
-                worker.start()
+        self.slide_fraction = {}
+        self.update_progress()
+
+        for filepath in pending:
+            self.file_model.set_status(filepath, "排队中")
+
+        # 单个线程驱动有界工作池，所有文件的图片任务共享并发上限
+        priorities = {path: PRIORITY_URGENT for path in pending if path in self.file_model.urgent}
+        self.worker = WorkerThread(pending, self.spin_workers.value(), priorities)
+        self.worker.progress.connect(self.on_worker_progress)
+        self.worker.slide_progress.connect(self.on_worker_slide_progress)
+        self.worker.document_ready.connect(self.on_worker_document)
+        self.worker.finished.connect(self.on_worker_finished)
+        self.worker.cancelled.connect(self.on_worker_cancelled)
+        self.worker.error.connect(self.on_worker_error)
+        self.worker.metrics_ready.connect(self.on_worker_metrics)
+        self.worker.start()
 
     def on_worker_progress(self, filepath, msg):
-        idx = self.index_of_filepath(filepath)
-        if idx != -1:
-            self.file_list[idx][1] = msg
-            self.update_list_item(idx)
+        if self.file_model.set_status(filepath, msg):
             self.status_label.setText(f"{os.path.basename(filepath)}: {msg}")
 
+    def on_worker_slide_progress(self, filepath, done, total):
+        if total:
+            self.slide_fraction[filepath] = done / total
+            self.file_model.mark_dirty()
+
+    def on_worker_document(self, filepath, document):
+        self.documents[filepath] = document
+
     def on_worker_finished(self, filepath, text):
-        idx = self.index_of_filepath(filepath)
-        if idx != -1:
-            if text:
-                self.file_list[idx][1] = "完成"
-                self.file_list[idx][2] = text
-            else:
-                self.file_list[idx][1] = "失败"
-            self.update_list_item(idx)
+        self.slide_fraction.pop(filepath, None)
+        if text:
+            self.file_model.set_status(filepath, STATUS_DONE, text)
+        else:
+            self.file_model.set_status(filepath, STATUS_FAILED)
+        self.check_all_done()
 
-        done_count = sum(1 for f in self.file_list if f[1] in ("完成", "失败"))
-        self.progress_bar.setValue(done_count)
-        self.progress_bar.setFormat(f"{done_count} / {len(self.file_list)}")
+    def on_worker_cancelled(self, filepath):
+        self.slide_fraction.pop(filepath, None)
+        self.file_model.set_status(filepath, STATUS_CANCELLED)
+        self.check_all_done()
 
-        if done_count == len(self.file_list):
-            self.status_label.setText("所有任务完成")
-            self.btn_add.setEnabled(True)
-            self.btn_remove.setEnabled(True)
-            self.btn_start.setEnabled(True)
-            self.btn_export.setEnabled(True)
+    def check_all_done(self):
+        """所有文件都结束（完成、失败或取消）时立即刷新并恢复按钮，否则等待定时刷新"""
+        if self.file_model.done_count() != self.file_model.rowCount():
+            return
+        self.file_model.flush()
+        cancelled = self.file_model.count(STATUS_CANCELLED) > 0
+        self.status_label.setText("识别已取消" if cancelled else "所有任务完成")
+        ocr_cache = get_cache()
+        if ocr_cache is not None:
+            stats = ocr_cache.stats()
+            self.log_text.append(
+                f"图片缓存: 命中 {stats['hits']} / 未命中 {stats['misses']}，"
+                f"淘汰 {stats['evictions']}，共 {stats['entries']} 条"
+            )
+        self.btn_add.setEnabled(True)
+        self.btn_remove.setEnabled(True)
+        self.btn_start.setEnabled(True)
+        self.btn_cancel.setEnabled(False)
+        self.btn_export.setEnabled(True)
+        self.btn_export_all.setEnabled(True)
+        self.btn_export_jsonl.setEnabled(True)
+
+    def cancel_recognition(self):
+        """停止当前批次；正在识别的图片完成后，未处理完的文件标记为已取消"""
+        if self.worker is None or not self.worker.isRunning():
+            return
+        self.worker.cancel()
+        self.btn_cancel.setEnabled(False)
+        self.status_label.setText("正在取消...")
+        self.log_text.append("已请求取消，等待正在识别的图片完成")
+
+    def toggle_priority(self):
+        """切换选中文件的优先级；识别过程中调整时，尚未开始的文件按新的优先级排队"""
+        rows = self.selected_rows()
+        if not rows:
+            QMessageBox.warning(self, "提示", "请先选中要优先处理的文件")
+            return
+        running = self.worker is not None and self.worker.isRunning()
+        for row in rows:
+            filepath = self.file_model.path(row)
+            urgent = filepath not in self.file_model.urgent
+            self.file_model.set_urgent(filepath, urgent)
+            if running:
+                self.worker.set_priority(filepath, PRIORITY_URGENT if urgent else PRIORITY_NORMAL)
+        self.file_model.flush()
+
+    def on_worker_metrics(self, lines):
+        self.log_text.append("识别统计:")
+        for line in lines:
+            self.log_text.append(line)
+        if DEFAULT_METRICS_PATH:
+            self.log_text.append(f"指标已写入 {DEFAULT_METRICS_PATH}")
+
+    def start_model_warmup(self):
+        """窗口出现后在后台加载公式模型"""
+        self.model_loader = ModelLoaderThread()
+        self.model_loader.loaded.connect(
+            lambda seconds: self.log_text.append(f"公式模型加载完成，用时 {seconds:.1f} 秒")
+        )
+        self.model_loader.failed.connect(
+            lambda msg: self.on_worker_error(f"公式模型加载失败: {msg}")
+        )
+        self.model_loader.start()
 
     def on_worker_error(self, msg):
         self.log_text.append(f"<span style='color:#FF6666;'>{msg}</span>")
 
-    def update_list_item(self, idx):
-        item = self.list_widget.item(idx)
-        filepath, status, _ = self.file_list[idx]
-        item.setText(f"{os.path.basename(filepath)}  [{status}]")
-
-    def index_of_filepath(self, filepath):
-        for i, (fp, _, _) in enumerate(self.file_list):
-            if fp == filepath:
-                return i
-        return -1
-
     def export_selected_texts(self):
-        selected = self.list_widget.selectedIndexes()
-        if not selected:
+        rows = self.selected_rows()
+        if not rows:
             QMessageBox.warning(self, "提示", "请先选中至少一个文件导出")
             return
 
-        for idx in {idx.row() for idx in selected}:
-            filepath, status, text = self.file_list[idx]
-            if status != "完成":
+        for filepath in [self.file_model.path(row) for row in rows]:
+            status, text = self.file_model.status(filepath), self.file_model.text(filepath)
+            if status != STATUS_DONE:
                 QMessageBox.warning(self, "提示", f"文件 {os.path.basename(filepath)} 未完成识别，不能导出")
                 continue
             if not text.strip():
@@ -508,11 +862,58 @@ class PPTOCRApp(QWidget):
                 except Exception as e:
                     QMessageBox.warning(self, "错误", f"保存文件失败: {e}")
 
+    def finished_results(self):
+        """所有已完成文件的 [(源文件, 文本, 结构化结果), ...]"""
+        return [
+            (filepath, text, self.documents.get(filepath))
+            for filepath, status, text in self.file_model.entries()
+            if status == STATUS_DONE and text.strip()
+        ]
+
+    def export_all_to_directory(self):
+        """一次性把所有已完成文件的文本与结构化结果写入同一目录"""
+        results = self.finished_results()
+        if not results:
+            QMessageBox.warning(self, "提示", "没有已完成识别的文件")
+            return
+        directory = QFileDialog.getExistingDirectory(self, "选择导出目录")
+        if not directory:
+            return
+        try:
+            written = export_to_directory(results, directory)
+        except Exception as e:
+            QMessageBox.warning(self, "错误", f"导出失败: {e}")
+            return
+        self.log_text.append(f"导出成功: {len(results)} 个文件共 {len(written)} 个结果文件 -> {directory}")
+
+    def export_all_to_jsonl(self):
+        """把所有已完成文件的结构化结果写入一个JSON行文件，每个文件一行"""
+        documents = [doc for _, _, doc in self.finished_results() if doc is not None]
+        if not documents:
+            QMessageBox.warning(self, "提示", "没有已完成识别的文件")
+            return
+        save_path, _ = QFileDialog.getSaveFileName(self, "保存JSONL文件", "ocr_results.jsonl", "JSON行文件 (*.jsonl)")
+        if not save_path:
+            return
+        try:
+            count = export_combined_jsonl(documents, save_path)
+        except Exception as e:
+            QMessageBox.warning(self, "错误", f"保存文件失败: {e}")
+            return
+        self.log_text.append(f"导出成功: {count} 个文件 -> {save_path}")
+
     def update_progress(self):
-        self.progress_bar.setMaximum(len(self.file_list))
-        done_count = sum(1 for f in self.file_list if f[1] in ("完成", "失败"))
-        self.progress_bar.setValue(done_count)
-        self.progress_bar.setFormat(f"{done_count} / {len(self.file_list)}")
+        """刷新进度条：每个文件占 PROGRESS_STEPS 格，处理中的文件按已完成页数推进
+
+        已结束的文件数取自列表的状态计数，只需累加正在处理的文件的页进度。
+        """
+        total = self.file_model.rowCount()
+        done_count = self.file_model.done_count()
+        partial = sum(self.slide_fraction.values())
+        self.progress_bar.setMaximum(total * PROGRESS_STEPS)
+        self.progress_bar.setValue(int((done_count + partial) * PROGRESS_STEPS))
+        self.progress_bar.setFormat(f"{done_count} / {total}")
+        return done_count
 
     # 重绘圆角背景
     def paintEvent(self, event):
@@ -559,6 +960,16 @@ class PPTOCRApp(QWidget):
 
 
 if __name__ == "__main__":
+    # --startup-report [PATH]: 首个窗口出现后把启动耗时以JSON行追加到PATH并退出，用于跟踪启动回归
+    report_path = None
+    if "--startup-report" in sys.argv:
+        i = sys.argv.index("--startup-report")
+        del sys.argv[i]
+        if i < len(sys.argv) and not sys.argv[i].startswith("-"):
+            report_path = sys.argv.pop(i)
+        else:
+            report_path = "startup_report.jsonl"
+
     # 启用高DPI支持
     QApplication.setAttribute(Qt.AA_EnableHighDpiScaling)
 
@@ -568,4 +979,20 @@ if __name__ == "__main__":
     window = PPTOCRApp()
     window.show()
 
+    def on_first_window():
+        report = startup_report(time.perf_counter())
+        window.log_text.append(
+            f"启动耗时: 模块导入 {report['import_ms']} ms，首个窗口 {report['first_window_ms']} ms"
+        )
+        if report_path:
+            with open(report_path, "a", encoding="utf-8") as f:
+                f.write(json.dumps(report, ensure_ascii=False) + "\n")
+            print(json.dumps(report, ensure_ascii=False))
+            app.quit()
+            return
+        window.start_model_warmup()
+
+    # 事件循环开始处理后即首个窗口已显示
+    QTimer.singleShot(0, on_first_window)
+
     sys.exit(app.exec())
@@ -0,0 +1,204 @@
+import os
+import io
+import re
+import sys
+import json
+import time
+import random
+import argparse
+import subprocess
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from make_corpus import FORMULAS, render_formula  # noqa: E402
+from ocr_models import TORCH_THREADS  # noqa: E402
+
+
+# 固定公式集：语料生成用的公式再加几个较长的，覆盖上下标、分式、矩阵与希腊字母
+FORMULA_SET = FORMULAS + [
+    r"f(x) = \sum_{k=0}^{\infty} \frac{f^{(k)}(a)}{k!} (x-a)^k",
+    r"\sigma = \sqrt{\frac{1}{N} \sum_{i=1}^{N} (x_i - \mu)^2}",
+    r"\mathbf{A}\mathbf{x} = \lambda \mathbf{x}",
+    r"P(A|B) = \frac{P(B|A)P(A)}{P(B)}",
+    r"\oint_C \mathbf{B} \cdot d\mathbf{l} = \mu_0 I",
+    r"\hat{y} = \beta_0 + \beta_1 x + \varepsilon",
+    r"\binom{n}{k} = \frac{n!}{k!(n-k)!}",
+    r"\alpha + \beta = \gamma",
+]
+
+_TOKEN = re.compile(r"\\[A-Za-z]+|\\.|[^\s{}]")
+
+
+def tokens(latex: str) -> list:
+    """按LaTeX命令与单个字符切分，忽略空白与花括号，使排版等价的写法一致"""
+    return _TOKEN.findall(latex or "")
+
+
+def edit_distance(a: list, b: list) -> int:
+    prev = list(range(len(b) + 1))
+    for i, x in enumerate(a, 1):
+        cur = [i]
+        for j, y in enumerate(b, 1):
+            cur.append(min(prev[j] + 1, cur[j - 1] + 1, prev[j - 1] + (x != y)))
+        prev = cur
+    return prev[-1]
+
+
+def token_error_rate(pred: str, truth: str) -> float:
+    truth_tokens = tokens(truth)
+    return edit_distance(tokens(pred), truth_tokens) / max(1, len(truth_tokens))
+
+
+def formula_images():
+    """渲染固定公式集，按识别流程解码与预处理"""
+    from ocr_image_prep import open_image, prepare_for_formula
+    rng = random.Random(0)
+    images = []
+    for latex in FORMULA_SET:
+        buf = io.BytesIO()
+        render_formula(latex, rng).save(buf, format="PNG")
+        images.append(prepare_for_formula(open_image(buf.getvalue())))
+    return images
+
+
+def model_size_mb(model) -> float:
+    """序列化后的权重大小"""
+    import torch
+    buf = io.BytesIO()
+    torch.save(model.model.state_dict(), buf)
+    return round(buf.tell() / (1024 * 1024), 1)
+
+
+def run_config_in_process(precision, threads, repeat):
+    """在子进程中执行：加载指定精度的模型，逐个与按批识别公式集，输出结果JSON"""
+    from ocr_models import configure_torch_threads, load_latex_model
+    from ocr_latex_batch import batch_key, prepare_latex_image, run_latex_batch
+
+    configure_torch_threads(threads, 1)
+    start = time.perf_counter()
+    model = load_latex_model(device="cpu", precision=precision)
+    load_s = time.perf_counter() - start
+    prepared = [prepare_latex_image(model, img) for img in formula_images()]
+    run_latex_batch(model, prepared[:1])  # 预热
+
+    latencies = [float("inf")] * len(prepared)
+    predictions = [""] * len(prepared)
+    for _ in range(max(1, repeat)):
+        for i, img in enumerate(prepared):
+            t0 = time.perf_counter()
+            result = run_latex_batch(model, [img])[0]
+            latencies[i] = min(latencies[i], (time.perf_counter() - t0) * 1000)
+            predictions[i] = result if isinstance(result, str) else ""
+
+    # 与识别流程相同按尺寸分组批量推理
+    groups = {}
+    for img in prepared:
+        groups.setdefault(batch_key(img), []).append(img)
+    start = time.perf_counter()
+    for items in groups.values():
+        run_latex_batch(model, items)
+    batch_s = time.perf_counter() - start
+
+    print(json.dumps({
+        "precision": precision,
+        "threads": threads,
+        "load_s": round(load_s, 2),
+        "model_mb": model_size_mb(model),
+        "latencies_ms": [round(v, 2) for v in latencies],
+        "batch_formulas_per_sec": round(len(prepared) / batch_s, 2) if batch_s else None,
+        "predictions": predictions,
+    }, ensure_ascii=False))
+
+
+def run_config(precision, threads, repeat):
+    """每种配置使用独立进程：线程数只能在进程内设置一次，模型互不影响"""
+    proc = subprocess.run(
+        [sys.executable, os.path.abspath(__file__), "--run", f"{precision}:{threads}", "--repeat", str(repeat)],
+        stdout=subprocess.PIPE, stderr=subprocess.PIPE, text=True,
+    )
+    if proc.returncode != 0:
+        tail = proc.stderr.strip().splitlines()[-1:] or ["?"]
+        return {"precision": precision, "threads": threads, "error": tail[0]}
+    return json.loads(proc.stdout.strip().splitlines()[-1])
+
+
+def parse_config(text):
+    precision, _, threads = text.partition(":")
+    return precision.strip().lower(), int(threads) if threads else TORCH_THREADS
+
+
+def evaluate(results):
+    """对照公式源码计算词元错误率与完全一致数，并与同线程数的fp32结果比较输出是否相同"""
+    reference = {r["threads"]: r["predictions"] for r in results if r.get("precision") == "fp32" and "error" not in r}
+    for r in results:
+        if "error" in r:
+            continue
+        preds = r["predictions"]
+        r["token_error_rate"] = round(sum(token_error_rate(p, t) for p, t in zip(preds, FORMULA_SET)) / len(preds), 4)
+        r["exact"] = sum(tokens(p) == tokens(t) for p, t in zip(preds, FORMULA_SET))
+        ref = reference.get(r["threads"]) or next(iter(reference.values()), None)
+        r["same_as_fp32"] = sum(p == q for p, q in zip(preds, ref)) if ref else None
+        latencies = sorted(r["latencies_ms"])
+        r["p50_ms"] = latencies[len(latencies) // 2]
+        r["mean_ms"] = round(sum(latencies) / len(latencies), 2)
+    return results
+
+
+def format_table(results):
+    n = len(FORMULA_SET)
+    lines = [f"{'配置':<10} {'加载s':>6} {'权重MB':>7} {'p50 ms':>8} {'平均ms':>8} {'批量/s':>7} "
+             f"{'词元错误率':>9} {'完全一致':>8} {'同fp32':>7}"]
+    for r in results:
+        name = f"{r['precision']}:{r['threads']}"
+        if "error" in r:
+            lines.append(f"{name:<10} 出错: {r['error']}")
+            continue
+        same = "-" if r["same_as_fp32"] is None else f"{r['same_as_fp32']}/{n}"
+        lines.append(f"{name:<10} {r['load_s']:>6} {r['model_mb']:>7} {r['p50_ms']:>8} {r['mean_ms']:>8} "
+                     f"{r['batch_formulas_per_sec'] or '-':>7} {r['token_error_rate']:>9.2%} "
+                     f"{str(r['exact']) + '/' + str(n):>8} {same:>7}")
+    return "\n".join(lines)
+
+
+def main(argv=None) -> int:
+    default_configs = [f"fp32:{TORCH_THREADS}", f"int8:{TORCH_THREADS}"]
+    if TORCH_THREADS > 1:
+        default_configs += ["fp32:1", "int8:1"]
+    parser = argparse.ArgumentParser(description="在固定公式集上比较pix2tex各CPU推理配置的速度与准确率")
+    parser.add_argument("--configs", default=",".join(default_configs),
+                        help=f"逗号分隔的 精度:线程数（精度为 fp32 或 int8，默认 {','.join(default_configs)}）")
+    parser.add_argument("--repeat", type=int, default=3, help="每个公式重复识别次数，延迟取最小值")
+    parser.add_argument("-o", "--output", help="把结果写入JSON文件")
+    parser.add_argument("--run", help=argparse.SUPPRESS)
+    args = parser.parse_args(argv)
+
+    if args.run:
+        run_config_in_process(*parse_config(args.run), args.repeat)
+        return 0
+
+    import importlib.util
+    if importlib.util.find_spec("pix2tex") is None:
+        print("错误: 未安装 pix2tex", file=sys.stderr)
+        return 2
+    configs = [parse_config(c) for c in args.configs.split(",") if c.strip()]
+    bad = [p for p, _ in configs if p not in ("fp32", "int8")]
+    if bad:
+        print(f"错误: 不支持的精度 {', '.join(bad)}", file=sys.stderr)
+        return 2
+
+    results = []
+    for precision, threads in configs:
+        print(f"运行 {precision}:{threads} ...", file=sys.stderr, flush=True)
+        results.append(run_config(precision, threads, args.repeat))
+    evaluate(results)
+    print(f"公式 {len(FORMULA_SET)} 个，CPU {os.cpu_count()} 核")
+    print(format_table(results))
+
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump({"formulas": FORMULA_SET, "results": results}, f, ensure_ascii=False, indent=1)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,80 @@
+import os
+import sys
+import glob
+import time
+import argparse
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from ocr_slide_xml import PresentationXml, slide_items  # noqa: E402
+
+
+def pptx_slide_items(slide) -> list:
+    """原先基于 python-pptx 对象模型的遍历，作为对照"""
+    from pptx.enum.shapes import MSO_SHAPE_TYPE
+
+    items = []
+    for shape in slide.shapes:
+        if shape.shape_type == MSO_SHAPE_TYPE.TEXT_BOX or shape.has_text_frame:
+            texts = [p.text for p in shape.text_frame.paragraphs if p.text.strip()]
+            if texts:
+                items.append(("text", "\n".join(texts)))
+        elif shape.shape_type == MSO_SHAPE_TYPE.PICTURE:
+            items.append(("image", shape.image.blob))
+    return items
+
+
+def walk_pptx(path):
+    from pptx import Presentation
+    return [pptx_slide_items(slide) for slide in Presentation(path).slides]
+
+
+def walk_xml(path):
+    with PresentationXml(path) as presentation:
+        return [slide_items(slide) for slide in presentation]
+
+
+def coverage(slides):
+    """(文本条目数, 文本字符数, 图片数)"""
+    texts = [v for items in slides for kind, v in items if kind == "text"]
+    chars = sum(len(v["text"] if isinstance(v, dict) else v) for v in texts)
+    images = sum(1 for items in slides for kind, _ in items if kind == "image")
+    return len(texts), chars, images
+
+
+def timed(fn, paths, repeat):
+    best, result = None, None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = [fn(p) for p in paths]
+        elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+    return best, result
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description="比较 python-pptx 遍历与直接读取XML的解析耗时和覆盖范围")
+    parser.add_argument("inputs", nargs="+", help="pptx文件或目录")
+    parser.add_argument("--repeat", type=int, default=3, help="重复次数，取最快一次")
+    args = parser.parse_args(argv)
+
+    paths = []
+    for item in args.inputs:
+        paths += sorted(glob.glob(os.path.join(item, "*.pptx"))) if os.path.isdir(item) else [item]
+    if not paths:
+        print("错误: 没有pptx", file=sys.stderr)
+        return 2
+
+    old_s, old = timed(walk_pptx, paths, args.repeat)
+    new_s, new = timed(walk_xml, paths, args.repeat)
+    slides = sum(len(s) for s in new)
+    print(f"文件 {len(paths)}，幻灯片 {slides}")
+    for label, seconds, result in (("python-pptx", old_s, old), ("XML", new_s, new)):
+        texts, chars, images = coverage([items for deck in result for items in deck])
+        print(f"{label:<12} {seconds:.3f}s  {slides / seconds:8.1f} 页/秒  文本 {texts} 条 {chars} 字  图片 {images}")
+    print(f"加速 {old_s / new_s:.2f}x")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
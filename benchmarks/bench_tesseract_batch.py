@@ -0,0 +1,78 @@
+import os
+import sys
+import time
+import random
+import argparse
+
+from PIL import Image, ImageDraw
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from ocr_core import OCR_LANG, data_text, open_slide_items  # noqa: E402
+from ocr_image_prep import open_image, prepare_for_text  # noqa: E402
+from ocr_tesseract_batch import image_to_data, run_tesseract_batch  # noqa: E402
+
+
+WORDS = "alpha beta gamma delta result model data method figure table value".split()
+
+
+def synthetic_images(count, size, seed):
+    """生成大量带少量文字的小图片，模拟图标旁的标注与小截图"""
+    rng = random.Random(seed)
+    images = []
+    for _ in range(count):
+        img = Image.new("L", size, 255)
+        ImageDraw.Draw(img).text((8, size[1] // 3), " ".join(rng.choice(WORDS) for _ in range(3)), fill=0)
+        images.append(img)
+    return images
+
+
+def deck_images(path):
+    """pptx中所有图片，按文字OCR的输入预处理"""
+    _, slides = open_slide_items(path)
+    return [prepare_for_text(open_image(value[0].read())) for items in slides for kind, value in items if kind == "image"]
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description="比较逐张调用与批量调用tesseract的耗时")
+    parser.add_argument("pptx", nargs="?", help="使用该pptx中的图片；默认生成小图片")
+    parser.add_argument("--count", type=int, default=200, help="生成的图片数")
+    parser.add_argument("--size", default="240x48", help="生成的图片尺寸")
+    parser.add_argument("--batch-size", type=int, default=16)
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args(argv)
+
+    if args.pptx:
+        images = deck_images(args.pptx)
+    else:
+        w, h = (int(v) for v in args.size.lower().split("x"))
+        images = synthetic_images(args.count, (w, h), args.seed)
+    if not images:
+        print("错误: 没有图片", file=sys.stderr)
+        return 2
+
+    try:
+        start = time.perf_counter()
+        single = [data_text(image_to_data(img, OCR_LANG)) for img in images]
+        single_s = time.perf_counter() - start
+    except Exception as e:
+        print(f"错误: tesseract 不可用: {e}", file=sys.stderr)
+        return 2
+
+    start = time.perf_counter()
+    batched = []
+    for i in range(0, len(images), args.batch_size):
+        batched += [data_text(d) for d in run_tesseract_batch(images[i:i + args.batch_size], OCR_LANG)]
+    batch_s = time.perf_counter() - start
+
+    same = sum(1 for a, b in zip(single, batched) if a[0] == b[0])
+    print(f"图片数        {len(images)}")
+    print(f"逐张调用      {single_s:.2f}s  {len(images) / single_s:.1f} 张/秒")
+    print(f"批量调用({args.batch_size:>3}) {batch_s:.2f}s  {len(images) / batch_s:.1f} 张/秒")
+    print(f"加速          {single_s / batch_s:.2f}x")
+    print(f"文字一致      {same}/{len(images)}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
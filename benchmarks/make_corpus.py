@@ -0,0 +1,188 @@
+import io
+import os
+import sys
+import json
+import random
+import argparse
+
+from PIL import Image, ImageDraw, ImageFont
+from pptx import Presentation
+from pptx.util import Inches, Pt
+
+
+# 生成公式图片时使用的LaTeX源码
+FORMULAS = [
+    r"E = mc^2",
+    r"a^2 + b^2 = c^2",
+    r"\int_0^1 x^2\,dx = \frac{1}{3}",
+    r"\sum_{i=1}^{n} i = \frac{n(n+1)}{2}",
+    r"e^{i\pi} + 1 = 0",
+    r"\frac{\partial f}{\partial x} = 2x",
+    r"\lim_{x \to 0} \frac{\sin x}{x} = 1",
+    r"\nabla \cdot \mathbf{E} = \frac{\rho}{\varepsilon_0}",
+]
+
+WORDS = (
+    "lorem ipsum dolor sit amet consectetur adipiscing elit sed do eiusmod tempor "
+    "incididunt ut labore et dolore magna aliqua 数据 模型 实验 结果 分析 方法"
+).split()
+
+# 预设规模，可被命令行参数覆盖
+PROFILES = {
+    "small": {"decks": 3, "slides": 10, "text_boxes": 2, "images_per_slide": 2,
+              "dup_ratio": 0.5, "formula_ratio": 0.5, "image_sizes": ["320x120", "1024x768"]},
+    "medium": {"decks": 10, "slides": 40, "text_boxes": 3, "images_per_slide": 3,
+               "dup_ratio": 0.5, "formula_ratio": 0.4, "image_sizes": ["320x120", "1024x768", "2400x1600"]},
+    "large": {"decks": 4, "slides": 300, "text_boxes": 4, "images_per_slide": 4,
+              "dup_ratio": 0.7, "formula_ratio": 0.3, "image_sizes": ["320x120", "1600x1200", "6000x4000"]},
+}
+
+
+def render_formula(latex: str, rng: random.Random) -> Image.Image:
+    """渲染公式图片：安装了matplotlib时用mathtext排版，否则直接绘制源码文本"""
+    try:
+        from matplotlib import mathtext
+        from matplotlib.font_manager import FontProperties
+        buf = io.BytesIO()
+        mathtext.math_to_image(f"${latex}$", buf, prop=FontProperties(size=rng.choice([18, 24, 32])),
+                               dpi=100, format="png")
+        buf.seek(0)
+        return Image.open(buf).convert("RGBA")
+    except Exception:
+        pass
+    font = ImageFont.load_default()
+    w = 12 * len(latex) + 40
+    img = Image.new("RGBA", (w, 60), (255, 255, 255, 0))
+    ImageDraw.Draw(img).text((20, 20), latex, fill=(0, 0, 0, 255), font=font)
+    return img
+
+
+def render_picture(size, rng: random.Random) -> Image.Image:
+    """生成带随机色块与文字的图片，模拟截图和照片"""
+    w, h = size
+    img = Image.new("RGB", size, tuple(rng.randrange(180, 256) for _ in range(3)))
+    draw = ImageDraw.Draw(img)
+    for _ in range(12):
+        x0, y0 = rng.randrange(w), rng.randrange(h)
+        x1, y1 = min(w, x0 + rng.randrange(10, max(11, w // 3))), min(h, y0 + rng.randrange(10, max(11, h // 3)))
+        draw.rectangle([x0, y0, x1, y1], fill=tuple(rng.randrange(256) for _ in range(3)))
+    for line in range(min(8, h // 30)):
+        draw.text((10, 10 + line * 28), " ".join(rng.choice(WORDS) for _ in range(6)), fill=(0, 0, 0))
+    return img
+
+
+def to_png(img: Image.Image) -> bytes:
+    buf = io.BytesIO()
+    img.save(buf, format="PNG")
+    return buf.getvalue()
+
+
+def to_jpeg(img: Image.Image) -> bytes:
+    buf = io.BytesIO()
+    img.convert("RGB").save(buf, format="JPEG", quality=85)
+    return buf.getvalue()
+
+
+def parse_size(text: str):
+    w, h = text.lower().split("x")
+    return int(w), int(h)
+
+
+def make_deck(path: str, params: dict, rng: random.Random, pool: list) -> dict:
+    """生成单个pptx，pool 为可复用的图片字节（模拟重复的logo与公式）"""
+    prs = Presentation()
+    layout = prs.slide_layouts[6]  # 空白版式
+    sizes = [parse_size(s) for s in params["image_sizes"]]
+    counts = {"slides": 0, "text_boxes": 0, "images": 0, "formulas": 0, "duplicates": 0, "tables": 0, "grouped": 0}
+
+    for _ in range(params["slides"]):
+        slide = prs.slides.add_slide(layout)
+        counts["slides"] += 1
+        for box in range(params["text_boxes"]):
+            tb = slide.shapes.add_textbox(Inches(0.5), Inches(0.4 + box * 0.8), Inches(9), Inches(0.7))
+            tb.text_frame.text = " ".join(rng.choice(WORDS) for _ in range(rng.randrange(4, 14)))
+            tb.text_frame.paragraphs[0].font.size = Pt(14)
+            counts["text_boxes"] += 1
+
+        for _ in range(params.get("tables", 0)):
+            rows, cols = rng.randrange(2, 6), rng.randrange(2, 5)
+            table = slide.shapes.add_table(rows, cols, Inches(0.5), Inches(2), Inches(6), Inches(1.2)).table
+            for r in range(rows):
+                for c in range(cols):
+                    table.cell(r, c).text = " ".join(rng.choice(WORDS) for _ in range(2))
+            counts["tables"] += 1
+
+        for n in range(params["images_per_slide"]):
+            if pool and rng.random() < params["dup_ratio"]:
+                blob = rng.choice(pool)
+                counts["duplicates"] += 1
+            elif rng.random() < params["formula_ratio"]:
+                blob = to_png(render_formula(rng.choice(FORMULAS), rng))
+                pool.append(blob)
+                counts["formulas"] += 1
+            else:
+                img = render_picture(rng.choice(sizes), rng)
+                blob = to_jpeg(img) if rng.random() < 0.5 else to_png(img)
+                pool.append(blob)
+            # 部分图片放入组合形状，覆盖嵌套结构
+            if rng.random() < params.get("grouped_ratio", 0):
+                shapes = slide.shapes.add_group_shape().shapes
+                counts["grouped"] += 1
+            else:
+                shapes = slide.shapes
+            shapes.add_picture(io.BytesIO(blob), Inches(0.5 + n * 2.2), Inches(3.5), width=Inches(2))
+            counts["images"] += 1
+
+    prs.save(path)
+    return counts
+
+
+def make_corpus(out_dir: str, params: dict, seed: int = 0) -> dict:
+    """按参数生成一组pptx，并写出 corpus.json 记录参数与统计"""
+    os.makedirs(out_dir, exist_ok=True)
+    rng = random.Random(seed)
+    pool = []
+    decks = []
+    for i in range(params["decks"]):
+        path = os.path.join(out_dir, f"deck_{i:03d}.pptx")
+        counts = make_deck(path, params, rng, pool)
+        decks.append(dict(counts, file=os.path.basename(path)))
+    info = {"seed": seed, "params": params, "decks": decks}
+    with open(os.path.join(out_dir, "corpus.json"), "w", encoding="utf-8") as f:
+        json.dump(info, f, ensure_ascii=False, indent=1)
+    return info
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description="离线生成用于基准测试的合成PPTX语料")
+    parser.add_argument("out_dir", help="输出目录")
+    parser.add_argument("--profile", choices=sorted(PROFILES), default="small")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--decks", type=int)
+    parser.add_argument("--slides", type=int, help="每个文件的幻灯片数")
+    parser.add_argument("--text-boxes", type=int, help="每页文本框数")
+    parser.add_argument("--images-per-slide", type=int)
+    parser.add_argument("--dup-ratio", type=float, help="复用已有图片的概率")
+    parser.add_argument("--formula-ratio", type=float, help="新图片为公式的概率")
+    parser.add_argument("--image-sizes", help="逗号分隔的图片尺寸，如 320x120,2400x1600")
+    parser.add_argument("--tables", type=int, help="每页表格数")
+    parser.add_argument("--grouped-ratio", type=float, help="图片放入组合形状的概率")
+    args = parser.parse_args(argv)
+
+    params = dict(PROFILES[args.profile])
+    for name in ("decks", "slides", "text_boxes", "images_per_slide", "dup_ratio", "formula_ratio",
+                 "tables", "grouped_ratio"):
+        value = getattr(args, name)
+        if value is not None:
+            params[name] = value
+    if args.image_sizes:
+        params["image_sizes"] = args.image_sizes.split(",")
+
+    info = make_corpus(args.out_dir, params, args.seed)
+    total = {k: sum(d[k] for d in info["decks"]) for k in ("slides", "images", "formulas", "duplicates")}
+    print(f"生成 {len(info['decks'])} 个文件: {total}", file=sys.stderr)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,385 @@
+import os
+import sys
+import json
+import time
+import glob
+import hashlib
+import argparse
+import platform
+import statistics
+import subprocess
+import tempfile
+
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# 结果文件格式版本
+RESULT_VERSION = 1
+
+STAGES = ["parse", "decode", "tesseract", "pix2tex", "extract", "scheduler"]
+
+# 比较基线时各指标的方向
+HIGHER_IS_BETTER = ("slides_per_sec", "images_per_sec")
+LOWER_IS_BETTER = ("p50_ms", "p95_ms", "peak_rss_mb")
+
+
+def peak_rss_mb():
+    """当前进程的峰值常驻内存（MB）；没有 resource 模块时尝试 psutil，都不可用时为None"""
+    try:
+        import resource
+        peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        # Linux 以KB为单位，macOS 以字节为单位
+        return round(peak / (1024 * 1024 if sys.platform == "darwin" else 1024), 1)
+    except ImportError:
+        pass
+    try:
+        import psutil
+        info = psutil.Process().memory_info()
+        return round(getattr(info, "peak_wset", info.rss) / (1024 * 1024), 1)
+    except ImportError:
+        return None
+
+
+def percentile(values, q):
+    """线性插值的分位数"""
+    if not values:
+        return None
+    values = sorted(values)
+    pos = (len(values) - 1) * q
+    lo = int(pos)
+    hi = min(lo + 1, len(values) - 1)
+    return values[lo] + (values[hi] - values[lo]) * (pos - lo)
+
+
+def corpus_files(corpus_dir):
+    return sorted(glob.glob(os.path.join(corpus_dir, "*.pptx")))
+
+
+def corpus_images(paths):
+    """按出现顺序返回语料中的所有图片字节（按内容去重）"""
+    from ocr_core import open_slide_items
+    seen, images = set(), []
+    for path in paths:
+        _, slides = open_slide_items(path)
+        for items in slides:
+            for kind, value in items:
+                if kind != "image":
+                    continue
+                blob = value[0].read()
+                digest = hashlib.sha1(blob).digest()
+                if digest not in seen:
+                    seen.add(digest)
+                    images.append(blob)
+    return images
+
+
+def tesseract_available():
+    import pytesseract
+    try:
+        pytesseract.get_tesseract_version()
+        return True
+    except Exception:
+        return False
+
+
+def pix2tex_available():
+    import importlib.util
+    return importlib.util.find_spec("pix2tex") is not None
+
+
+# 两个引擎都从提交时开始计时、同时运行（按版面识别时 pix2tex 还包含文字OCR），取较长者
+ENGINE_TIMINGS = ("tesseract_ms", "pix2tex_ms")
+
+
+def record_latency_ms(record):
+    """结构化结果中单张图片的耗时：依次执行的阶段（缓存、解码、分类）之和加上较慢引擎的耗时"""
+    if not isinstance(record, dict):
+        return None
+    timings = record.get("timings") or {}
+    if not timings:
+        return None
+    serial = sum(ms for name, ms in timings.items() if name not in ENGINE_TIMINGS)
+    return serial + max((timings[name] for name in ENGINE_TIMINGS if name in timings), default=0)
+
+
+def summarize(elapsed, slides, latencies, images=None):
+    images = len(latencies) if images is None else images
+    return {
+        "elapsed_s": round(elapsed, 3),
+        "slides": slides,
+        "images": images,
+        "slides_per_sec": round(slides / elapsed, 2) if slides and elapsed else None,
+        "images_per_sec": round(images / elapsed, 2) if images and elapsed else None,
+        "p50_ms": round(percentile(latencies, 0.5), 2) if latencies else None,
+        "p95_ms": round(percentile(latencies, 0.95), 2) if latencies else None,
+    }
+
+
+def stage_parse(paths, workers):
+    """只解析幻灯片，不读取图片字节、不识别"""
+    from ocr_core import open_slide_items
+    slides = images = 0
+    start = time.perf_counter()
+    for path in paths:
+        _, generator = open_slide_items(path)
+        for items in generator:
+            slides += 1
+            images += sum(1 for kind, _ in items if kind == "image")
+    return summarize(time.perf_counter() - start, slides, [], images)
+
+
+def stage_decode(paths, workers):
+    """逐张图片解码并为两个引擎准备输入"""
+    from ocr_image_prep import open_image, prepare_for_text, prepare_for_formula
+    images = corpus_images(paths)
+    latencies = []
+    start = time.perf_counter()
+    for blob in images:
+        t0 = time.perf_counter()
+        img = open_image(blob)
+        prepare_for_text(img)
+        prepare_for_formula(img)
+        latencies.append((time.perf_counter() - t0) * 1000)
+    return summarize(time.perf_counter() - start, 0, latencies)
+
+
+def stage_tesseract(paths, workers):
+    """逐张图片的文字OCR（不含解码）"""
+    if not tesseract_available():
+        return {"skipped": "未找到 tesseract"}
+    from ocr_core import ocr_text
+    from ocr_image_prep import open_image, prepare_for_text
+    prepared = [prepare_for_text(open_image(blob)) for blob in corpus_images(paths)]
+    latencies = []
+    start = time.perf_counter()
+    for img in prepared:
+        t0 = time.perf_counter()
+        ocr_text(img)
+        latencies.append((time.perf_counter() - t0) * 1000)
+    return summarize(time.perf_counter() - start, 0, latencies)
+
+
+def stage_pix2tex(paths, workers):
+    """逐张图片的公式识别（单张推理，不含模型加载与解码）"""
+    if not pix2tex_available():
+        return {"skipped": "未安装 pix2tex"}
+    from ocr_models import get_latex_model
+    from ocr_latex_batch import prepare_latex_image, run_latex_batch
+    from ocr_image_prep import open_image, prepare_for_formula
+    model = get_latex_model()
+    prepared = [prepare_latex_image(model, prepare_for_formula(open_image(blob))) for blob in corpus_images(paths)]
+    latencies = []
+    start = time.perf_counter()
+    for img in prepared:
+        t0 = time.perf_counter()
+        run_latex_batch(model, [img])
+        latencies.append((time.perf_counter() - t0) * 1000)
+    return summarize(time.perf_counter() - start, 0, latencies)
+
+
+def engines_skipped():
+    if not tesseract_available():
+        return "未找到 tesseract"
+    if not pix2tex_available():
+        return "未安装 pix2tex"
+    return None
+
+
+def stage_extract(paths, workers):
+    """extract_text_from_pptx 的逐文件顺序处理，含模型加载"""
+    reason = engines_skipped()
+    if reason:
+        return {"skipped": reason}
+    from ocr_core import iter_extract_slides, assemble_slide_texts
+    slides, latencies, images = 0, [], 0
+    start = time.perf_counter()
+    for path in paths:
+        collected = []
+        for _, _, results in iter_extract_slides(path):
+            slides += 1
+            collected.append(results)
+            for r in results:
+                if isinstance(r, dict) and r.get("kind") == "image":
+                    images += 1
+                    latency = record_latency_ms(r)
+                    if latency is not None:
+                        latencies.append(latency)
+        assemble_slide_texts(collected)
+    return summarize(time.perf_counter() - start, slides, latencies, images)
+
+
+def stage_scheduler(paths, workers):
+    """界面与命令行使用的全局工作池，含模型加载"""
+    reason = engines_skipped()
+    if reason:
+        return {"skipped": reason}
+    import threading
+    from ocr_core import make_scheduler
+    lock = threading.Lock()
+    counts = {"slides": 0, "images": 0}
+    latencies = []
+
+    def on_slide(path, slide_idx, slide_count, results):
+        with lock:
+            counts["slides"] += 1
+            for r in results:
+                if isinstance(r, dict) and r.get("kind") == "image":
+                    counts["images"] += 1
+                    latency = record_latency_ms(r)
+                    if latency is not None:
+                        latencies.append(latency)
+
+    start = time.perf_counter()
+    make_scheduler(workers).run(paths, on_slide=on_slide)
+    return summarize(time.perf_counter() - start, counts["slides"], latencies, counts["images"])
+
+
+STAGE_FUNCS = {
+    "parse": stage_parse,
+    "decode": stage_decode,
+    "tesseract": stage_tesseract,
+    "pix2tex": stage_pix2tex,
+    "extract": stage_extract,
+    "scheduler": stage_scheduler,
+}
+
+
+def run_stage_in_process(stage, corpus_dir, workers):
+    """在子进程中执行：输出单个阶段的结果JSON"""
+    sys.path.insert(0, ROOT)
+    result = STAGE_FUNCS[stage](corpus_files(corpus_dir), workers)
+    result["peak_rss_mb"] = peak_rss_mb()
+    print(json.dumps(result))
+
+
+def run_stage(stage, corpus_dir, workers):
+    """每个阶段使用独立进程，使峰值内存互不影响；缓存目录每次新建，保证冷启动"""
+    with tempfile.TemporaryDirectory(prefix="pptexocr-bench-") as cache_dir:
+        env = dict(os.environ, PPTEXOCR_CACHE_DIR=cache_dir, PPTEXOCR_ROUTE_LOG="")
+        proc = subprocess.run(
+            [sys.executable, os.path.abspath(__file__), corpus_dir, "--stage", stage, "-j", str(workers)],
+            env=env, stdout=subprocess.PIPE, stderr=subprocess.PIPE, text=True,
+        )
+    if proc.returncode != 0:
+        tail = proc.stderr.strip().splitlines()[-1:] or ["?"]
+        return {"error": tail[0]}
+    return json.loads(proc.stdout.strip().splitlines()[-1])
+
+
+def merge_runs(runs):
+    """多次运行时各数值指标取中位数"""
+    ok = [r for r in runs if "skipped" not in r and "error" not in r]
+    if not ok:
+        return runs[0]
+    merged = dict(ok[0])
+    for key, value in ok[0].items():
+        values = [r[key] for r in ok if isinstance(r.get(key), (int, float))]
+        if values and isinstance(value, (int, float)):
+            merged[key] = round(statistics.median(values), 3)
+    merged["runs"] = len(ok)
+    return merged
+
+
+def compare(current, baseline, tolerance):
+    """与基线逐项比较，返回 [(阶段, 指标, 基线值, 当前值, 变化比例, 是否退化), ...]"""
+    rows = []
+    for stage, result in current["stages"].items():
+        base = baseline.get("stages", {}).get(stage)
+        if not base:
+            continue
+        for metric in HIGHER_IS_BETTER + LOWER_IS_BETTER:
+            old, new = base.get(metric), result.get(metric)
+            if not old or new is None:
+                continue
+            change = (new - old) / old
+            worse = -change if metric in HIGHER_IS_BETTER else change
+            rows.append((stage, metric, old, new, change, worse > tolerance))
+    return rows
+
+
+def format_table(results):
+    lines = [f"{'stage':<10} {'slides/s':>9} {'images/s':>9} {'p50 ms':>9} {'p95 ms':>9} {'peak MB':>8}"]
+    for stage, r in results.items():
+        if "skipped" in r or "error" in r:
+            lines.append(f"{stage:<10} {'跳过: ' + r['skipped'] if 'skipped' in r else '出错: ' + r['error']}")
+            continue
+        cells = [r.get(k) for k in ("slides_per_sec", "images_per_sec", "p50_ms", "p95_ms", "peak_rss_mb")]
+        lines.append(f"{stage:<10} " + " ".join(
+            f"{'-' if c is None else c:>{w}}" for c, w in zip(cells, (9, 9, 9, 9, 8))))
+    return "\n".join(lines)
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description="在合成语料上测量各阶段吞吐、单图延迟与峰值内存")
+    parser.add_argument("corpus_dir", help="make_corpus.py 生成的语料目录")
+    parser.add_argument("--stages", default=",".join(STAGES), help=f"逗号分隔的阶段（默认全部: {','.join(STAGES)}）")
+    parser.add_argument("-j", "--jobs", type=int, default=4, help="scheduler 阶段的并发数")
+    parser.add_argument("--repeat", type=int, default=1, help="每个阶段重复次数，取中位数")
+    parser.add_argument("-o", "--output", help="把结果写入JSON文件")
+    parser.add_argument("--baseline", help="与已保存的基线结果比较")
+    parser.add_argument("--save-baseline", metavar="PATH", help="把本次结果保存为基线")
+    parser.add_argument("--tolerance", type=float, default=0.10, help="判定退化的相对变化阈值（默认 0.10）")
+    parser.add_argument("--stage", help=argparse.SUPPRESS)
+    args = parser.parse_args(argv)
+
+    if args.stage:
+        run_stage_in_process(args.stage, args.corpus_dir, args.jobs)
+        return 0
+
+    if not corpus_files(args.corpus_dir):
+        print(f"错误: {args.corpus_dir} 中没有pptx，请先运行 make_corpus.py", file=sys.stderr)
+        return 2
+    stages = [s.strip() for s in args.stages.split(",") if s.strip()]
+    unknown = [s for s in stages if s not in STAGE_FUNCS]
+    if unknown:
+        print(f"错误: 未知阶段 {', '.join(unknown)}", file=sys.stderr)
+        return 2
+
+    corpus_info = None
+    try:
+        with open(os.path.join(args.corpus_dir, "corpus.json"), "r", encoding="utf-8") as f:
+            corpus_info = json.load(f)
+    except (OSError, ValueError):
+        pass
+
+    results = {}
+    for stage in stages:
+        print(f"运行阶段 {stage} ...", file=sys.stderr, flush=True)
+        results[stage] = merge_runs([run_stage(stage, args.corpus_dir, args.jobs) for _ in range(max(1, args.repeat))])
+
+    report = {
+        "version": RESULT_VERSION,
+        "time": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "corpus": {"seed": corpus_info["seed"], "params": corpus_info["params"]} if corpus_info else None,
+        "environment": {
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "cpu_count": os.cpu_count(),
+            "jobs": args.jobs,
+        },
+        "stages": results,
+    }
+    print(format_table(results))
+
+    for path in (args.output, args.save_baseline):
+        if path:
+            with open(path, "w", encoding="utf-8") as f:
+                json.dump(report, f, ensure_ascii=False, indent=1)
+
+    if not args.baseline:
+        return 0
+    with open(args.baseline, "r", encoding="utf-8") as f:
+        baseline = json.load(f)
+    if baseline.get("corpus") != report["corpus"]:
+        print("警告: 基线使用的语料参数不同，比较结果仅供参考", file=sys.stderr)
+    regressions = 0
+    print(f"\n与基线比较 {args.baseline}（阈值 {args.tolerance:.0%}）:")
+    for stage, metric, old, new, change, regressed in compare(report, baseline, args.tolerance):
+        regressions += regressed
+        mark = "退化" if regressed else ""
+        print(f"{stage:<10} {metric:<15} {old:>10} -> {new:<10} {change:+.1%} {mark}")
+    return 1 if regressions else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
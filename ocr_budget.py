@@ -0,0 +1,26 @@
+import os
+
+
+# 单张图片的Tesseract超时（秒），0 表示不限制；批量调用时按图片数放大
+IMAGE_TIMEOUT = float(os.environ.get("PPTEXOCR_IMAGE_TIMEOUT", "60"))
+# 单个文件的处理时限（秒），超时后尚未开始的图片不再识别，0 表示不限制
+FILE_TIMEOUT = float(os.environ.get("PPTEXOCR_FILE_TIMEOUT", "0"))
+# pix2tex 每个公式最多解码的token数，0 表示使用模型自身的上限
+LATEX_MAX_TOKENS = int(os.environ.get("PPTEXOCR_LATEX_MAX_TOKENS", "0"))
+
+# 被跳过的图片在结果中的原因
+SKIP_TIMEOUT = "timeout"
+SKIP_CANCELLED = "cancelled"
+
+
+class EngineTimeout(RuntimeError):
+    """识别引擎超出时间预算：Tesseract 超时或 pix2tex 达到解码步数上限仍未结束"""
+
+    def __init__(self, engine: str, detail: str = ""):
+        super().__init__(f"{engine} 超时" + (f": {detail}" if detail else ""))
+        self.engine = engine
+
+
+def tesseract_timeout(image_count: int = 1):
+    """传给 subprocess/pytesseract 的超时秒数，不限制时为None"""
+    return IMAGE_TIMEOUT * image_count if IMAGE_TIMEOUT > 0 else None
@@ -0,0 +1,144 @@
+import os
+import json
+import time
+import sqlite3
+import hashlib
+import threading
+
+
+# 缓存结构版本，格式变化时递增使旧条目失效
+CACHE_SCHEMA_VERSION = 2
+
+DEFAULT_CACHE_DIR = os.environ.get(
+    "PPTEXOCR_CACHE_DIR", os.path.join(os.path.expanduser("~"), ".cache", "pptexocr")
+)
+DEFAULT_CACHE_MAX_BYTES = int(float(os.environ.get("PPTEXOCR_CACHE_MAX_MB", "512")) * 1024 * 1024)
+CACHE_ENABLED = os.environ.get("PPTEXOCR_CACHE", "1") != "0"
+
+
+def make_cache_key(image_bytes: bytes, settings: dict) -> str:
+    """按图片字节与识别设置（语言、模型版本等）计算内容寻址键"""
+    h = hashlib.sha256()
+    h.update(image_bytes)
+    h.update(b"\0")
+    h.update(json.dumps(settings, sort_keys=True, ensure_ascii=False).encode("utf-8"))
+    h.update(b"\0v%d" % CACHE_SCHEMA_VERSION)
+    return h.hexdigest()
+
+
+class OCRCache:
+    """基于SQLite的持久化OCR结果缓存，带容量上限与LRU淘汰
+
+    总占用保存在数据库中并由触发器维护，多个进程共用同一缓存文件时按同一个总量淘汰。
+    """
+
+    def __init__(self, path=None, max_bytes=DEFAULT_CACHE_MAX_BYTES):
+        if path is None:
+            path = os.path.join(DEFAULT_CACHE_DIR, "ocr_cache.sqlite3")
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        self.path = path
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False, timeout=30)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        # 建表、统计已有条目与创建触发器在同一事务中完成，避免其他进程的写入漏计
+        self._conn.execute("BEGIN IMMEDIATE")
+        try:
+            self._conn.execute(
+                "CREATE TABLE IF NOT EXISTS entries ("
+                " key TEXT PRIMARY KEY,"
+                " value TEXT NOT NULL,"
+                " size INTEGER NOT NULL,"
+                " last_access REAL NOT NULL)"
+            )
+            self._conn.execute("CREATE INDEX IF NOT EXISTS idx_last_access ON entries(last_access)")
+            self._conn.execute("CREATE TABLE IF NOT EXISTS meta (name TEXT PRIMARY KEY, value INTEGER NOT NULL)")
+            self._conn.execute("INSERT OR IGNORE INTO meta (name, value)"
+                               " SELECT 'total_bytes', COALESCE(SUM(size), 0) FROM entries")
+            self._conn.execute(
+                "CREATE TRIGGER IF NOT EXISTS entries_added AFTER INSERT ON entries BEGIN"
+                " UPDATE meta SET value = value + NEW.size WHERE name = 'total_bytes'; END"
+            )
+            self._conn.execute(
+                "CREATE TRIGGER IF NOT EXISTS entries_removed AFTER DELETE ON entries BEGIN"
+                " UPDATE meta SET value = value - OLD.size WHERE name = 'total_bytes'; END"
+            )
+        except BaseException:
+            self._conn.rollback()
+            raise
+        self._conn.commit()
+
+    def _total_bytes(self) -> int:
+        return self._conn.execute("SELECT value FROM meta WHERE name = 'total_bytes'").fetchone()[0]
+
+    def get(self, key: str):
+        """查询缓存，命中时刷新访问时间；未命中返回None"""
+        with self._lock:
+            row = self._conn.execute("SELECT value FROM entries WHERE key = ?", (key,)).fetchone()
+            if row is None:
+                self.misses += 1
+                return None
+            self._conn.execute("UPDATE entries SET last_access = ? WHERE key = ?", (time.time(), key))
+            self._conn.commit()
+            self.hits += 1
+            return row[0]
+
+    def put(self, key: str, value: str):
+        """写入缓存，超出容量时按最近最少使用淘汰"""
+        size = len(key) + len(value.encode("utf-8"))
+        with self._lock:
+            # 写入与淘汰在同一个写事务中，按数据库中的总占用判断，其他进程的写入也计算在内
+            self._conn.execute("BEGIN IMMEDIATE")
+            try:
+                # 先删除再插入，使触发器扣除旧条目的大小（REPLACE 不触发删除触发器）
+                self._conn.execute("DELETE FROM entries WHERE key = ?", (key,))
+                self._conn.execute(
+                    "INSERT INTO entries (key, value, size, last_access) VALUES (?, ?, ?, ?)",
+                    (key, value, size, time.time()),
+                )
+                total = self._total_bytes()
+                if total > self.max_bytes:
+                    self._evict(total)
+            except BaseException:
+                self._conn.rollback()
+                raise
+            self._conn.commit()
+
+    def _evict(self, total):
+        # 淘汰到容量的90%，避免每次写入都触发淘汰
+        target = int(self.max_bytes * 0.9)
+        rows = self._conn.execute("SELECT key, size FROM entries ORDER BY last_access ASC").fetchall()
+        for key, size in rows:
+            if total <= target:
+                break
+            self._conn.execute("DELETE FROM entries WHERE key = ?", (key,))
+            total -= size
+            self.evictions += 1
+
+    def clear(self):
+        """清空缓存"""
+        with self._lock:
+            self._conn.execute("DELETE FROM entries")
+            self._conn.commit()
+
+    def stats(self) -> dict:
+        """返回命中/未命中计数及占用空间"""
+        with self._lock:
+            entries = self._conn.execute("SELECT COUNT(*) FROM entries").fetchone()[0]
+            total = self._total_bytes()
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+            "entries": entries,
+            "bytes": total,
+            "max_bytes": self.max_bytes,
+        }
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
@@ -0,0 +1,399 @@
+import os
+import sys
+import json
+import glob
+import time
+import argparse
+import threading
+
+from ocr_core import get_cache, make_scheduler, manifest_settings, DEFAULT_MAX_WORKERS
+from ocr_scheduler import PRIORITY_URGENT, PRIORITY_NORMAL
+from ocr_server import DEFAULT_SERVER_URL, JobClient
+from ocr_manifest import SlideManifest, is_incomplete, manifest_path_for
+from ocr_models import warmup_latex_model
+from ocr_metrics import metrics, DEFAULT_METRICS_PATH
+from ocr_output import (
+    SlideJsonlWriter, build_document, slide_record, write_json_atomic, write_text_atomic,
+)
+
+
+# 退出码：全部成功 / 部分文件失败 / 参数错误或没有找到输入文件 / 被中断
+EXIT_OK = 0
+EXIT_FAILED = 1
+EXIT_USAGE = 2
+EXIT_INTERRUPTED = 130
+
+
+def is_pptx(path: str) -> bool:
+    # 跳过 PowerPoint 打开文件时生成的 ~$ 锁文件
+    name = os.path.basename(path)
+    return name.lower().endswith(".pptx") and not name.startswith("~$")
+
+
+def glob_base(pattern: str) -> str:
+    """通配符中第一个含通配字符的部分之前的目录，匹配到的文件按相对它的路径输出"""
+    parts = []
+    for part in os.path.dirname(pattern).replace("\\", "/").split("/"):
+        if glob.has_magic(part):
+            break
+        parts.append(part)
+    return "/".join(parts) or "."
+
+
+def find_inputs(patterns, recursive=True):
+    """把文件、目录与通配符展开为 [(pptx路径, 相对输出路径), ...]，保持输入顺序并去重"""
+    found = []
+    seen = set()
+
+    def add(path, rel):
+        key = os.path.abspath(path)
+        if key not in seen and is_pptx(path):
+            seen.add(key)
+            found.append((path, rel))
+
+    for pattern in patterns:
+        if os.path.isdir(pattern):
+            if recursive:
+                for root, dirs, files in os.walk(pattern):
+                    dirs.sort()
+                    for name in sorted(files):
+                        path = os.path.join(root, name)
+                        add(path, os.path.relpath(path, pattern))
+            else:
+                for name in sorted(os.listdir(pattern)):
+                    add(os.path.join(pattern, name), name)
+        elif os.path.isfile(pattern):
+            add(pattern, os.path.basename(pattern))
+        else:
+            base = glob_base(pattern)
+            for path in sorted(glob.glob(pattern, recursive=recursive)):
+                if os.path.isfile(path):
+                    add(path, os.path.relpath(path, base))
+    return found
+
+
+def duplicate_outputs(outputs: dict) -> list:
+    """多个输入写到同一输出文件时返回 [(输出路径, [输入路径, ...]), ...]"""
+    by_output = {}
+    for path, out in outputs.items():
+        by_output.setdefault(os.path.normcase(os.path.abspath(out)), []).append(path)
+    return [(outputs[paths[0]], paths) for paths in by_output.values() if len(paths) > 1]
+
+
+def output_path_for(path: str, rel: str, output_dir=None, suffix=".txt") -> str:
+    """输出文件路径：未指定输出目录时写在输入文件旁边，否则按相对路径写入输出目录"""
+    if output_dir is None:
+        return os.path.splitext(path)[0] + suffix
+    return os.path.join(output_dir, os.path.splitext(rel)[0] + suffix)
+
+
+def build_parser() -> argparse.ArgumentParser:
+    parser = argparse.ArgumentParser(
+        prog="ocr_cli.py",
+        description="批量提取PPTX中的文本与图片OCR/LaTeX公式（无界面）",
+    )
+    parser.add_argument("inputs", nargs="+", help="PPTX文件、目录或通配符（如 'decks/**/*.pptx'）")
+    parser.add_argument("-o", "--output-dir", help="输出目录；默认写在输入文件旁边")
+    parser.add_argument("-j", "--jobs", type=int, default=DEFAULT_MAX_WORKERS,
+                        help=f"并发数（默认 {DEFAULT_MAX_WORKERS}）")
+    parser.add_argument("--no-recursive", action="store_true", help="不递归进入子目录")
+    parser.add_argument("--skip-existing", action="store_true", help="跳过输出文件已存在的输入")
+    parser.add_argument("--jsonl", action="store_true",
+                        help="同时逐页写出 .jsonl，每页识别完成即落盘")
+    parser.add_argument("--json", action="store_true",
+                        help="同时写出结构化结果 .json（页序号、形状编号/类型/位置、引擎、置信度、各阶段耗时）")
+    parser.add_argument("--combined-jsonl", metavar="PATH",
+                        help="把所有文件的结构化结果写入同一个JSON行文件，每个文件一行")
+    parser.add_argument("--urgent", action="append", default=[], metavar="PATTERN",
+                        help="优先处理匹配的文件（文件、目录或通配符，可多次指定）")
+    parser.add_argument("--full", action="store_true",
+                        help="忽略已有的逐页清单，重新处理所有幻灯片")
+    parser.add_argument("--metrics", metavar="PATH", default=DEFAULT_METRICS_PATH or None,
+                        help="结束时写出各阶段耗时与计数（.prom/.txt 为Prometheus文本格式，其他为JSON）")
+    parser.add_argument("--server", metavar="URL", default=DEFAULT_SERVER_URL or None,
+                        help="提交给识别服务（ocr_server.py）处理并等待结果，如 http://127.0.0.1:8765")
+    parser.add_argument("-q", "--quiet", action="store_true", help="只输出错误信息")
+    return parser
+
+
+def report_incomplete(path, count):
+    """有图片因引擎出错、超时或跳过而未识别成功时报告；结果照常写出，退出码为1"""
+    print(f"文件 {path}: {count} 张图片未识别成功（引擎出错、超时或跳过）", file=sys.stderr, flush=True)
+
+
+def run_on_server(args, inputs, outputs, priorities, log) -> int:
+    """把文件提交给识别服务，轮询直到全部结束，按与本地处理相同的方式写出结果"""
+    client = JobClient(args.server)
+    paths = [path for path, _ in inputs]
+    rels = dict(inputs)
+    try:
+        urgent = [p for p in paths if p in priorities]
+        normal = [p for p in paths if p not in priorities]
+        job_paths = {}
+        for group, priority in ((urgent, PRIORITY_URGENT), (normal, PRIORITY_NORMAL)):
+            if group:
+                job_paths.update(zip(client.submit(group, priority), group))
+    except (OSError, RuntimeError) as e:
+        print(f"错误: 无法提交到识别服务 {args.server}: {e}", file=sys.stderr)
+        return EXIT_FAILED
+    log(f"已提交 {len(job_paths)} 个文件到 {args.server}")
+
+    failed = set()
+    incomplete = set()   # 已写出结果但有图片未识别成功的文件
+    combined = None
+    if args.combined_jsonl:
+        os.makedirs(os.path.dirname(os.path.abspath(args.combined_jsonl)), exist_ok=True)
+        combined = open(args.combined_jsonl, "w", encoding="utf-8")
+
+    def on_status(job_id, status):
+        log(f"{os.path.basename(job_paths[job_id])}: {status}")
+
+    def on_done(job_id, job):
+        path = job_paths[job_id]
+        if job["status"] != "done":
+            failed.add(path)
+            print(f"文件 {path} 识别失败: {job.get('error') or job['status']}", file=sys.stderr, flush=True)
+            return
+        document = job.get("document")
+        try:
+            write_text_atomic(outputs[path], job.get("text") or "")
+            if document is not None:
+                if args.json:
+                    write_json_atomic(output_path_for(path, rels[path], args.output_dir, ".json"), document)
+                if args.jsonl:
+                    writer = SlideJsonlWriter(output_path_for(path, rels[path], args.output_dir, ".jsonl"),
+                                              path, document["slide_count"])
+                    for slide in document["slides"]:
+                        writer.write_slide(slide["slide"] - 1, slide["items"])
+                    writer.close()
+                if combined is not None:
+                    combined.write(json.dumps(document, ensure_ascii=False) + "\n")
+                    combined.flush()
+        except OSError as e:
+            failed.add(path)
+            print(f"文件 {path} 写出失败: {e}", file=sys.stderr, flush=True)
+            return
+        count = sum(is_incomplete(item) for slide in (document or {}).get("slides", []) for item in slide["items"])
+        if count:
+            incomplete.add(path)
+            report_incomplete(path, count)
+        print(outputs[path], flush=True)
+
+    try:
+        client.wait(list(job_paths), on_done, on_status)
+    except KeyboardInterrupt:
+        # 中断时取消尚未结束的任务
+        for job_id in job_paths:
+            client.cancel(job_id)
+        print("已中断，已取消未完成的任务", file=sys.stderr)
+        return EXIT_INTERRUPTED
+    except (OSError, RuntimeError) as e:
+        print(f"错误: 与识别服务的连接中断: {e}", file=sys.stderr)
+        return EXIT_FAILED
+    finally:
+        if combined is not None:
+            combined.close()
+    log(f"完成 {len(paths) - len(failed)} / {len(paths)}" + (f"，其中 {len(incomplete)} 个有图片未识别成功"
+                                                            if incomplete else ""))
+    return EXIT_FAILED if failed or incomplete else EXIT_OK
+
+
+def main(argv=None) -> int:
+    args = build_parser().parse_args(argv)
+    if args.jobs < 1:
+        print("错误: 并发数必须大于0", file=sys.stderr)
+        return EXIT_USAGE
+
+    inputs = find_inputs(args.inputs, recursive=not args.no_recursive)
+    if not inputs:
+        print("错误: 没有找到PPTX文件", file=sys.stderr)
+        return EXIT_USAGE
+
+    outputs = {path: output_path_for(path, rel, args.output_dir) for path, rel in inputs}
+    duplicates = duplicate_outputs(outputs)
+    if duplicates:
+        for out, paths in duplicates:
+            print(f"错误: {', '.join(paths)} 都会写到 {out}", file=sys.stderr)
+        return EXIT_USAGE
+    if args.skip_existing:
+        inputs = [(path, rel) for path, rel in inputs if not os.path.exists(outputs[path])]
+        if not inputs:
+            return EXIT_OK
+
+    paths = [path for path, _ in inputs]
+    rels = dict(inputs)
+    urgent = {os.path.abspath(path) for path, _ in find_inputs(args.urgent, recursive=not args.no_recursive)}
+    priorities = {path: PRIORITY_URGENT for path in paths if os.path.abspath(path) in urgent}
+
+    def log(msg):
+        if not args.quiet:
+            print(msg, file=sys.stderr, flush=True)
+
+    if args.server:
+        return run_on_server(args, inputs, outputs, priorities, log)
+
+    jsonl_outputs = {path: output_path_for(path, rel, args.output_dir, ".jsonl") for path, rel in inputs}
+    failed = set()
+    cancelled = set()
+    incomplete = {}      # path -> 未识别成功的图片数
+    writers = {}
+    manifests = {}
+    slide_records = {}   # path -> 结构化逐页结果
+    started = {}         # path -> 开始处理的时间
+    reused = [0, 0]  # 复用页数, 总页数
+    want_document = args.json or args.combined_jsonl
+    combined = None
+    if args.combined_jsonl:
+        os.makedirs(os.path.dirname(os.path.abspath(args.combined_jsonl)), exist_ok=True)
+        combined = open(args.combined_jsonl, "w", encoding="utf-8")
+    settings = manifest_settings()
+    lock = threading.Lock()
+
+    def on_error(path, e):
+        with lock:
+            failed.add(path)
+        print(f"文件 {path} 识别失败: {e}", file=sys.stderr, flush=True)
+
+    def manifest_for(path):
+        # 读取输出旁的逐页清单，指纹未变化的页直接复用上次结果
+        manifest_path = manifest_path_for(outputs[path])
+        if args.full:
+            manifest = SlideManifest(path, settings)
+        else:
+            manifest = SlideManifest.load(manifest_path, path, settings)
+        with lock:
+            manifests[path] = manifest
+        return manifest
+
+    def on_progress(path, msg):
+        with lock:
+            first = path not in started
+            started.setdefault(path, time.perf_counter())
+        if first:
+            metrics.inc("files")
+        log(f"{os.path.basename(path)}: {msg}")
+
+    def on_slide(path, slide_idx, slide_count, results):
+        with lock:
+            if want_document:
+                slide_records.setdefault(path, []).append(slide_record(slide_idx, results))
+            manifest = manifests.get(path)
+            writer = writers.get(path)
+            if writer is None and args.jsonl:
+                writer = writers[path] = SlideJsonlWriter(jsonl_outputs[path], path, slide_count)
+        count = sum(is_incomplete(r) for r in results)
+        if count:
+            with lock:
+                incomplete[path] = incomplete.get(path, 0) + count
+        if manifest is not None:
+            manifest.record(slide_idx, results)
+        # 调度器按页序回调，逐页追加写入
+        if writer is not None:
+            writer.write_slide(slide_idx, results)
+
+    def on_finished(path, text):
+        with lock:
+            writer = writers.pop(path, None)
+            manifest = manifests.pop(path, None)
+            slides = slide_records.pop(path, [])
+            elapsed_ms = (time.perf_counter() - started.pop(path, time.perf_counter())) * 1000
+            ok = path not in failed
+        peak_rss = scheduler.peak_rss(path)
+        metrics.observe("file_seconds", elapsed_ms / 1000)
+        metrics.observe("file_peak_rss_bytes", peak_rss)
+        if writer is not None:
+            writer.close(complete=ok)
+        if not ok:
+            metrics.inc("files_failed")
+            return
+        try:
+            write_text_atomic(outputs[path], text)
+            if want_document:
+                document = build_document(path, slides, elapsed_ms, peak_rss)
+                if args.json:
+                    write_json_atomic(output_path_for(path, rels[path], args.output_dir, ".json"), document)
+                if combined is not None:
+                    with lock:
+                        combined.write(json.dumps(document, ensure_ascii=False) + "\n")
+                        combined.flush()
+            if manifest is not None:
+                manifest.save(manifest_path_for(outputs[path]))
+        except OSError as e:
+            on_error(path, e)
+            metrics.inc("files_failed")
+            return
+        if manifest is not None:
+            with lock:
+                reused[0] += manifest.reused
+                reused[1] += manifest.slide_count
+            if manifest.reused:
+                log(f"{os.path.basename(path)}: 复用未变化的 {manifest.reused}/{manifest.slide_count} 页")
+        if peak_rss:
+            log(f"{os.path.basename(path)}: 内存峰值 {peak_rss / (1024 * 1024):.0f} MB")
+        if incomplete.get(path):
+            report_incomplete(path, incomplete[path])
+        # 标准输出只打印结果路径，便于管道后续处理
+        print(outputs[path], flush=True)
+
+    def on_cancelled(path):
+        # 未处理完的文件不写出结果，也不更新逐页清单
+        with lock:
+            cancelled.add(path)
+            writer = writers.pop(path, None)
+            manifests.pop(path, None)
+            slide_records.pop(path, None)
+            started.pop(path, None)
+        if writer is not None:
+            writer.close(complete=False)
+        metrics.inc("files_cancelled")
+        log(f"{os.path.basename(path)}: 已取消")
+
+    # 解析PPT的同时在后台加载公式模型
+    warmup_latex_model()
+
+    log(f"共 {len(paths)} 个文件，并发数 {args.jobs}" + (f"，优先 {len(priorities)} 个" if priorities else ""))
+    scheduler = make_scheduler(args.jobs, manifest_for=manifest_for)
+    try:
+        scheduler.run(
+            paths,
+            on_progress=on_progress,
+            on_finished=on_finished,
+            on_error=on_error,
+            on_slide=on_slide,
+            on_cancelled=on_cancelled,
+            priorities=priorities,
+        )
+    except KeyboardInterrupt:
+        # 调度器已撤回未开始的工作；已打开的逐页输出标记为不完整
+        with lock:
+            open_writers = list(writers.values())
+            writers.clear()
+        for writer in open_writers:
+            writer.close(complete=False)
+        print("已中断", file=sys.stderr)
+        return EXIT_INTERRUPTED
+    finally:
+        if combined is not None:
+            combined.close()
+
+    ocr_cache = get_cache()
+    if ocr_cache is not None:
+        stats = ocr_cache.stats()
+        log(f"图片缓存: 命中 {stats['hits']} / 未命中 {stats['misses']}")
+    log(f"逐页清单: 跳过未变化的 {reused[0]} / {reused[1]} 页")
+    for line in metrics.summary_lines():
+        log(line)
+    if args.metrics:
+        try:
+            metrics.write(args.metrics)
+        except OSError as e:
+            print(f"指标文件写入失败: {e}", file=sys.stderr)
+    # 取消与整个文件失败的不重复计入
+    partial = [path for path in incomplete if path not in failed and path not in cancelled]
+    log(f"完成 {len(paths) - len(failed)} / {len(paths)}" + (f"，其中 {len(partial)} 个有图片未识别成功"
+                                                            if partial else ""))
+    return EXIT_FAILED if failed or partial else EXIT_OK
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,744 @@
+import json
+import time
+import weakref
+import threading
+import collections
+import hashlib
+import functools
+from concurrent.futures import Future
+from importlib import metadata
+
+from PIL import Image
+import pytesseract
+
+from ocr_cache import OCRCache, CACHE_ENABLED, make_cache_key
+from ocr_scheduler import OCRScheduler, DEFAULT_MAX_WORKERS, current_image_stage
+from ocr_latex_batch import LatexBatcher
+from ocr_tesseract_batch import TesseractBatcher, DEFAULT_BATCH_SIZE as TESSERACT_BATCH_SIZE, image_to_data
+from ocr_models import get_latex_model, latex_precision_setting
+from ocr_router import (
+    ROUTER_MODE, QUICK_OCR_CONFIG, RouteLog, classify_image, classify_by_features, classify_by_quick_ocr,
+    data_confidence, image_features, make_decision, quick_ocr_input, route_engines, router_setting,
+)
+from ocr_image_prep import open_image, prepare_for_text, prepare_for_formula, prep_settings
+from ocr_metrics import metrics
+from ocr_budget import EngineTimeout, SKIP_TIMEOUT
+from ocr_memory import decode_budget, image_memory_cost
+from ocr_layout import LAYOUT_MODE, compose_layout, formula_regions, layout_setting, layout_text
+from ocr_slide_xml import MediaRef, PresentationXml, slide_items
+from ocr_output import record_text
+
+
+OCR_LANG = 'eng+chi_sim'
+
+# 文本提取逻辑版本，提取规则变化时递增，使逐页清单中的旧结果失效
+EXTRACTOR_VERSION = 3
+
+# 公式识别请求汇总到批处理线程，跨幻灯片和文件按尺寸分组批量推理
+latex_batcher = LatexBatcher(get_latex_model)
+
+# 文字OCR请求合并为一次tesseract调用，避免每张图片都启动进程并加载语言数据
+tesseract_batcher = TesseractBatcher(OCR_LANG) if TESSERACT_BATCH_SIZE > 1 else None
+
+# 缓存与路由日志在首次使用时才创建，导入本模块时不创建目录、不打开数据库
+_cache = None
+_route_log = None
+_lazy_lock = threading.Lock()
+
+
+def get_cache():
+    """按图片内容缓存识别结果的全局缓存，重复图片与重复批次直接跳过推理；首次调用时打开，未启用时为None"""
+    global _cache
+    if _cache is None and CACHE_ENABLED:
+        with _lazy_lock:
+            if _cache is None:
+                _cache = OCRCache()
+    return _cache
+
+
+def __getattr__(name):
+    # 兼容旧代码中的 ocr_core.ocr_cache / ocr_core.route_log
+    if name == "ocr_cache":
+        return get_cache()
+    if name == "route_log":
+        return get_route_log()
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+
+
+def get_route_log():
+    """记录每张图片路由决策的全局日志，用于评估分类准确率与节省的时间；首次调用时创建"""
+    global _route_log
+    if _route_log is None:
+        with _lazy_lock:
+            if _route_log is None:
+                _route_log = RouteLog()
+    return _route_log
+
+
+@functools.lru_cache(maxsize=None)
+def ocr_settings() -> dict:
+    """影响识别结果的设置，作为缓存键的一部分"""
+    try:
+        tesseract_version = str(pytesseract.get_tesseract_version(cached=True))
+    except Exception:
+        tesseract_version = "unknown"
+    try:
+        pix2tex_version = metadata.version("pix2tex")
+    except metadata.PackageNotFoundError:
+        pix2tex_version = "unknown"
+    # 量化后的模型输出可能不同，单独缓存；fp32 保持原来的缓存键
+    if latex_precision_setting() != "fp32":
+        pix2tex_version += "+" + latex_precision_setting()
+    return {
+        "lang": OCR_LANG,
+        "tesseract": tesseract_version,
+        "pix2tex": pix2tex_version,
+        "router": router_setting(),
+        "layout": layout_setting(),
+        "prep": prep_settings(),
+    }
+
+
+def tesseract_text(img: Image.Image):
+    """调用Tesseract，返回(文字, 平均置信度)；超时抛出 EngineTimeout"""
+    return data_text(image_to_data(img, OCR_LANG))
+
+
+def data_text(data: dict):
+    """由 image_to_data 结果得到(文字, 平均置信度)；文字按块/段/行重建，置信度取各词的平均值"""
+    paragraphs = {}
+    confs = []
+    for i, word in enumerate(data["text"]):
+        if not word.strip():
+            continue
+        par = (data["block_num"][i], data["par_num"][i])
+        line = data["line_num"][i]
+        paragraphs.setdefault(par, {}).setdefault(line, []).append(word)
+        conf = float(data["conf"][i])
+        if conf >= 0:
+            confs.append(conf)
+    text = "\n\n".join(
+        "\n".join(" ".join(words) for words in lines.values())
+        for lines in paragraphs.values()
+    )
+    confidence = round(sum(confs) / len(confs), 1) if confs else None
+    return text, confidence
+
+
+def ocr_text(img: Image.Image):
+    """文字OCR，返回(文字, 置信度, 是否成功)"""
+    try:
+        text, confidence = tesseract_text(img)
+        return text, confidence, True
+    except Exception:
+        return "", None, False
+
+
+def submit_text_data(img: Image.Image) -> Future:
+    """提交文字OCR，返回结果为 image_to_data 字典（含词框与置信度）的Future；未启用批量时同步执行"""
+    if tesseract_batcher is not None:
+        return tesseract_batcher.submit(img)
+    result = Future()
+    try:
+        result.set_result(image_to_data(img, OCR_LANG))
+    except Exception as e:
+        result.set_exception(e)
+    return result
+
+
+def submit_text_ocr(img: Image.Image) -> Future:
+    """提交文字OCR，返回结果为(文字, 置信度)的Future"""
+    return map_future(submit_text_data(img), data_text)
+
+
+def map_future(future: Future, fn) -> Future:
+    """结果为 fn(future.result()) 的Future；异常与取消原样传递"""
+    result = Future()
+
+    def on_done(f):
+        if f.cancelled():
+            result.cancel()
+            return
+        try:
+            result.set_result(fn(f.result()))
+        except Exception as e:
+            result.set_exception(e)
+
+    future.add_done_callback(on_done)
+    return result
+
+
+def submit_formula(img: Image.Image) -> Future:
+    """按设置预处理后提交公式识别，记录送给 pix2tex 的像素数"""
+    formula_img = prepare_for_formula(img)
+    metrics.observe("pix2tex_pixels", formula_img.width * formula_img.height)
+    return latex_batcher.submit(formula_img)
+
+
+def submit_layout_ocr(img: Image.Image, run_text: bool):
+    """按版面识别：由文字OCR的词框与连通域定位公式区域，只把区域裁剪图送给 pix2tex
+
+    返回 (文字结果Future, 版面结果Future)。版面结果为 {"formulas": [{"box", "latex"}, ...],
+    "layout": 按阅读顺序的片段或None, "timeout": 是否有公式超时, "failed": 是否有公式出错}。
+    不运行文字OCR时只凭连通域定位。
+    """
+    if run_text:
+        text_img = prepare_for_text(img)
+        data_future = submit_text_data(text_img)
+        scale = img.width / text_img.width
+        text_future = map_future(data_future, data_text)
+    else:
+        data_future = completed_future(None)
+        scale = 1.0
+        text_future = completed_future(("", None))
+    layout_future = Future()
+
+    def on_data(f):
+        if f.cancelled():
+            layout_future.cancel()
+            return
+        try:
+            data = f.result()
+        except Exception:
+            # 文字OCR的错误与超时在文字结果中报告，这里只凭连通域定位
+            data = None
+        try:
+            regions = formula_regions(img, data, scale)
+            crops = [submit_formula(img.crop(box)) for box in regions]
+        except Exception as e:
+            layout_future.set_exception(e)
+            return
+        metrics.inc("formula_regions", len(regions))
+        if not crops:
+            layout_future.set_result({"formulas": [], "layout": None, "timeout": False, "failed": False})
+            return
+        when_all(crops, lambda: collect(data, regions, crops))
+
+    def collect(data, regions, crops):
+        if any(crop.cancelled() for crop in crops):
+            layout_future.cancel()
+            return
+        formulas = []
+        timeout = failed = False
+        for box, crop in zip(regions, crops):
+            try:
+                latex = crop.result()
+            except EngineTimeout:
+                timeout = True
+                continue
+            except Exception:
+                failed = True
+                continue
+            if latex.strip():
+                formulas.append({"box": list(box), "latex": latex.strip()})
+        layout_future.set_result({
+            "formulas": formulas,
+            "layout": compose_layout(data, scale, formulas),
+            "timeout": timeout,
+            "failed": failed,
+        })
+
+    on_image_stage(data_future, on_data)
+    return text_future, layout_future
+
+
+def submit_classify(img: Image.Image) -> Future:
+    """提交图片分类，返回结果为路由决策的Future
+
+    启用批量时需要快速OCR的图片进入文字OCR批处理队列，不阻塞调用线程。
+    """
+    if tesseract_batcher is None:
+        return completed_future(classify_image(img, OCR_LANG))
+
+    start = time.perf_counter()
+    features = image_features(img)
+    decided = classify_by_features(features)
+    if decided is not None:
+        return completed_future(make_decision(*decided, features, start))
+
+    result = Future()
+
+    def on_done(data_future):
+        if data_future.cancelled():
+            result.cancel()
+            return
+        try:
+            words, conf = data_confidence(data_future.result())
+        except Exception:
+            words, conf = -1, 0.0
+        result.set_result(make_decision(*classify_by_quick_ocr(features, words, conf), features, start))
+
+    tesseract_batcher.submit(quick_ocr_input(img), QUICK_OCR_CONFIG).add_done_callback(on_done)
+    return result
+
+
+def on_image_stage(future: Future, fn):
+    """future 完成后调用 fn(future)
+
+    在调度器的线程中调用时，fn 交回调度器的图片阶段执行，而不是在完成 future 的引擎线程中执行，
+    以免图片预处理与公式提交占用 Tesseract 的线程；future 已完成或不在调度器中时直接调用。
+    """
+    submit = current_image_stage()
+    if submit is None or future.done():
+        future.add_done_callback(fn)
+    else:
+        future.add_done_callback(lambda f: submit(fn, f))
+
+
+def when_all(futures: list, callback):
+    """所有Future完成后调用一次 callback()"""
+    remaining = [len(futures)]
+    lock = threading.Lock()
+
+    def on_done(_):
+        with lock:
+            remaining[0] -= 1
+            last = remaining[0] == 0
+        if last:
+            callback()
+
+    for future in futures:
+        future.add_done_callback(on_done)
+
+
+def completed_future(value) -> Future:
+    future = Future()
+    future.set_result(value)
+    return future
+
+
+def run_ocr_engines(img: Image.Image):
+    """分别运行文字OCR与公式识别，返回(文字, 公式, 是否全部成功)"""
+    with metrics.timer("tesseract_seconds"):
+        text_ocr, _, ok = ocr_text(prepare_for_text(img))
+
+    try:
+        with metrics.timer("pix2tex_seconds"):
+            latex_text = latex_batcher.submit(prepare_for_formula(img)).result()
+    except Exception:
+        latex_text = ""
+        ok = False
+
+    if not ok:
+        metrics.inc("ocr_failures")
+    return text_ocr, latex_text, ok
+
+
+def format_ocr_result(text_ocr: str, latex_text: str, timeouts=(), layout=None) -> str:
+    """拼接文字OCR与公式识别结果，超时的引擎单独标出；有版面时文字与公式按阅读顺序穿插输出"""
+    combined = ""
+    if layout:
+        combined += "[OCR Layout]\n" + layout_text(layout) + "\n"
+    else:
+        if text_ocr.strip():
+            combined += "[OCR Text]\n" + text_ocr.strip() + "\n"
+        if latex_text.strip():
+            combined += "[LaTeX OCR]\n" + latex_text.strip() + "\n"
+    for engine in timeouts:
+        combined += f"[OCR Timeout: {engine}]\n"
+
+    return combined.strip()
+
+
+def ocr_image_multilang_with_latex(img: Image.Image) -> str:
+    """对图片进行OCR和LaTeX公式识别"""
+    metrics.inc("images")
+    metrics.observe("image_pixels", img.width * img.height)
+    text_ocr, latex_text, _ = run_ocr_engines(img)
+    return format_ocr_result(text_ocr, latex_text)
+
+
+def image_record(meta: dict, outputs: dict, timings: dict, cached: bool) -> dict:
+    """图片形状的结构化结果：每个引擎的输出与置信度、各阶段耗时"""
+    ocr = []
+    if outputs["text"].strip():
+        ocr.append({"engine": "tesseract", "text": outputs["text"].strip(), "confidence": outputs["text_conf"]})
+    if outputs.get("formulas") is not None:
+        # 按版面识别时每个公式区域一条，box 为解码后图片中的像素坐标
+        ocr += [{"engine": "pix2tex", "text": f["latex"], "confidence": None, "box": f["box"]}
+                for f in outputs["formulas"]]
+    elif outputs["latex"].strip():
+        # pix2tex 不提供置信度
+        ocr.append({"engine": "pix2tex", "text": outputs["latex"].strip(), "confidence": None})
+    return dict(
+        meta,
+        kind="image",
+        text=format_ocr_result(outputs["text"], outputs["latex"], outputs.get("timeouts", ()), outputs.get("layout")),
+        ocr=ocr,
+        route=outputs.get("route"),
+        layout=outputs.get("layout"),
+        timeouts=outputs.get("timeouts", []),
+        failed=outputs.get("failed", []),
+        cached=cached,
+        timings=timings,
+    )
+
+
+def skipped_image_record(value, reason: str) -> dict:
+    """未识别的图片（文件超出时间预算或被取消）的结构化结果，value 同 ocr_image_item"""
+    _, meta = value
+    metrics.inc("images_skipped")
+    label = "Timeout" if reason == SKIP_TIMEOUT else "Cancelled"
+    return dict(meta, kind="image", text=f"[OCR Skipped: {label}]", skipped=reason)
+
+
+def observe_timings(timings: dict):
+    """把单张图片各阶段耗时（毫秒）计入全局指标"""
+    for name, ms in timings.items():
+        metrics.observe(name[:-3] + "_seconds" if name.endswith("_ms") else name, ms / 1000)
+
+
+def submit_image_outputs(image_bytes: bytes) -> Future:
+    """提交单张图片识别：先查缓存，未命中时按分类结果决定运行哪些引擎
+
+    文字OCR与公式识别分别进入各自的批处理队列；返回的Future在两者都完成后给出
+    (各引擎输出, 各阶段耗时, 是否来自缓存)。图片字节与解码后的图片在提交引擎后即释放。
+    解码前按估算的内存占用申请 decode_budget，预算不足时阻塞，识别结束后归还。
+    """
+    result = Future()
+    key = None
+    metrics.inc("images")
+    metrics.observe("image_bytes", len(image_bytes))
+    image_digest = hashlib.sha1(image_bytes).hexdigest()[:16]
+    ocr_cache = get_cache()
+    if ocr_cache is not None:
+        start = time.perf_counter()
+        key = make_cache_key(image_bytes, ocr_settings())
+        cached = ocr_cache.get(key)
+        if cached is not None:
+            timings = {"cache_ms": round((time.perf_counter() - start) * 1000, 2)}
+            metrics.inc("cache_hits")
+            observe_timings(timings)
+            result.set_result((json.loads(cached), timings, True))
+            return result
+
+    if ocr_cache is not None:
+        metrics.inc("cache_misses")
+        timings = {"cache_ms": round((time.perf_counter() - start) * 1000, 2)}
+    else:
+        timings = {}
+
+    cost = image_memory_cost(image_bytes)
+    waited = decode_budget.acquire(cost)
+    if waited >= 0.001:
+        metrics.observe("memory_wait_seconds", waited)
+    metrics.observe("decoded_bytes_in_flight", decode_budget.in_use)
+
+    # 解码时即限制像素数并统一颜色模式，再分别为两个引擎准备输入
+    decode_start = time.perf_counter()
+    try:
+        img = open_image(image_bytes)
+    except Exception:
+        decode_budget.release(cost)
+        raise
+    result.add_done_callback(lambda _: decode_budget.release(cost))
+    timings["decode_ms"] = round((time.perf_counter() - decode_start) * 1000, 2)
+    metrics.observe("image_pixels", img.width * img.height)
+
+    try:
+        decision_future = submit_classify(img) if ROUTER_MODE != "off" else completed_future(None)
+    except Exception as e:
+        # 通过结果Future报告错误，同时归还内存预算
+        result.set_exception(e)
+        return result
+
+    def on_classified(decision_future):
+        # 在图片阶段提交引擎；出错时让结果Future带上异常，避免调用方一直等待
+        if decision_future.cancelled():
+            result.cancel()
+            return
+        try:
+            start_engines(decision_future.result())
+        except Exception as e:
+            result.set_exception(e)
+
+    def start_engines(decision):
+        nonlocal img
+        run_text, run_formula = route_engines(decision)
+        if decision is not None:
+            timings["classify_ms"] = decision["classify_ms"]
+
+        # 两个引擎都异步提交，耗时包含在批处理队列中等待的时间
+        engine_start = time.perf_counter()
+
+        def record_time(name):
+            def on_done(_):
+                timings[name] = round((time.perf_counter() - engine_start) * 1000, 2)
+            return on_done
+
+        if run_formula and LAYOUT_MODE == "on":
+            # 公式区域依赖文字OCR的词框，pix2tex 在文字OCR完成后只识别裁剪出的区域
+            text_future, latex_future = submit_layout_ocr(img, run_text)
+            if run_text:
+                text_future.add_done_callback(record_time("tesseract_ms"))
+            latex_future.add_done_callback(record_time("pix2tex_ms"))
+        else:
+            if run_text:
+                text_future = submit_text_ocr(prepare_for_text(img))
+                text_future.add_done_callback(record_time("tesseract_ms"))
+            else:
+                text_future = completed_future(("", None))
+            if run_formula:
+                latex_future = submit_formula(img)
+                latex_future.add_done_callback(record_time("pix2tex_ms"))
+            else:
+                latex_future = completed_future("")
+        # 两个引擎的输入已单独生成，解码后的原图不再需要（按版面识别时保留到裁剪出公式区域）
+        img = None
+
+        # 写缓存、记录路由日志与交付结果都交回图片阶段，不占用引擎的批处理线程
+        submit = current_image_stage()
+        args = (decision, run_text, run_formula, text_future, latex_future)
+        when_all([text_future, latex_future],
+                 lambda: submit(finish, *args) if submit is not None else finish(*args))
+
+    def finish(decision, run_text, run_formula, text_future, latex_future):
+        # 任务取消时引擎请求被撤回，不产生结果
+        if text_future.cancelled() or latex_future.cancelled():
+            result.cancel()
+            return
+        timeouts = []
+        failed = []     # 出错的引擎
+        try:
+            text_ocr, text_conf = text_future.result()
+        except EngineTimeout as e:
+            text_ocr, text_conf = "", None
+            timeouts.append(e.engine)
+        except Exception:
+            text_ocr, text_conf = "", None
+            failed.append("tesseract")
+        layout = None
+        try:
+            latex_text = latex_future.result()
+        except EngineTimeout as e:
+            latex_text = ""
+            timeouts.append(e.engine)
+        except Exception:
+            latex_text = ""
+            failed.append("pix2tex")
+        if isinstance(latex_text, dict):
+            # 按版面识别：各区域的公式按阅读顺序拼接
+            layout = latex_text
+            latex_text = "\n".join(f["latex"] for f in layout["formulas"])
+            if layout["timeout"]:
+                timeouts.append("pix2tex")
+            if layout["failed"]:
+                failed.append("pix2tex")
+        outputs = {
+            "text": text_ocr,
+            "text_conf": text_conf,
+            "latex": latex_text,
+            "route": decision["route"] if decision is not None else None,
+        }
+        if layout is not None:
+            outputs["formulas"] = layout["formulas"]
+            if layout["layout"]:
+                outputs["layout"] = layout["layout"]
+        if timeouts:
+            outputs["timeouts"] = timeouts
+            metrics.inc("image_timeouts")
+        if failed:
+            outputs["failed"] = failed
+            metrics.inc("ocr_failures")
+        observe_timings(timings)
+        # 引擎出错或超时的结果不写入缓存，避免把失败永久保存
+        if not failed and not timeouts and key is not None:
+            try:
+                ocr_cache.put(key, json.dumps(outputs, ensure_ascii=False))
+            except Exception:
+                pass
+        if decision is not None:
+            get_route_log().record({
+                "image": image_digest,
+                "route": decision["route"],
+                "reason": decision["reason"],
+                "features": decision["features"],
+                "classify_ms": decision["classify_ms"],
+                "text_ms": timings.get("tesseract_ms"),
+                "latex_ms": timings.get("pix2tex_ms"),
+                "text_found": bool(text_ocr.strip()) if run_text else None,
+                "latex_found": bool(latex_text.strip()) if run_formula else None,
+            })
+        result.set_result((outputs, timings, False))
+
+    on_image_stage(decision_future, on_classified)
+    return result
+
+
+def submit_outputs_safe(read_bytes) -> Future:
+    """读取字节并提交识别；读取或解码出错时返回带异常的Future"""
+    try:
+        return submit_image_outputs(read_bytes())
+    except Exception as e:
+        future = Future()
+        future.set_exception(e)
+        return future
+
+
+# 同一文件中指向同一媒体部件的图片只识别一次；文件处理完、引用释放后条目自动删除
+_media_futures = weakref.WeakKeyDictionary()
+_media_lock = threading.Lock()
+
+
+def submit_media_ocr(media: MediaRef) -> Future:
+    """按媒体部件提交识别，同一部件的后续引用共用第一次的Future；字节在此时才从包中读取"""
+    with _media_lock:
+        future = _media_futures.get(media)
+        if future is not None:
+            metrics.inc("media_reused")
+            return future
+        # 先占位，其他线程同时遇到同一部件时直接共用
+        future = _media_futures[media] = Future()
+    metrics.inc("media_unique")
+
+    def relay(outputs_future):
+        if outputs_future.cancelled():
+            future.cancel()
+            return
+        try:
+            future.set_result(outputs_future.result())
+        except Exception as e:
+            future.set_exception(e)
+
+    submit_outputs_safe(media.read).add_done_callback(relay)
+    return future
+
+
+def record_future(outputs_future: Future, meta: dict) -> Future:
+    """把识别输出转为该形状的结构化结果；出错时给出带错误标记的结果，取消时结果也被取消"""
+    result = Future()
+
+    def on_done(f):
+        if f.cancelled():
+            result.cancel()
+            return
+        try:
+            outputs, timings, cached = f.result()
+            result.set_result(image_record(meta, outputs, timings, cached))
+        except Exception as e:
+            metrics.inc("ocr_failures")
+            result.set_result(dict(meta, kind="image", text=f"[Error OCR Image: {e}]", error=str(e)))
+
+    outputs_future.add_done_callback(on_done)
+    return result
+
+
+def submit_image_ocr(image_bytes: bytes, meta: dict = None) -> Future:
+    """提交单张图片识别，返回的Future给出该图片的结构化结果"""
+    return record_future(submit_outputs_safe(lambda: image_bytes), meta or {})
+
+
+def ocr_image_bytes(image_bytes: bytes) -> str:
+    """按图片内容查询缓存，未命中时解码并识别"""
+    return submit_image_ocr(image_bytes).result()["text"]
+
+
+def open_slide_items(path: str, manifest=None):
+    """打开pptx，返回(幻灯片数, 逐页产生条目列表的生成器)；直接读取幻灯片XML，图片字节在解析到该页时才读取
+
+    给出 manifest（SlideManifest）时，指纹未变化的页直接产出上次的结果，不再遍历形状和识别图片。
+    """
+    with metrics.timer("open_seconds"):
+        presentation = PresentationXml(path)
+
+    def generate():
+        try:
+            for slide in presentation:
+                start = time.perf_counter()
+                metrics.inc("slides")
+                if manifest is not None:
+                    records = manifest.plan(slide)
+                    if records is not None:
+                        metrics.inc("slides_reused")
+                        metrics.observe("parse_seconds", time.perf_counter() - start)
+                        yield [("text", r) for r in records]
+                        continue
+                items = slide_items(slide)
+                metrics.observe("parse_seconds", time.perf_counter() - start)
+                yield items
+        finally:
+            presentation.close()
+
+    return len(presentation), generate()
+
+
+def collect_slide_items(path: str) -> list:
+    """解析pptx，按幻灯片顺序返回文本与图片条目 [[(kind, value), ...], ...]"""
+    _, slides = open_slide_items(path)
+    return list(slides)
+
+
+def ocr_image_item(value):
+    """提交单张图片识别，返回Future；value 为 (MediaRef 或图片字节, 形状信息)"""
+    image, meta = value
+    if isinstance(image, MediaRef):
+        return record_future(submit_media_ocr(image), meta)
+    return submit_image_ocr(image, meta)
+
+
+def format_slide_text(slide_idx: int, results: list) -> str:
+    """单页结果的文本形式，无内容时为空字符串"""
+    slide_texts = [t for t in (record_text(r) for r in results) if t]
+    if not slide_texts:
+        return ""
+    return "\n".join([f"--- Slide {slide_idx + 1} ---"] + slide_texts)
+
+
+def assemble_slide_texts(slides: list) -> str:
+    """把逐页结果按幻灯片顺序拼接成整份文本"""
+    all_text = [format_slide_text(slide_idx, results) for slide_idx, results in enumerate(slides)]
+    return "\n".join(t for t in all_text if t)
+
+
+def iter_extract_slides(path: str, lookahead: int = 4):
+    """逐页产生 (页序号, 幻灯片数, 结果列表)
+
+    最多提前提交 lookahead 页的图片，使公式识别可以跨页组批，同时只在内存中保留少量页。
+    """
+    slide_count, slides = open_slide_items(path)
+    window = collections.deque()
+
+    def resolve(entry):
+        slide_idx, results = entry
+        return slide_idx, slide_count, [r.result() if isinstance(r, Future) else r for r in results]
+
+    for slide_idx, items in enumerate(slides):
+        window.append((slide_idx, [value if kind == "text" else ocr_image_item(value) for kind, value in items]))
+        if len(window) > lookahead:
+            yield resolve(window.popleft())
+    while window:
+        yield resolve(window.popleft())
+
+
+def extract_text_from_pptx(path: str) -> str:
+    """提取pptx中的文本及对图片进行OCR识别"""
+    metrics.inc("files")
+    try:
+        with metrics.timer("file_seconds"):
+            return assemble_slide_texts([results for _, _, results in iter_extract_slides(path)])
+    except Exception:
+        metrics.inc("files_failed")
+        raise
+
+
+def manifest_settings() -> dict:
+    """逐页清单的有效性条件：识别设置与提取逻辑版本都一致时才复用"""
+    return dict(ocr_settings(), extractor=EXTRACTOR_VERSION)
+
+
+def make_scheduler(max_workers: int = DEFAULT_MAX_WORKERS, manifest_for=None) -> OCRScheduler:
+    """创建按图片粒度调度的工作池；manifest_for(path) 返回该文件的 SlideManifest 或None"""
+    def parse_file(path):
+        return open_slide_items(path, manifest_for(path) if manifest_for else None)
+
+    return OCRScheduler(parse_file, ocr_image_item, assemble_slide_texts, max_workers=max_workers,
+                        skip_image=skipped_image_record, on_cancel=cancel_pending_ocr)
+
+
+def cancel_pending_ocr():
+    """撤回两个批处理队列中尚未开始的识别请求"""
+    cancelled = latex_batcher.cancel_pending()
+    if tesseract_batcher is not None:
+        cancelled += tesseract_batcher.cancel_pending()
+    if cancelled:
+        metrics.inc("ocr_cancelled", cancelled)
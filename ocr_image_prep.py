@@ -0,0 +1,99 @@
+import io
+import os
+import math
+
+from PIL import Image
+
+
+# 文字引擎与公式引擎分别设置像素上限，超出时等比缩小，限制单张图片的识别耗时与内存
+TEXT_PREP = {
+    "max_pixels": int(os.environ.get("PPTEXOCR_TEXT_MAX_PIXELS", str(8_000_000))),
+    "grayscale": True,
+}
+FORMULA_PREP = {
+    "max_pixels": int(os.environ.get("PPTEXOCR_FORMULA_MAX_PIXELS", str(1_500_000))),
+    "grayscale": False,
+}
+# 解码时的像素上限：满足两个引擎中较大的需求即可
+DECODE_MAX_PIXELS = max(TEXT_PREP["max_pixels"], FORMULA_PREP["max_pixels"])
+
+
+def prep_settings() -> dict:
+    """影响识别结果的预处理设置，作为缓存键的一部分"""
+    return {"text": dict(TEXT_PREP), "formula": dict(FORMULA_PREP)}
+
+
+def fitted_size(size, max_pixels: int):
+    """按像素上限等比缩放后的尺寸，未超出时原样返回"""
+    width, height = size
+    if max_pixels <= 0 or width * height <= max_pixels:
+        return width, height
+    scale = math.sqrt(max_pixels / (width * height))
+    return max(1, int(width * scale)), max(1, int(height * scale))
+
+
+def flatten_alpha(img: Image.Image, background=(255, 255, 255)) -> Image.Image:
+    """把带透明通道的图片合成到白底上"""
+    if img.mode in ("RGBA", "LA", "PA") or (img.mode == "P" and "transparency" in img.info):
+        rgba = img.convert("RGBA")
+        flat = Image.new("RGB", rgba.size, background)
+        flat.paste(rgba, mask=rgba.getchannel("A"))
+        return flat
+    return img
+
+
+def normalize_mode(img: Image.Image) -> Image.Image:
+    """去除透明通道，把CMYK、调色板、16位等模式统一为RGB或L"""
+    img = flatten_alpha(img)
+    if img.mode in ("RGB", "L"):
+        return img
+    if img.mode in ("1", "I;16", "I;16B", "I;16L", "I", "F"):
+        if img.mode != "1":
+            # 高位深灰度图（16位PNG解码为 I;16）先按实际取值范围缩放到8位，直接转换会截断成接近全白
+            if img.mode.startswith("I;16"):
+                img = img.convert("I")
+            lo, hi = img.getextrema()
+            scale = 255.0 / (hi - lo) if hi > lo else 1.0
+            return img.point(lambda v: (v - lo) * scale).convert("L")
+        return img.convert("L")
+    return img.convert("RGB")
+
+
+def open_image(image_bytes: bytes, max_pixels: int = DECODE_MAX_PIXELS) -> Image.Image:
+    """解码图片：JPEG使用draft模式按目标尺寸降采样解码，结果统一为RGB或L并限制像素数"""
+    img = Image.open(io.BytesIO(image_bytes))
+    if img.format == "JPEG":
+        target = fitted_size(img.size, max_pixels)
+        if target != img.size:
+            img.draft(None, target)
+    img.load()
+    img = normalize_mode(img)
+    return fit_pixels(img, max_pixels)
+
+
+def fit_pixels(img: Image.Image, max_pixels: int) -> Image.Image:
+    """像素数超出上限时等比缩小"""
+    target = fitted_size(img.size, max_pixels)
+    if target == img.size:
+        return img
+    # 先用整数倍reduce快速缩小，再精确缩放到目标尺寸
+    factor = min(img.size[0] // target[0], img.size[1] // target[1])
+    if factor >= 2:
+        img = img.reduce(factor)
+    return img.resize(target, Image.Resampling.LANCZOS)
+
+
+def prepare_for_text(img: Image.Image, settings: dict = TEXT_PREP) -> Image.Image:
+    """文字OCR的输入：灰度并限制像素数"""
+    img = normalize_mode(img)
+    if settings.get("grayscale") and img.mode != "L":
+        img = img.convert("L")
+    return fit_pixels(img, settings["max_pixels"])
+
+
+def prepare_for_formula(img: Image.Image, settings: dict = FORMULA_PREP) -> Image.Image:
+    """公式识别的输入：按设置转换颜色并限制像素数"""
+    img = normalize_mode(img)
+    if settings.get("grayscale") and img.mode != "L":
+        img = img.convert("L")
+    return fit_pixels(img, settings["max_pixels"])
@@ -0,0 +1,192 @@
+import os
+import json
+import time
+import socket
+import sqlite3
+import threading
+
+from ocr_cache import DEFAULT_CACHE_DIR
+from ocr_scheduler import PRIORITY_NORMAL
+
+
+DEFAULT_JOBS_DB = os.environ.get("PPTEXOCR_JOBS_DB", os.path.join(DEFAULT_CACHE_DIR, "jobs.sqlite3"))
+# 工作进程领取任务后的租约（秒），期间定时续约；进程崩溃后租约到期，任务重新排队
+DEFAULT_LEASE_SECONDS = float(os.environ.get("PPTEXOCR_JOB_LEASE", "30"))
+# 因工作进程异常退出而重试的次数上限（含第一次）
+DEFAULT_MAX_ATTEMPTS = int(os.environ.get("PPTEXOCR_JOB_ATTEMPTS", "3"))
+
+# 任务状态
+QUEUED = "queued"
+RUNNING = "running"
+DONE = "done"
+FAILED = "failed"
+CANCELLED = "cancelled"
+FINAL_STATES = (DONE, FAILED, CANCELLED)
+
+_SUMMARY_COLUMNS = ("id", "path", "status", "priority", "attempts", "worker", "error",
+                    "created", "started", "finished")
+
+
+def worker_name(pid=None) -> str:
+    """工作进程标识：主机名与进程号"""
+    return f"{socket.gethostname()}:{pid or os.getpid()}"
+
+
+class JobQueue:
+    """基于SQLite的持久化任务队列，多个进程可同时打开同一个数据库
+
+    任务以文件为单位：领取时加租约，工作进程定时续约；租约到期未完成的任务视为工作进程已崩溃，
+    重新排队直到达到重试上限。识别结果（文本与结构化结果）保存在任务中供客户端查询。
+    """
+
+    def __init__(self, path=DEFAULT_JOBS_DB, max_attempts=DEFAULT_MAX_ATTEMPTS):
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        self.path = path
+        self.max_attempts = max(1, max_attempts)
+        self._lock = threading.Lock()
+        # 自动提交模式，事务由 BEGIN IMMEDIATE 显式控制，跨进程领取任务时互斥
+        self._conn = sqlite3.connect(path, check_same_thread=False, timeout=30, isolation_level=None)
+        self._conn.row_factory = sqlite3.Row
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS jobs ("
+            " id INTEGER PRIMARY KEY AUTOINCREMENT,"
+            " path TEXT NOT NULL,"
+            " status TEXT NOT NULL,"
+            " priority INTEGER NOT NULL,"
+            " attempts INTEGER NOT NULL DEFAULT 0,"
+            " worker TEXT,"
+            " lease_until REAL,"
+            " error TEXT,"
+            " text TEXT,"
+            " document TEXT,"
+            " created REAL NOT NULL,"
+            " started REAL,"
+            " finished REAL)"
+        )
+        self._conn.execute("CREATE INDEX IF NOT EXISTS idx_jobs_queue ON jobs(status, priority, id)")
+
+    def _transaction(self, fn):
+        with self._lock:
+            self._conn.execute("BEGIN IMMEDIATE")
+            try:
+                result = fn(self._conn)
+            except BaseException:
+                self._conn.execute("ROLLBACK")
+                raise
+            self._conn.execute("COMMIT")
+            return result
+
+    def submit(self, path: str, priority: int = PRIORITY_NORMAL) -> int:
+        """加入队列，返回任务编号"""
+        def run(conn):
+            cur = conn.execute("INSERT INTO jobs (path, status, priority, created) VALUES (?, ?, ?, ?)",
+                               (path, QUEUED, priority, time.time()))
+            return cur.lastrowid
+        return self._transaction(run)
+
+    def claim(self, worker: str, lease: float = DEFAULT_LEASE_SECONDS):
+        """领取优先级最高、最早提交的任务，没有时返回None；领取前先回收租约到期的任务"""
+        def run(conn):
+            now = time.time()
+            self._expire(conn, now)
+            row = conn.execute("SELECT id FROM jobs WHERE status = ? ORDER BY priority, id LIMIT 1",
+                               (QUEUED,)).fetchone()
+            if row is None:
+                return None
+            conn.execute("UPDATE jobs SET status = ?, worker = ?, attempts = attempts + 1, lease_until = ?,"
+                         " started = ?, error = NULL WHERE id = ?", (RUNNING, worker, now + lease, now, row["id"]))
+            return self._summary(conn.execute("SELECT * FROM jobs WHERE id = ?", (row["id"],)).fetchone())
+        return self._transaction(run)
+
+    def _expire(self, conn, now, where="lease_until < ?", params=None):
+        rows = conn.execute(f"SELECT id, attempts, worker FROM jobs WHERE status = ? AND {where}",
+                            (RUNNING,) + tuple(params if params is not None else (now,))).fetchall()
+        for row in rows:
+            if row["attempts"] >= self.max_attempts:
+                conn.execute("UPDATE jobs SET status = ?, finished = ?, error = ?, lease_until = NULL WHERE id = ?",
+                             (FAILED, now, f"工作进程 {row['worker']} 异常退出，已尝试 {row['attempts']} 次",
+                              row["id"]))
+            else:
+                conn.execute("UPDATE jobs SET status = ?, worker = NULL, lease_until = NULL WHERE id = ?",
+                             (QUEUED, row["id"]))
+        return len(rows)
+
+    def release_worker(self, worker: str) -> int:
+        """工作进程已退出时立即回收它持有的任务，不必等待租约到期"""
+        return self._transaction(lambda conn: self._expire(conn, time.time(), "worker = ?", (worker,)))
+
+    def heartbeat(self, job_id: int, worker: str, lease: float = DEFAULT_LEASE_SECONDS) -> bool:
+        """续约；任务已被取消或租约已失效时返回False，工作进程应停止处理"""
+        def run(conn):
+            cur = conn.execute("UPDATE jobs SET lease_until = ? WHERE id = ? AND worker = ? AND status = ?",
+                               (time.time() + lease, job_id, worker, RUNNING))
+            return cur.rowcount == 1
+        return self._transaction(run)
+
+    def complete(self, job_id: int, worker: str, text: str, document=None) -> bool:
+        """保存结果；只有仍持有该任务的工作进程可以提交"""
+        def run(conn):
+            cur = conn.execute(
+                "UPDATE jobs SET status = ?, text = ?, document = ?, finished = ?, lease_until = NULL"
+                " WHERE id = ? AND worker = ? AND status = ?",
+                (DONE, text, json.dumps(document, ensure_ascii=False) if document is not None else None,
+                 time.time(), job_id, worker, RUNNING))
+            return cur.rowcount == 1
+        return self._transaction(run)
+
+    def fail(self, job_id: int, worker: str, error: str) -> bool:
+        """文件本身出错（无法解析等）不重试，直接标记失败"""
+        def run(conn):
+            cur = conn.execute("UPDATE jobs SET status = ?, error = ?, finished = ?, lease_until = NULL"
+                               " WHERE id = ? AND worker = ? AND status = ?",
+                               (FAILED, error, time.time(), job_id, worker, RUNNING))
+            return cur.rowcount == 1
+        return self._transaction(run)
+
+    def cancel(self, job_id: int) -> bool:
+        """取消排队中或处理中的任务；处理中的任务在下次续约时停止"""
+        def run(conn):
+            cur = conn.execute("UPDATE jobs SET status = ?, finished = ?, lease_until = NULL"
+                               " WHERE id = ? AND status IN (?, ?)",
+                               (CANCELLED, time.time(), job_id, QUEUED, RUNNING))
+            return cur.rowcount == 1
+        return self._transaction(run)
+
+    @staticmethod
+    def _summary(row) -> dict:
+        return {name: row[name] for name in _SUMMARY_COLUMNS}
+
+    def get(self, job_id: int, with_result: bool = False):
+        """任务状态，with_result 时包含文本与结构化结果；不存在时为None"""
+        with self._lock:
+            row = self._conn.execute("SELECT * FROM jobs WHERE id = ?", (job_id,)).fetchone()
+        if row is None:
+            return None
+        job = self._summary(row)
+        if with_result:
+            job["text"] = row["text"]
+            job["document"] = json.loads(row["document"]) if row["document"] else None
+        return job
+
+    def list_jobs(self, status=None, limit: int = 100) -> list:
+        """最近的任务，按编号倒序"""
+        sql = f"SELECT {', '.join(_SUMMARY_COLUMNS)} FROM jobs"
+        params = ()
+        if status:
+            sql += " WHERE status = ?"
+            params = (status,)
+        sql += " ORDER BY id DESC LIMIT ?"
+        with self._lock:
+            rows = self._conn.execute(sql, params + (limit,)).fetchall()
+        return [self._summary(row) for row in rows]
+
+    def counts(self) -> dict:
+        with self._lock:
+            rows = self._conn.execute("SELECT status, COUNT(*) FROM jobs GROUP BY status").fetchall()
+        return {status: count for status, count in rows}
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
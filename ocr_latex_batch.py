@@ -0,0 +1,200 @@
+import os
+import time
+import queue
+import threading
+from concurrent.futures import Future
+
+from PIL import Image
+
+from ocr_metrics import metrics
+from ocr_budget import EngineTimeout, LATEX_MAX_TOKENS
+
+
+DEFAULT_BATCH_SIZE = int(os.environ.get("PPTEXOCR_LATEX_BATCH", "8"))
+DEFAULT_MAX_WAIT = float(os.environ.get("PPTEXOCR_LATEX_WAIT_MS", "50")) / 1000
+
+# 同一批内宽度按该粒度分桶，限制补白带来的额外计算
+WIDTH_BUCKET = 128
+
+
+def prepare_latex_image(model, img: Image.Image) -> Image.Image:
+    """与LatexOCR.__call__相同的预处理：补白、缩放并用尺寸预测网络选择最佳宽度"""
+    import numpy as np
+    import torch
+    from pix2tex.cli import minmax_size
+    from pix2tex.dataset.transforms import test_transform
+    from pix2tex.utils import pad
+
+    args = model.args
+    img = minmax_size(pad(img), args.max_dimensions, args.min_dimensions)
+    if model.image_resizer is None or args.no_resize:
+        return pad(img)
+
+    with torch.no_grad():
+        input_image = img.convert('RGB').copy()
+        r, w, h = 1, input_image.size[0], input_image.size[1]
+        for _ in range(10):
+            h = int(h * r)
+            img = pad(minmax_size(
+                input_image.resize((w, h), Image.Resampling.BILINEAR if r > 1 else Image.Resampling.LANCZOS),
+                args.max_dimensions, args.min_dimensions))
+            t = test_transform(image=np.array(img.convert('RGB')))['image'][:1].unsqueeze(0)
+            w = (model.image_resizer(t.to(args.device)).argmax(-1).item() + 1) * 32
+            if w == img.size[0]:
+                break
+            r = w / img.size[0]
+    return img
+
+
+def batch_key(img: Image.Image):
+    """按高度与宽度区间分组，同组图片补白到相同尺寸后一次推理"""
+    w, h = img.size
+    return h, (w + WIDTH_BUCKET - 1) // WIDTH_BUCKET
+
+
+def run_latex_batch(model, images: list, max_tokens: int = LATEX_MAX_TOKENS) -> list:
+    """对一组预处理后的图片补白到同一尺寸，编码器与解码器各执行一次
+
+    解码最多 max_tokens 步（0 为模型上限）；到达上限仍未结束的公式在结果中为 EngineTimeout。
+    """
+    import numpy as np
+    import torch
+    from pix2tex.dataset.transforms import test_transform
+    from pix2tex.utils import post_process, token2str
+
+    args = model.args
+    width = max(img.size[0] for img in images)
+    height = max(img.size[1] for img in images)
+
+    tensors = []
+    for img in images:
+        canvas = Image.new('L', (width, height), 255)
+        canvas.paste(img.convert('L'), (0, 0))
+        tensors.append(test_transform(image=np.array(canvas.convert('RGB')))['image'][:1])
+    batch = torch.stack(tensors).to(args.device)
+
+    # 与 Model.generate 相同，只是解码步数受时间预算限制
+    seq_len = min(max_tokens, args.max_seq_len) if max_tokens > 0 else args.max_seq_len
+    with torch.no_grad():
+        start_tokens = torch.LongTensor([args.bos_token] * len(images))[:, None].to(batch.device)
+        dec = model.model.decoder.generate(start_tokens, seq_len, eos_token=args.eos_token,
+                                           context=model.model.encoder(batch),
+                                           temperature=args.get('temperature', .25))
+
+    results = []
+    for row in dec.tolist():
+        # 批量解码时已结束的序列仍会继续生成，截断到第一个结束符
+        if args.eos_token in row:
+            row = row[:row.index(args.eos_token)]
+        elif len(row) >= seq_len:
+            results.append(EngineTimeout("pix2tex", f"解码 {seq_len} 步仍未结束"))
+            continue
+        results.append(post_process(token2str(torch.tensor(row, dtype=torch.long), model.tokenizer)[0]))
+    return results
+
+
+class LatexBatcher:
+    """收集来自多个幻灯片和文件的公式识别请求，按尺寸分组批量推理
+
+    model_loader 在首次提交时才被调用，模型可以延迟加载。
+    """
+
+    def __init__(self, model_loader, batch_size=DEFAULT_BATCH_SIZE, max_wait=DEFAULT_MAX_WAIT):
+        self.model_loader = model_loader
+        self.batch_size = max(1, batch_size)
+        self.max_wait = max(0.0, max_wait)
+        self._queue = queue.Queue()
+        self._thread = None
+        self._start_lock = threading.Lock()
+
+    def submit(self, img: Image.Image) -> Future:
+        """提交一张图片，返回结果为LaTeX字符串的Future"""
+        future = Future()
+        try:
+            prepared = prepare_latex_image(self.model_loader(), img)
+        except Exception as e:
+            future.set_exception(e)
+            return future
+        self._ensure_started()
+        metrics.observe("queue_depth_pix2tex", self._queue.qsize())
+        self._queue.put((prepared, future))
+        return future
+
+    def _ensure_started(self):
+        with self._start_lock:
+            if self._thread is None or not self._thread.is_alive():
+                self._thread = threading.Thread(target=self._loop, daemon=True)
+                self._thread.start()
+
+    def _loop(self):
+        while True:
+            first = self._queue.get()
+            if first is None:
+                return
+            pending = [first]
+            stop = False
+            deadline = time.monotonic() + self.max_wait
+            while len(pending) < self.batch_size:
+                timeout = deadline - time.monotonic()
+                if timeout <= 0:
+                    break
+                try:
+                    item = self._queue.get(timeout=timeout)
+                except queue.Empty:
+                    break
+                if item is None:
+                    stop = True
+                    break
+                pending.append(item)
+
+            self._process(pending)
+            if stop:
+                return
+
+    def _process(self, pending):
+        groups = {}
+        for img, future in pending:
+            # 已被取消的请求不参与推理
+            if not future.set_running_or_notify_cancel():
+                continue
+            groups.setdefault(batch_key(img), []).append((img, future))
+
+        for items in groups.values():
+            try:
+                with metrics.timer("pix2tex_batch_seconds"):
+                    results = run_latex_batch(self.model_loader(), [img for img, _ in items])
+                metrics.observe("pix2tex_batch_size", len(items))
+            except Exception as e:
+                metrics.inc("pix2tex_batch_failures")
+                for _, future in items:
+                    future.set_exception(e)
+                continue
+            for (_, future), latex in zip(items, results):
+                if isinstance(latex, Exception):
+                    future.set_exception(latex)
+                else:
+                    future.set_result(latex)
+
+    def cancel_pending(self) -> int:
+        """取消仍在队列中的请求，返回取消的数量；正在推理的批次照常完成"""
+        cancelled = 0
+        stop = False
+        while True:
+            try:
+                item = self._queue.get_nowait()
+            except queue.Empty:
+                break
+            if item is None:
+                stop = True
+                continue
+            item[1].cancel()
+            cancelled += 1
+        if stop:
+            self._queue.put(None)
+        return cancelled
+
+    def close(self):
+        """处理完已提交的请求后停止批处理线程"""
+        if self._thread is not None and self._thread.is_alive():
+            self._queue.put(None)
+            self._thread.join()
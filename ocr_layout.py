@@ -0,0 +1,265 @@
+import os
+
+from PIL import Image
+
+from ocr_image_prep import flatten_alpha
+
+
+# on: 先定位公式区域，只把区域裁剪图送给 pix2tex；off: 整张图片送给 pix2tex
+LAYOUT_MODE = os.environ.get("PPTEXOCR_LAYOUT", "on")
+# 规则变化时递增，使缓存中按旧规则得到的结果失效
+LAYOUT_VERSION = 1
+
+# 置信度不低于该值、不含数学符号的词视为普通文字，定位公式前从墨迹中去除
+TEXT_WORD_CONF = 70
+MATH_CHARS = set("=+^_<>|~\\{}≤≥≠≈±×÷∑∏∫√∞∂∇∈∉⊂⊆∪∩→←⇒⇔∀∃αβγδεθλμπρστφωΣΠΔΩ")
+# 连通域分析时把图片缩小到的最长边
+LAYOUT_MAX_SIDE = 512
+# 与背景的灰度差超过该值视为墨迹
+INK_THRESHOLD = 64
+# 连通域的最少墨迹像素（缩小后），更小的视为噪点或标点
+MIN_REGION_INK = 12
+# 区域合计超过图片面积的该比例，或区域数超过上限时，直接识别整张图片
+FULL_REGION_RATIO = 0.6
+MAX_REGIONS = 12
+
+
+def layout_setting() -> str:
+    """影响识别结果的版面设置，作为缓存键的一部分"""
+    return f"on-v{LAYOUT_VERSION}" if LAYOUT_MODE == "on" else "off"
+
+
+def word_boxes(data, scale: float = 1.0) -> list:
+    """image_to_data 结果中的非空词：[(文字, 置信度, (x0, y0, x1, y1)), ...]，坐标乘以 scale"""
+    if not data:
+        return []
+    words = []
+    for i, text in enumerate(data["text"]):
+        if not str(text).strip():
+            continue
+        left, top = float(data["left"][i]), float(data["top"][i])
+        width, height = float(data["width"][i]), float(data["height"][i])
+        box = (left * scale, top * scale, (left + width) * scale, (top + height) * scale)
+        words.append((str(text).strip(), float(data["conf"][i]), box))
+    return words
+
+
+def is_plain_word(text: str, conf: float) -> bool:
+    """高置信度且不含数学符号的词；单个拉丁字母常是公式中的变量，不算（汉字与 a/A/I 除外）"""
+    if conf < TEXT_WORD_CONF or MATH_CHARS.intersection(text):
+        return False
+    return len(text) >= 2 or text in ("a", "A", "I") or ord(text) >= 0x2E80
+
+
+def ink_mask(img: Image.Image):
+    """缩小后的墨迹掩码与缩放比例（掩码坐标 = 原图坐标 * 比例）"""
+    import numpy as np
+
+    gray = flatten_alpha(img).convert("L")
+    scale = min(1.0, LAYOUT_MAX_SIDE / max(gray.size))
+    if scale < 1.0:
+        gray = gray.resize((max(1, round(gray.width * scale)), max(1, round(gray.height * scale))),
+                           Image.Resampling.BILINEAR)
+    pixels = np.asarray(gray, dtype=np.int16)
+    background = int(np.bincount(pixels.ravel(), minlength=256).argmax())
+    return np.abs(pixels - background) > INK_THRESHOLD, scale
+
+
+def _dilate(mask, dx: int, dy: int):
+    out = mask.copy()
+    for i in range(1, dx + 1):
+        out[:, i:] |= mask[:, :-i]
+        out[:, :-i] |= mask[:, i:]
+    wide = out.copy()
+    for i in range(1, dy + 1):
+        out[i:] |= wide[:-i]
+        out[:-i] |= wide[i:]
+    return out
+
+
+def connected_boxes(mask) -> list:
+    """8连通域的外接框 [(x0, y0, x1, y1), ...]（右、下边界不含）：逐行取连续段，与上一行相接的段合并"""
+    import numpy as np
+
+    parent = []
+    spans = []  # 每段的 (x0, x1, y)
+
+    def find(i):
+        while parent[i] != i:
+            parent[i] = parent[parent[i]]
+            i = parent[i]
+        return i
+
+    prev = []
+    for y in range(mask.shape[0]):
+        padded = np.concatenate(([False], mask[y], [False]))
+        edges = np.flatnonzero(padded[1:] != padded[:-1]).tolist()
+        cur = []
+        j = 0
+        for start, end in zip(edges[0::2], edges[1::2]):
+            run = len(parent)
+            parent.append(run)
+            spans.append((start, end, y))
+            while j < len(prev) and prev[j][1] < start:
+                j += 1
+            k = j
+            while k < len(prev) and prev[k][0] <= end:
+                a, b = find(run), find(prev[k][2])
+                if a != b:
+                    parent[a] = b
+                k += 1
+            cur.append((start, end, run))
+        prev = cur
+
+    boxes = {}
+    for run, (start, end, y) in enumerate(spans):
+        root = find(run)
+        box = boxes.get(root)
+        if box is None:
+            boxes[root] = [start, y, end, y + 1]
+        else:
+            box[0] = min(box[0], start)
+            box[2] = max(box[2], end)
+            box[3] = y + 1
+    return [tuple(box) for box in boxes.values()]
+
+
+def _merge_overlapping(boxes: list) -> list:
+    boxes = [list(b) for b in boxes]
+    merged = True
+    while merged:
+        merged = False
+        for i in range(len(boxes)):
+            for j in range(i + 1, len(boxes)):
+                a, b = boxes[i], boxes[j]
+                if a[0] < b[2] and b[0] < a[2] and a[1] < b[3] and b[1] < a[3]:
+                    boxes[i] = [min(a[0], b[0]), min(a[1], b[1]), max(a[2], b[2]), max(a[3], b[3])]
+                    del boxes[j]
+                    merged = True
+                    break
+            if merged:
+                break
+    return [tuple(b) for b in boxes]
+
+
+def formula_regions(img: Image.Image, data=None, data_scale: float = 1.0) -> list:
+    """定位公式区域，按阅读顺序返回原图坐标的框 [(x0, y0, x1, y1), ...]
+
+    data 为文字OCR的 image_to_data 结果（坐标乘以 data_scale 后为原图坐标），其中的普通文字词先从墨迹中去除；
+    剩余墨迹膨胀后取连通域，过滤噪点并合并重叠框。没有 data 时只凭连通域定位。
+    区域占图片大部分或过于零碎时返回整张图片。
+    """
+    import numpy as np
+
+    width, height = img.size
+    full = [(0, 0, width, height)]
+    mask, scale = ink_mask(img)
+    words = word_boxes(data, data_scale * scale)
+    plain = [box for text, conf, box in words if is_plain_word(text, conf)]
+    for x0, y0, x1, y1 in plain:
+        mask[max(0, int(y0) - 1):int(y1) + 2, max(0, int(x0) - 1):int(x1) + 2] = False
+    if not mask.any():
+        return []
+
+    # 按文字行高决定膨胀距离，使同一公式的符号连成一片
+    heights = sorted(y1 - y0 for _, _, (x0, y0, x1, y1) in words)
+    line_h = heights[len(heights) // 2] if heights else mask.shape[0] / 20
+    line_h = max(4.0, line_h)
+    dilated = _dilate(mask, max(2, round(line_h * 0.6)), max(1, round(line_h * 0.25)))
+
+    regions = []
+    for x0, y0, x1, y1 in connected_boxes(dilated):
+        ink = mask[y0:y1, x0:x1]
+        if int(ink.sum()) < MIN_REGION_INK:
+            continue
+        # 收缩到实际墨迹的范围
+        rows = np.flatnonzero(ink.any(axis=1))
+        cols = np.flatnonzero(ink.any(axis=0))
+        box = (x0 + cols[0], y0 + rows[0], x0 + cols[-1] + 1, y0 + rows[-1] + 1)
+        if max(box[2] - box[0], box[3] - box[1]) < line_h * 0.5:
+            continue
+        regions.append(box)
+    if not regions:
+        return []
+
+    # 换回原图坐标并留出边距
+    pad = max(2.0, line_h / scale * 0.3)
+    regions = _merge_overlapping([
+        (max(0, int(x0 / scale - pad)), max(0, int(y0 / scale - pad)),
+         min(width, int(x1 / scale + pad + 1)), min(height, int(y1 / scale + pad + 1)))
+        for x0, y0, x1, y1 in regions
+    ])
+    area = sum((x1 - x0) * (y1 - y0) for x0, y0, x1, y1 in regions)
+    if len(regions) > MAX_REGIONS or area >= FULL_REGION_RATIO * width * height:
+        return full
+    return [seg["box"] for row in reading_order([{"box": box} for box in regions]) for seg in row]
+
+
+def reading_order(segments: list) -> list:
+    """按行从上到下、行内从左到右排列带 box 的片段，返回行列表 [[片段, ...], ...]
+
+    片段与当前行在垂直方向重叠超过两者中较矮者高度的一半时归入同一行。
+    """
+    rows = []
+    for seg in sorted(segments, key=lambda s: (s["box"][1] + s["box"][3]) / 2):
+        y0, y1 = seg["box"][1], seg["box"][3]
+        if rows:
+            row_y0, row_y1, row = rows[-1]
+            overlap = min(y1, row_y1) - max(y0, row_y0)
+            if overlap >= 0.5 * min(y1 - y0, row_y1 - row_y0):
+                rows[-1] = (min(y0, row_y0), max(y1, row_y1), row + [seg])
+                continue
+        rows.append((y0, y1, [seg]))
+    return [sorted(row, key=lambda s: s["box"][0]) for _, _, row in rows]
+
+
+def compose_layout(data, data_scale: float, formulas: list):
+    """把文字词与公式按阅读顺序排成版面片段 [{"kind", "text", "box", "line"}, ...]
+
+    formulas 为 [{"box", "latex"}, ...]；落在公式区域内的词不再作为文字输出。
+    文字与公式都有时才返回版面，否则为None（按原来的方式分别输出）。
+    """
+    if not formulas:
+        return None
+
+    def inside(box, region):
+        cx, cy = (box[0] + box[2]) / 2, (box[1] + box[3]) / 2
+        return region[0] <= cx <= region[2] and region[1] <= cy <= region[3]
+
+    segments = [
+        {"kind": "text", "text": text, "box": box}
+        for text, _, box in word_boxes(data, data_scale)
+        if not any(inside(box, f["box"]) for f in formulas)
+    ]
+    if not segments:
+        return None
+    segments += [{"kind": "formula", "text": f["latex"], "box": tuple(f["box"])} for f in formulas]
+
+    layout = []
+    for line, row in enumerate(reading_order(segments)):
+        for seg in row:
+            last = layout[-1] if layout else None
+            # 同一行中相邻的词合并为一个文字片段
+            if last is not None and last["line"] == line and last["kind"] == seg["kind"] == "text":
+                last["text"] += " " + seg["text"]
+                last["box"] = [min(last["box"][0], seg["box"][0]), min(last["box"][1], seg["box"][1]),
+                               max(last["box"][2], seg["box"][2]), max(last["box"][3], seg["box"][3])]
+                continue
+            layout.append({"kind": seg["kind"], "text": seg["text"], "box": list(seg["box"]), "line": line})
+    for seg in layout:
+        seg["box"] = [round(v) for v in seg["box"]]
+    return layout
+
+
+def layout_text(layout: list) -> str:
+    """版面片段的文本形式：每行一段，行内公式写作 $...$，单独成行的公式写作 $$...$$"""
+    lines = {}
+    for seg in layout:
+        lines.setdefault(seg["line"], []).append(seg)
+    out = []
+    for segs in lines.values():
+        alone = all(seg["kind"] == "formula" for seg in segs)
+        parts = [seg["text"] if seg["kind"] == "text" else (f"$${seg['text']}$$" if alone else f"${seg['text']}$")
+                 for seg in segs]
+        out.append(" ".join(parts))
+    return "\n".join(out)
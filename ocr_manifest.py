@@ -0,0 +1,105 @@
+import os
+import json
+import hashlib
+import threading
+
+
+# 清单格式版本，格式变化时递增使旧清单失效（3: 引擎出错的图片不再记入清单）
+MANIFEST_VERSION = 3
+
+
+def manifest_path_for(output_path: str) -> str:
+    """清单文件与输出文件放在一起"""
+    return output_path + ".manifest.json"
+
+
+def slide_fingerprint(slide) -> str:
+    """按幻灯片XML与其引用的媒体计算指纹，slide 为 ocr_slide_xml.XmlSlide
+
+    媒体取zip目录中记录的CRC-32与大小，无需解压图片。
+    """
+    h = hashlib.sha256()
+    h.update(slide.xml)
+    for rId in sorted(slide.rels):
+        rel = slide.rels[rId]
+        if rel.external:
+            h.update(f"{rId}>{rel.target}".encode("utf-8"))
+        elif rel.is_media:
+            media = slide.media(rel.target)
+            digest = f"{media.crc:08x}:{media.size}" if media is not None else "missing"
+            h.update(f"{rId}>{digest}".encode("utf-8"))
+    return h.hexdigest()
+
+
+def is_incomplete(record) -> bool:
+    """图片结果是否因超时、跳过、读取出错或引擎出错而不完整"""
+    return isinstance(record, dict) and bool(record.get("timeouts") or record.get("skipped") or record.get("error")
+                                             or record.get("failed"))
+
+
+class SlideManifest:
+    """单个文件的逐页指纹清单：未变化的页直接复用上次的结果"""
+
+    def __init__(self, source: str, settings: dict, previous=None):
+        self.source = source
+        self.settings = settings
+        self.previous = previous or {}  # fingerprint -> 逐形状结果
+        self.fingerprints = []
+        self.items = {}
+        self.incomplete = set()  # 含超时、跳过或出错图片的页，不写入清单，下次重新识别
+        self.reused = 0
+        self._lock = threading.Lock()
+
+    @classmethod
+    def load(cls, path: str, source: str, settings: dict):
+        """读取已有清单；设置或版本不一致、文件损坏时视为没有清单"""
+        previous = {}
+        try:
+            with open(path, "r", encoding="utf-8") as f:
+                data = json.load(f)
+            if data.get("version") == MANIFEST_VERSION and data.get("settings") == settings:
+                previous = {s["fingerprint"]: s["items"] for s in data.get("slides", [])}
+        except (OSError, ValueError, KeyError, TypeError):
+            previous = {}
+        return cls(source, settings, previous)
+
+    def plan(self, slide):
+        """计算指纹并登记；返回上次的结果，页面有变化时返回None"""
+        fingerprint = slide_fingerprint(slide)
+        with self._lock:
+            self.fingerprints.append(fingerprint)
+            items = self.previous.get(fingerprint)
+            if items is not None:
+                self.reused += 1
+        return items
+
+    def record(self, slide_idx: int, results: list):
+        """记录某页本次的结果"""
+        with self._lock:
+            self.items[slide_idx] = [r for r in results if r]
+            if any(is_incomplete(r) for r in results):
+                self.incomplete.add(slide_idx)
+
+    @property
+    def slide_count(self) -> int:
+        return len(self.fingerprints)
+
+    def save(self, path: str):
+        """原子写入清单"""
+        with self._lock:
+            slides = [
+                {"fingerprint": fp, "items": self.items.get(i, [])}
+                for i, fp in enumerate(self.fingerprints)
+                if i not in self.incomplete
+            ]
+        data = {
+            "version": MANIFEST_VERSION,
+            "source": self.source,
+            "settings": self.settings,
+            "slides": slides,
+        }
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        tmp = path + ".part"
+        with open(tmp, "w", encoding="utf-8") as f:
+            json.dump(data, f, ensure_ascii=False)
+        os.replace(tmp, path)
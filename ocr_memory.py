@@ -0,0 +1,125 @@
+import io
+import os
+import sys
+import time
+import threading
+
+from PIL import Image
+
+from ocr_image_prep import DECODE_MAX_PIXELS, FORMULA_PREP, TEXT_PREP, fitted_size
+
+
+# 同时解码并等待识别的图片占用内存上限（MB），0 表示不限制
+MEMORY_BUDGET_MB = float(os.environ.get("PPTEXOCR_MEMORY_BUDGET_MB", "1024"))
+# 同时打开解析的pptx数量上限，0 表示与工作线程数相同
+MAX_OPEN_FILES = int(os.environ.get("PPTEXOCR_MAX_OPEN_FILES", "0"))
+# 已提交但未完成的图片数达到该值时暂停解析，回落到一半后继续，0 表示不限制
+MAX_PENDING_IMAGES = int(os.environ.get("PPTEXOCR_MAX_PENDING_IMAGES", "256"))
+
+_PAGE_SIZE = os.sysconf("SC_PAGE_SIZE") if hasattr(os, "sysconf") else 4096
+
+
+class MemoryBudget:
+    """按字节计的加权信号量：同时持有的总量不超过上限
+
+    单个请求超过上限时等其他持有者全部释放后再独占，避免永远等待。
+    """
+
+    def __init__(self, limit_bytes: int):
+        self.limit = max(0, int(limit_bytes))
+        self.in_use = 0
+        self.peak = 0
+        self._cond = threading.Condition()
+
+    def acquire(self, amount: int) -> float:
+        """占用 amount 字节，不足时阻塞；返回等待的秒数"""
+        start = time.perf_counter()
+        with self._cond:
+            if self.limit:
+                while self.in_use and self.in_use + amount > self.limit:
+                    self._cond.wait()
+            self.in_use += amount
+            self.peak = max(self.peak, self.in_use)
+        return time.perf_counter() - start
+
+    def release(self, amount: int):
+        with self._cond:
+            self.in_use = max(0, self.in_use - amount)
+            self._cond.notify_all()
+
+
+# 解码后的图片及两个引擎的输入在识别完成前一直占用内存，按估算字节数计入预算
+decode_budget = MemoryBudget(MEMORY_BUDGET_MB * 1024 * 1024)
+
+
+def image_memory_cost(image_bytes: bytes) -> int:
+    """估算解码一张图片并准备两个引擎输入所需的字节数；只读取图片头，无法识别时按0计"""
+    try:
+        with Image.open(io.BytesIO(image_bytes)) as img:
+            size = img.size
+    except Exception:
+        return 0
+    width, height = fitted_size(size, DECODE_MAX_PIXELS)
+    pixels = width * height
+    # 解码图（最多4通道）+ 文字输入（灰度）+ 公式输入（RGB）
+    return (pixels * 4
+            + min(pixels, TEXT_PREP["max_pixels"])
+            + min(pixels, FORMULA_PREP["max_pixels"]) * 3)
+
+
+def _windows_rss():
+    import ctypes
+    from ctypes import wintypes
+
+    class PROCESS_MEMORY_COUNTERS(ctypes.Structure):
+        _fields_ = [
+            ("cb", wintypes.DWORD),
+            ("PageFaultCount", wintypes.DWORD),
+            ("PeakWorkingSetSize", ctypes.c_size_t),
+            ("WorkingSetSize", ctypes.c_size_t),
+            ("QuotaPeakPagedPoolUsage", ctypes.c_size_t),
+            ("QuotaPagedPoolUsage", ctypes.c_size_t),
+            ("QuotaPeakNonPagedPoolUsage", ctypes.c_size_t),
+            ("QuotaNonPagedPoolUsage", ctypes.c_size_t),
+            ("PagefileUsage", ctypes.c_size_t),
+            ("PeakPagefileUsage", ctypes.c_size_t),
+        ]
+
+    counters = PROCESS_MEMORY_COUNTERS()
+    counters.cb = ctypes.sizeof(counters)
+    kernel32 = ctypes.windll.kernel32
+    psapi = ctypes.windll.psapi
+    kernel32.GetCurrentProcess.restype = wintypes.HANDLE
+    psapi.GetProcessMemoryInfo.argtypes = [wintypes.HANDLE, ctypes.POINTER(PROCESS_MEMORY_COUNTERS), wintypes.DWORD]
+    if not psapi.GetProcessMemoryInfo(kernel32.GetCurrentProcess(), ctypes.byref(counters), counters.cb):
+        return None
+    return counters.WorkingSetSize
+
+
+def _max_rss():
+    import resource
+
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Linux 以KB为单位，macOS 以字节为单位
+    return peak if sys.platform == "darwin" else peak * 1024
+
+
+def current_rss():
+    """当前进程的常驻内存（字节），无法获取时为None
+
+    没有 /proc 的类Unix系统（如 macOS）退回到 getrusage 给出的进程启动以来的峰值。
+    """
+    try:
+        with open("/proc/self/statm", "rb") as f:
+            return int(f.read().split()[1]) * _PAGE_SIZE
+    except (OSError, ValueError, IndexError):
+        pass
+    if sys.platform == "win32":
+        try:
+            return _windows_rss()
+        except Exception:
+            return None
+    try:
+        return _max_rss()
+    except (ImportError, OSError, ValueError):
+        return None
@@ -0,0 +1,173 @@
+import os
+import json
+import time
+import threading
+import contextlib
+
+
+# 设置后每批处理结束时把指标写入该文件（.prom/.txt 为Prometheus文本格式，其他为JSON）
+DEFAULT_METRICS_PATH = os.environ.get("PPTEXOCR_METRICS", "")
+
+# 界面日志中汇总显示的阶段及其名称
+STAGE_LABELS = {
+    "open_seconds": "打开文件",
+    "parse_seconds": "解析幻灯片",
+    "cache_seconds": "查询缓存",
+    "decode_seconds": "图片解码",
+    "classify_seconds": "图片分类",
+    "tesseract_seconds": "Tesseract",
+    "pix2tex_seconds": "pix2tex(含排队)",
+    "pix2tex_batch_seconds": "pix2tex批推理",
+    "memory_wait_seconds": "等待内存预算",
+    "file_seconds": "单个文件",
+}
+
+# 流水线各阶段的队列（提交时的排队深度），用于调整各阶段的并发数
+QUEUE_LABELS = {
+    "queue_depth_parse": "解析",
+    "queue_depth_image": "图片",
+    "queue_depth_resume": "图片后续处理",
+    "queue_depth_tesseract": "Tesseract",
+    "queue_depth_pix2tex": "pix2tex",
+    "queue_depth_write": "写出",
+}
+
+
+class _Summary:
+    """观测值的次数、总和、最小与最大值"""
+
+    __slots__ = ("count", "total", "min", "max")
+
+    def __init__(self):
+        self.count = 0
+        self.total = 0.0
+        self.min = None
+        self.max = None
+
+    def add(self, value):
+        self.count += 1
+        self.total += value
+        self.min = value if self.min is None else min(self.min, value)
+        self.max = value if self.max is None else max(self.max, value)
+
+    def as_dict(self) -> dict:
+        return {
+            "count": self.count,
+            "sum": round(self.total, 6),
+            "min": self.min,
+            "max": self.max,
+            "mean": round(self.total / self.count, 6) if self.count else None,
+        }
+
+
+class Metrics:
+    """线程安全的计数器与分阶段耗时统计
+
+    计数器（图片数、字节数、缓存命中、失败数等）用 inc 累加，
+    耗时与尺寸等观测值用 observe 记录，名称以 _seconds 结尾的按秒计。
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.reset()
+
+    def reset(self):
+        with self._lock:
+            self._counters = {}
+            self._summaries = {}
+            self._started = time.time()
+
+    def inc(self, name: str, value=1):
+        with self._lock:
+            self._counters[name] = self._counters.get(name, 0) + value
+
+    def observe(self, name: str, value):
+        if value is None:
+            return
+        with self._lock:
+            summary = self._summaries.get(name)
+            if summary is None:
+                summary = self._summaries[name] = _Summary()
+            summary.add(value)
+
+    @contextlib.contextmanager
+    def timer(self, name: str):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(name, time.perf_counter() - start)
+
+    def snapshot(self) -> dict:
+        with self._lock:
+            return {
+                "started": time.strftime("%Y-%m-%dT%H:%M:%S", time.localtime(self._started)),
+                "elapsed_seconds": round(time.time() - self._started, 3),
+                "counters": dict(self._counters),
+                "summaries": {name: s.as_dict() for name, s in self._summaries.items()},
+            }
+
+    def summary_lines(self) -> list:
+        """供界面日志显示的简要汇总"""
+        snap = self.snapshot()
+        counters = snap["counters"]
+        image_bytes = snap["summaries"].get("image_bytes", {}).get("sum", 0)
+        lines = [
+            f"文件 {counters.get('files', 0)}（失败 {counters.get('files_failed', 0)}，"
+            f"取消 {counters.get('files_cancelled', 0)}），"
+            f"幻灯片 {counters.get('slides', 0)}（复用 {counters.get('slides_reused', 0)}），"
+            f"图片 {counters.get('images', 0)}（{image_bytes / (1024 * 1024):.1f} MB，"
+            f"重复引用复用 {counters.get('media_reused', 0)}），"
+            f"缓存命中 {counters.get('cache_hits', 0)} / 未命中 {counters.get('cache_misses', 0)}，"
+            f"识别失败 {counters.get('ocr_failures', 0)}，超时 {counters.get('image_timeouts', 0)}，"
+            f"未识别 {counters.get('images_skipped', 0)}"
+        ]
+        rss_peak = snap["summaries"].get("file_peak_rss_bytes", {}).get("max") or 0
+        decoded_peak = snap["summaries"].get("decoded_bytes_in_flight", {}).get("max") or 0
+        if rss_peak or decoded_peak:
+            lines.append(f"内存峰值 {rss_peak / (1024 * 1024):.0f} MB，"
+                         f"同时解码的图片最多占用 {decoded_peak / (1024 * 1024):.0f} MB")
+        depths = [f"{label} {s['mean']:.1f}/{s['max']}" for name, label in QUEUE_LABELS.items()
+                  for s in [snap["summaries"].get(name)] if s and s["count"]]
+        if depths:
+            lines.append("队列深度（平均/最大）: " + "，".join(depths))
+        for name, label in STAGE_LABELS.items():
+            s = snap["summaries"].get(name)
+            if s and s["count"]:
+                lines.append(f"{label}: {s['count']} 次，共 {s['sum']:.2f}s，平均 {s['mean'] * 1000:.1f}ms，"
+                             f"最长 {s['max'] * 1000:.1f}ms")
+        return lines
+
+    def to_prometheus(self, prefix: str = "pptexocr") -> str:
+        """Prometheus 文本格式：计数器为 counter，观测值为 summary（_count/_sum）及 _max"""
+        snap = self.snapshot()
+        lines = []
+        for name, value in sorted(snap["counters"].items()):
+            metric = f"{prefix}_{name}_total"
+            lines += [f"# TYPE {metric} counter", f"{metric} {value}"]
+        for name, s in sorted(snap["summaries"].items()):
+            metric = f"{prefix}_{name}"
+            lines += [
+                f"# TYPE {metric} summary",
+                f"{metric}_count {s['count']}",
+                f"{metric}_sum {s['sum']}",
+                f"# TYPE {metric}_max gauge",
+                f"{metric}_max {s['max'] if s['max'] is not None else 0}",
+            ]
+        return "\n".join(lines) + "\n"
+
+    def write(self, path: str):
+        """原子写入指标文件，按扩展名选择格式"""
+        if os.path.splitext(path)[1].lower() in (".prom", ".txt"):
+            content = self.to_prometheus()
+        else:
+            content = json.dumps(self.snapshot(), ensure_ascii=False, indent=1)
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        tmp = path + ".part"
+        with open(tmp, "w", encoding="utf-8") as f:
+            f.write(content)
+        os.replace(tmp, path)
+
+
+# 进程内全局指标
+metrics = Metrics()
@@ -0,0 +1,115 @@
+import os
+import time
+import threading
+
+
+# 推理设备：auto 有CUDA时用GPU，否则CPU；也可指定 cpu / cuda
+LATEX_DEVICE = os.environ.get("PPTEXOCR_LATEX_DEVICE", "auto").lower()
+# CPU推理精度：fp32 为原始模型，int8 对线性层做动态int8量化（在GPU上不生效）
+LATEX_PRECISION = os.environ.get("PPTEXOCR_LATEX_PRECISION", "fp32").lower()
+# torch算子内并行线程数，默认留一半核给tesseract进程与工作池
+TORCH_THREADS = int(os.environ.get("PPTEXOCR_TORCH_THREADS", "0")) or max(1, (os.cpu_count() or 1) // 2)
+# 算子间并行线程数；公式批处理只有一个线程提交推理，1 即可
+TORCH_INTEROP_THREADS = int(os.environ.get("PPTEXOCR_TORCH_INTEROP_THREADS", "1"))
+
+# pix2tex与torch导入耗时较长，全部推迟到首次使用时
+_latex_model = None
+_latex_lock = threading.Lock()
+_latex_load_seconds = None
+_threads_configured = False
+
+
+def get_latex_model():
+    """返回全局pix2tex模型，首次调用时加载（线程安全）"""
+    global _latex_model, _latex_load_seconds
+    if _latex_model is not None:
+        return _latex_model
+    with _latex_lock:
+        if _latex_model is None:
+            start = time.perf_counter()
+            _latex_model = load_latex_model()
+            _latex_load_seconds = time.perf_counter() - start
+    return _latex_model
+
+
+def load_latex_model(device=None, precision=None):
+    """加载一个新的pix2tex模型：按设置选择设备，CPU上可做动态int8量化"""
+    import torch
+    from munch import Munch
+    from pix2tex.cli import LatexOCR
+
+    configure_torch_threads()
+    device = device or latex_device()
+    precision = precision or LATEX_PRECISION
+    model = LatexOCR(Munch({
+        'config': 'settings/config.yaml',
+        'checkpoint': 'checkpoints/weights.pth',
+        'no_cuda': device != 'cuda',
+        'no_resize': False,
+    }))
+    if precision == "int8" and model.args.device == 'cpu':
+        # 编码器与解码器的线性层权重转为int8，激活在推理时动态量化；尺寸预测网络以卷积为主，保持fp32
+        model.model = torch.ao.quantization.quantize_dynamic(model.model, {torch.nn.Linear}, dtype=torch.qint8)
+        model.model.eval()
+    elif precision not in ("fp32", "int8"):
+        raise ValueError(f"不支持的推理精度: {precision}")
+    return model
+
+
+def latex_precision_setting() -> str:
+    """影响公式识别结果的精度设置，无需导入torch"""
+    return LATEX_PRECISION
+
+
+def configure_torch_threads(threads=None, interop_threads=None):
+    """设置torch线程数，只在首次调用时生效；算子间线程数必须在首次并行计算前设置"""
+    global _threads_configured
+    if _threads_configured:
+        return
+    _threads_configured = True
+    import torch
+    torch.set_num_threads(max(1, threads or TORCH_THREADS))
+    try:
+        torch.set_num_interop_threads(max(1, interop_threads or TORCH_INTEROP_THREADS))
+    except RuntimeError:
+        pass
+
+
+def latex_model_loaded() -> bool:
+    return _latex_model is not None
+
+
+def latex_model_load_seconds():
+    """模型加载耗时（秒），尚未加载时为None"""
+    return _latex_load_seconds
+
+
+def warmup_latex_model(on_done=None) -> threading.Thread:
+    """在后台线程预热模型，完成后回调 on_done(error)，成功时 error 为None"""
+    def _run():
+        try:
+            get_latex_model()
+        except Exception as e:
+            if on_done:
+                on_done(e)
+            return
+        if on_done:
+            on_done(None)
+
+    thread = threading.Thread(target=_run, name="latex-warmup", daemon=True)
+    thread.start()
+    return thread
+
+
+def latex_device() -> str:
+    """公式模型的推理设备：auto 时有CUDA用GPU，否则CPU"""
+    if LATEX_DEVICE in ("cpu", "cuda"):
+        return LATEX_DEVICE
+    import torch
+    return 'cuda' if torch.cuda.is_available() else 'cpu'
+
+
+def torch_device():
+    """推理设备：有CUDA时用GPU，否则CPU"""
+    import torch
+    return torch.device(latex_device())
@@ -0,0 +1,123 @@
+import os
+import json
+
+
+# 结构化输出格式版本
+DOCUMENT_VERSION = 1
+
+
+def record_text(record) -> str:
+    """结构化结果对应的文本，兼容纯字符串结果"""
+    if not record:
+        return ""
+    if isinstance(record, dict):
+        return record.get("text") or ""
+    return str(record)
+
+
+def slide_record(slide_idx: int, results: list) -> dict:
+    """单页的结构化结果：页序号（从1开始）与按形状顺序的结果"""
+    items = []
+    for r in results:
+        if not r:
+            continue
+        items.append(r if isinstance(r, dict) else {"kind": "text", "text": str(r)})
+    return {"slide": slide_idx + 1, "items": items}
+
+
+def build_document(source: str, slides: list, elapsed_ms=None, peak_rss=None) -> dict:
+    """整份文件的结构化结果，slides 为 slide_record 列表；位置单位为EMU，peak_rss 为处理期间的内存峰值（字节）"""
+    return {
+        "version": DOCUMENT_VERSION,
+        "file": source,
+        "slide_count": len(slides),
+        "position_unit": "emu",
+        "elapsed_ms": round(elapsed_ms, 1) if elapsed_ms is not None else None,
+        "peak_rss_mb": round(peak_rss / (1024 * 1024), 1) if peak_rss else None,
+        "slides": slides,
+    }
+
+
+def write_json_atomic(path: str, data):
+    write_text_atomic(path, json.dumps(data, ensure_ascii=False, indent=1))
+
+
+def unique_stem(directory: str, stem: str, used: set, exts=(".txt", ".json")) -> str:
+    """在目录中为导出文件取不重名的文件名主干（同批次内或已存在的文件）"""
+    candidate, n = stem, 1
+    while candidate in used or any(os.path.exists(os.path.join(directory, candidate + ext)) for ext in exts):
+        n += 1
+        candidate = f"{stem}_{n}"
+    used.add(candidate)
+    return os.path.join(directory, candidate)
+
+
+def export_to_directory(results, directory: str) -> list:
+    """一次性把所有结果写入同一目录：每个文件一个 .txt 与一个 .json
+
+    results 为 [(源文件, 文本, 结构化结果或None), ...]，返回写出的文件路径。
+    """
+    os.makedirs(directory, exist_ok=True)
+    used = set()
+    written = []
+    for source, text, document in results:
+        base = unique_stem(directory, os.path.splitext(os.path.basename(source))[0], used)
+        write_text_atomic(base + ".txt", text)
+        written.append(base + ".txt")
+        if document is not None:
+            write_json_atomic(base + ".json", document)
+            written.append(base + ".json")
+    return written
+
+
+def export_combined_jsonl(documents, path: str) -> int:
+    """把所有文件的结构化结果写入一个JSON行文件，每个文件一行，返回写出的行数"""
+    os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+    tmp = path + ".part"
+    count = 0
+    with open(tmp, "w", encoding="utf-8") as f:
+        for document in documents:
+            f.write(json.dumps(document, ensure_ascii=False) + "\n")
+            count += 1
+    os.replace(tmp, path)
+    return count
+
+
+def write_text_atomic(path: str, text: str):
+    """先写临时文件再替换，避免中断时留下不完整的输出"""
+    os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+    tmp = path + ".part"
+    with open(tmp, "w", encoding="utf-8") as f:
+        f.write(text)
+    os.replace(tmp, path)
+
+
+class SlideJsonlWriter:
+    """逐页把结果追加写入JSON行文件，每页写完立即刷新到磁盘
+
+    首行记录源文件与幻灯片数，随后每页一行，正常结束时追加结束行；
+    进程中途崩溃时已写出的页仍然可用，缺少结束行即表示文件不完整。
+    """
+
+    def __init__(self, path: str, source: str, slide_count: int):
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        self.path = path
+        self.slides_written = 0
+        self._f = open(path, "w", encoding="utf-8")
+        self._write({"type": "file", "file": source, "slides": slide_count})
+
+    def _write(self, record: dict):
+        self._f.write(json.dumps(record, ensure_ascii=False) + "\n")
+        self._f.flush()
+
+    def write_slide(self, slide_idx: int, results: list):
+        self._write(dict(slide_record(slide_idx, results), type="slide"))
+        self.slides_written += 1
+
+    def close(self, complete: bool = True):
+        if self._f.closed:
+            return
+        if complete:
+            self._write({"type": "end", "slides_written": self.slides_written})
+        self._f.close()
+
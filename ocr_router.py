@@ -0,0 +1,184 @@
+import os
+import json
+import time
+import threading
+
+from PIL import Image
+import pytesseract
+
+from ocr_image_prep import flatten_alpha
+
+
+ROUTE_NONE = "none"
+ROUTE_TEXT = "text"
+ROUTE_FORMULA = "formula"
+ROUTE_BOTH = "both"
+
+# on: 按分类结果跳过不需要的引擎；off: 两个引擎都运行；
+# audit: 两个引擎都运行但记录分类结果，用于评估分类准确率与可节省的时间
+ROUTER_MODE = os.environ.get("PPTEXOCR_ROUTER", "on")
+# 规则变化时递增，使缓存中按旧规则得到的结果失效
+ROUTER_VERSION = 2
+
+DEFAULT_ROUTE_LOG = os.environ.get(
+    "PPTEXOCR_ROUTE_LOG",
+    os.path.join(os.path.expanduser("~"), ".cache", "pptexocr", "route_decisions.jsonl"),
+)
+# 决策日志超过该大小（MB）时改名为 .1（覆盖上一份）并重新开始，最多占用两倍空间；0 表示不限制
+ROUTE_LOG_MAX_MB = float(os.environ.get("PPTEXOCR_ROUTE_LOG_MAX_MB", "16"))
+
+# 分类阈值
+MIN_SIDE = 16              # 小于该边长视为图标/装饰
+MIN_INK_RATIO = 0.002      # 墨迹占比过低视为空白
+PHOTO_COLORS = 1024        # 量化后颜色数超过该值视为照片
+PROSE_MIN_WORDS = 6        # 快速OCR识别出的词数与置信度足够高时视为普通文字
+PROSE_MIN_CONF = 75
+FORMULA_MAX_CONF = 40      # 快速OCR置信度低于该值的线稿视为公式
+QUICK_OCR_MAX_SIDE = 800
+FEATURE_MAX_SIDE = 256     # 计算特征前把图片缩小到的最长边
+
+
+def image_features(img: Image.Image) -> dict:
+    """计算尺寸、长宽比、墨迹占比与颜色数等廉价特征；先缩小再转换颜色模式，不复制原尺寸的图片"""
+    width, height = img.size
+    scale = min(1.0, FEATURE_MAX_SIDE / max(width, height, 1))
+    if scale < 1.0:
+        size = (max(1, round(width * scale)), max(1, round(height * scale)))
+        # reducing_gap 先按整数倍快速缩小，再插值到目标尺寸
+        img = img.resize(size, Image.Resampling.BILINEAR, reducing_gap=2.0)
+    flat = flatten_alpha(img)
+
+    small = flat.convert("RGB")
+    small.thumbnail((128, 128))
+    # 每通道保留5位后统计颜色数，过滤JPEG噪声
+    quantized = small.point(lambda v: v & 0xF8)
+    colors = quantized.getcolors(maxcolors=4096)
+    color_count = len(colors) if colors is not None else 4097
+
+    hist = flat.convert("L").histogram()
+    total = sum(hist) or 1
+    background = max(range(256), key=lambda b: hist[b])
+    ink = sum(count for b, count in enumerate(hist) if abs(b - background) > 64)
+
+    return {
+        "width": width,
+        "height": height,
+        "aspect": round(width / height, 3) if height else 0.0,
+        "mode": img.mode,
+        "colors": color_count,
+        "ink_ratio": round(ink / total, 4),
+    }
+
+
+# 快速OCR的 tesseract 参数
+QUICK_OCR_CONFIG = "--psm 6"
+
+
+def quick_ocr_input(img: Image.Image) -> Image.Image:
+    """快速OCR的输入：去透明、灰度并缩小"""
+    small = flatten_alpha(img).convert("L")
+    small.thumbnail((QUICK_OCR_MAX_SIDE, QUICK_OCR_MAX_SIDE))
+    return small
+
+
+def data_confidence(data: dict):
+    """由 image_to_data 结果得到(词数, 平均置信度)"""
+    confs = [float(c) for c, w in zip(data["conf"], data["text"]) if w.strip() and float(c) >= 0]
+    if not confs:
+        return 0, 0.0
+    return len(confs), sum(confs) / len(confs)
+
+
+def quick_text_confidence(img: Image.Image, lang: str):
+    """对缩小后的图片做一次快速OCR，返回(词数, 平均置信度)"""
+    data = pytesseract.image_to_data(quick_ocr_input(img), lang=lang, config=QUICK_OCR_CONFIG,
+                                     output_type=pytesseract.Output.DICT)
+    return data_confidence(data)
+
+
+def classify_by_features(features: dict):
+    """只凭廉价特征能确定的路由，返回(路由, 原因)；需要快速OCR时返回None"""
+    if min(features["width"], features["height"]) < MIN_SIDE:
+        return ROUTE_NONE, "icon"
+    if features["ink_ratio"] < MIN_INK_RATIO:
+        return ROUTE_NONE, "blank"
+    if features["colors"] > PHOTO_COLORS:
+        # 照片中可能有文字，但几乎不会是公式
+        return ROUTE_TEXT, "photo"
+    return None
+
+
+def classify_by_quick_ocr(features: dict, words: int, conf: float):
+    """按快速OCR的词数与置信度决定路由，words 为负表示快速OCR失败"""
+    features["quick_words"] = words
+    features["quick_conf"] = round(conf, 1)
+    if words < 0:
+        return ROUTE_BOTH, "quick-ocr-failed"
+    if words >= PROSE_MIN_WORDS and conf >= PROSE_MIN_CONF:
+        return ROUTE_TEXT, "prose"
+    if words == 0 or conf < FORMULA_MAX_CONF:
+        return ROUTE_FORMULA, "low-text-confidence"
+    return ROUTE_BOTH, "mixed"
+
+
+def make_decision(route: str, reason: str, features: dict, start: float) -> dict:
+    return {
+        "route": route,
+        "reason": reason,
+        "features": features,
+        "classify_ms": round((time.perf_counter() - start) * 1000, 2),
+    }
+
+
+def classify_image(img: Image.Image, lang: str) -> dict:
+    """决定图片需要文字OCR、公式识别、两者或都不需要"""
+    start = time.perf_counter()
+    features = image_features(img)
+    decided = classify_by_features(features)
+    if decided is None:
+        try:
+            words, conf = quick_text_confidence(img, lang)
+        except Exception:
+            words, conf = -1, 0.0
+        decided = classify_by_quick_ocr(features, words, conf)
+    return make_decision(*decided, features, start)
+
+
+def route_engines(decision) -> tuple:
+    """按路由模式返回(是否运行文字OCR, 是否运行公式识别)"""
+    if decision is None or ROUTER_MODE != "on":
+        return True, True
+    route = decision["route"]
+    return route in (ROUTE_TEXT, ROUTE_BOTH), route in (ROUTE_FORMULA, ROUTE_BOTH)
+
+
+def router_setting() -> str:
+    """影响识别结果的路由设置，作为缓存键的一部分"""
+    return f"on-v{ROUTER_VERSION}" if ROUTER_MODE == "on" else "off"
+
+
+class RouteLog:
+    """以JSON行记录每次路由决策及各引擎耗时与输出情况，超过大小上限时轮转"""
+
+    def __init__(self, path=DEFAULT_ROUTE_LOG, max_bytes=ROUTE_LOG_MAX_MB * 1024 * 1024):
+        self.path = path
+        self.max_bytes = max(0, int(max_bytes))
+        self._lock = threading.Lock()
+        if path:
+            os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+
+    def record(self, entry: dict):
+        if not self.path:
+            return
+        entry = dict(entry, mode=ROUTER_MODE, time=time.strftime("%Y-%m-%dT%H:%M:%S"))
+        line = json.dumps(entry, ensure_ascii=False)
+        with self._lock:
+            try:
+                with open(self.path, "a", encoding="utf-8") as f:
+                    f.write(line + "\n")
+                    size = f.tell()
+                if self.max_bytes and size > self.max_bytes:
+                    # 多个进程共用日志时其他进程可能刚写入的几行随旧文件一起改名，不影响统计用途
+                    os.replace(self.path, self.path + ".1")
+            except OSError:
+                pass
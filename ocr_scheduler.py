@@ -0,0 +1,473 @@
+import os
+import time
+import heapq
+import queue
+import itertools
+import threading
+from concurrent.futures import Future
+
+from ocr_budget import FILE_TIMEOUT, SKIP_CANCELLED, SKIP_TIMEOUT
+from ocr_memory import MAX_OPEN_FILES, MAX_PENDING_IMAGES, current_rss
+from ocr_metrics import metrics
+
+
+DEFAULT_MAX_WORKERS = int(os.environ.get("PPTEXOCR_WORKERS", "0")) or max(1, min(os.cpu_count() or 1, 4))
+# 解析线程数：读取pptx压缩包以IO为主，与图片线程分开，避免解析排在识别后面
+DEFAULT_PARSE_WORKERS = int(os.environ.get("PPTEXOCR_PARSE_WORKERS", "2"))
+# 图片队列与写出队列的容量，队列满时上一阶段等待，0 表示不限制
+DEFAULT_QUEUE_SIZE = int(os.environ.get("PPTEXOCR_STAGE_QUEUE", "64"))
+
+# 任务种类排序：同一文件内先解析，再识别图片
+_KIND_PARSE = 0
+_KIND_IMAGE = 1
+
+# 文件优先级：数值小的先处理，同一优先级内按添加顺序
+PRIORITY_URGENT = 0
+PRIORITY_NORMAL = 1
+
+# 记录当前线程所属的调度器，供识别代码把引擎完成后的后续工作交回图片阶段
+_current = threading.local()
+
+
+def current_image_stage():
+    """在调度器的线程中调用时返回该调度器的 submit_image，否则为None"""
+    scheduler = getattr(_current, "scheduler", None)
+    return scheduler.submit_image if scheduler is not None else None
+
+
+class _SlideState:
+    """单页幻灯片的结果槽位，图片位置先占位"""
+
+    def __init__(self, results, pending):
+        self.results = results
+        self.pending = pending
+
+
+class _FileTask:
+    """单个文件在调度器中的状态"""
+
+    def __init__(self, index, path, priority=PRIORITY_NORMAL):
+        self.index = index
+        self.path = path
+        self.priority = priority
+        self.deadline = None    # 超过该时刻（monotonic）后不再开始新的图片识别
+        self.parse_started = False
+        self.waiting = False    # 是否在等待打开文件名额的堆中
+        self.wait_gen = 0       # 堆中条目的版本，调整优先级后旧条目作废
+        self.slide_iter = None  # 解析中的逐页迭代器，暂停解析时保留
+        self.peak_rss = None    # 处理期间进程常驻内存的峰值（字节）
+        self.cancelled = False  # 是否有内容因取消而未处理
+        self.slide_count = 0
+        self.slides = []        # 已解析页的 _SlideState
+        self.emitted = []       # 已按顺序交付的逐页结果
+        self.parsed = False     # 是否已解析完全部幻灯片
+        self.finished = False
+        self.lock = threading.Lock()
+
+
+class OCRScheduler:
+    """全局有界工作池：把所有文件拆分成逐图片任务，在固定数量的线程上调度
+
+    parse_file(path) 返回 (幻灯片数, 逐页产生条目列表 [(kind, value), ...] 的可迭代对象)，
+    每解析完一页就提交该页的图片任务。kind 为 "text" 时 value 直接作为结果，
+    为 "image" 时交给 ocr_image(value) 识别，ocr_image 可以直接返回结果，
+    也可以返回Future（如公式批处理），工作线程不会等待它；
+    assemble(slides) 把逐页结果拼成整份文本。
+
+    skip_image(value, reason) 给出未识别图片的结果：文件超出 file_timeout 秒的时间预算后，
+    尚未开始的图片以 reason="timeout" 跳过；cancel() 之后以 reason="cancelled" 跳过，
+    并调用 on_cancel() 撤回已提交但未开始的识别请求。
+
+    内存方面：同时解析的文件不超过 max_open_files 个，其余文件等待名额；已提交未完成的图片
+    达到 max_pending_images 张时暂停解析，回落到一半后继续。等待与暂停都不占用工作线程。
+
+    流水线：解析（parse_workers 个线程）→ 图片解码与提交（max_workers 个线程）→
+    Tesseract / pix2tex 批处理（各自的线程与进程）→ 写出（单个线程，按顺序执行全部回调）。
+    阶段之间是有界队列（queue_size），各阶段同时运行，队列深度记入指标 queue_depth_*。
+    引擎完成后的后续工作（如按分类结果提交公式识别）用 submit_image 交回图片阶段，
+    这些工作在图片阶段单独的线程上执行，不受队列容量与内存预算的阻塞，避免与等待预算的新图片互相等待。
+    """
+
+    def __init__(self, parse_file, ocr_image, assemble, max_workers=None, skip_image=None, on_cancel=None,
+                 file_timeout=FILE_TIMEOUT, max_open_files=MAX_OPEN_FILES, max_pending_images=MAX_PENDING_IMAGES,
+                 parse_workers=DEFAULT_PARSE_WORKERS, queue_size=DEFAULT_QUEUE_SIZE):
+        self.parse_file = parse_file
+        self.ocr_image = ocr_image
+        self.assemble = assemble
+        self.max_workers = max(1, max_workers or DEFAULT_MAX_WORKERS)
+        self.parse_workers = max(1, parse_workers)
+        self.skip_image = skip_image or (lambda value, reason: None)
+        self.on_cancel = on_cancel
+        self.file_timeout = file_timeout
+        self.max_open_files = max(1, max_open_files or self.max_workers)
+        self.max_pending_images = max(0, max_pending_images)
+        self._pressure_lock = threading.Lock()
+        self._open_files = 0
+        self._waiting_open = []     # 等待解析名额的文件，按(优先级, 文件顺序)的堆
+        self._pending_images = 0
+        self._paused = []           # 因待处理图片过多而暂停解析的文件
+        # 解析队列不设上限：解析任务可能由图片线程、回调线程重新提交，不能在这里阻塞
+        self._parse_queue = queue.PriorityQueue()
+        self._image_queue = queue.PriorityQueue(max(0, queue_size))
+        self._resume_queue = queue.Queue()
+        self._write_queue = queue.Queue(max(0, queue_size))
+        self._seq = itertools.count()
+        self._remaining = 0
+        self._all_done = threading.Condition()
+        self._cancel = threading.Event()
+        self._tasks = {}
+
+    @property
+    def cancelled(self) -> bool:
+        return self._cancel.is_set()
+
+    def cancel(self):
+        """停止处理：未开始的文件与图片不再处理，正在运行的识别完成后即结束，可在任意线程调用"""
+        if self._cancel.is_set():
+            return
+        self._cancel.set()
+        if self.on_cancel is not None:
+            self.on_cancel()
+        # 等待名额的文件不会再被唤醒，直接重新排队，以取消结束
+        with self._pressure_lock:
+            waiting = [task for _, _, gen, task in self._waiting_open if task.waiting and gen == task.wait_gen]
+            self._waiting_open = []
+            for task in waiting:
+                task.waiting = False
+        for task in waiting:
+            self._submit(task, _KIND_PARSE, self._parse_job, task)
+
+    def peak_rss(self, path):
+        """文件处理期间观测到的进程常驻内存峰值（字节）；多个文件并行时为它们共同的占用"""
+        task = self._tasks.get(path)
+        return task.peak_rss if task is not None else None
+
+    def set_priority(self, path, priority):
+        """调整文件的优先级；对尚未开始解析的文件及其之后提交的图片生效"""
+        task = self._tasks.get(path)
+        if task is None:
+            return
+        with task.lock:
+            task.priority = priority
+            if task.parse_started:
+                return
+        with self._pressure_lock:
+            if task.waiting:
+                # 正在等待名额：按新优先级放入堆，原条目作废
+                self._push_waiting(task)
+                return
+        # 原来的解析任务仍在队列中，开始时发现已被重新提交的任务处理过会直接返回
+        self._submit(task, _KIND_PARSE, self._parse_job, task)
+
+    def run(self, paths, on_progress=None, on_finished=None, on_error=None, on_slide=None, on_cancelled=None,
+            priorities=None):
+        """处理一批文件，阻塞直到全部完成或取消
+
+        以下回调均在写出线程中按发生顺序逐个执行，回调抛出的异常交给 on_error：
+        on_progress(path, msg)、on_finished(path, text)、on_error(path, exc)，
+        on_slide(path, slide_idx, slide_count, results) 按幻灯片顺序逐页交付结果，
+        因取消而未处理完的文件调用 on_cancelled(path) 代替 on_finished。
+        priorities 为 {path: 优先级}，未给出的文件为 PRIORITY_NORMAL。
+        """
+        self._on_progress = on_progress or (lambda path, msg: None)
+        self._on_finished = on_finished or (lambda path, text: None)
+        self._on_error = on_error or (lambda path, exc: None)
+        self._on_slide = on_slide or (lambda path, slide_idx, slide_count, results: None)
+        self._on_cancelled = on_cancelled or (lambda path: None)
+        self._cancel.clear()
+        self._open_files = self._pending_images = 0
+        self._waiting_open, self._paused = [], []
+
+        priorities = priorities or {}
+        tasks = [_FileTask(i, p, priorities.get(p, PRIORITY_NORMAL)) for i, p in enumerate(paths)]
+        if not tasks:
+            return
+        self._tasks = {task.path: task for task in tasks}
+        self._remaining = len(tasks)
+        for task in tasks:
+            self._submit(task, _KIND_PARSE, self._parse_job, task)
+
+        stages = ([self._parse_queue] * self.parse_workers + [self._image_queue] * self.max_workers
+                  + [self._resume_queue] * self.max_workers + [self._write_queue])
+        workers = [threading.Thread(target=self._worker_loop, args=(q,), daemon=True) for q in stages]
+        for w in workers:
+            w.start()
+
+        try:
+            with self._all_done:
+                while self._remaining:
+                    self._all_done.wait()
+        except KeyboardInterrupt:
+            # 撤回未开始的工作后再退出，工作线程为守护线程
+            self.cancel()
+            raise
+
+        # 通知各阶段的线程退出
+        for q in stages:
+            q.put(((float("inf"),), next(self._seq), None, ()))
+        for w in workers:
+            w.join()
+
+    def _submit(self, task, kind, fn, *args):
+        # 按(优先级, 文件顺序)排序：靠前文件的图片与解析先执行
+        if kind == _KIND_PARSE:
+            q, stage = self._parse_queue, "parse"
+        else:
+            q, stage = self._image_queue, "image"
+        metrics.observe(f"queue_depth_{stage}", q.qsize())
+        q.put(((task.priority, task.index, kind), next(self._seq), fn, args))
+
+    def submit_image(self, fn, *args):
+        """在图片阶段执行已解码图片的后续工作，可在任意线程调用，不会阻塞"""
+        metrics.observe("queue_depth_resume", self._resume_queue.qsize())
+        self._resume_queue.put((None, next(self._seq), fn, args))
+
+    def _deliver(self, fn, *args):
+        # 交给写出线程；写出队列满时等待，使识别不会远远跑在写出前面
+        metrics.observe("queue_depth_write", self._write_queue.qsize())
+        self._write_queue.put((None, next(self._seq), fn, args))
+
+    def _worker_loop(self, q):
+        _current.scheduler = self
+        while True:
+            _, _, fn, args = q.get()
+            if fn is None:
+                return
+            fn(*args)
+
+    def _call(self, callback, path, *args):
+        try:
+            callback(path, *args)
+        except Exception as e:
+            if callback is self._on_error:
+                return
+            try:
+                self._on_error(path, e)
+            except Exception:
+                pass
+
+    def _parse_job(self, task):
+        with task.lock:
+            if task.parse_started:
+                return
+            task.parse_started = True
+        if self.cancelled:
+            task.cancelled = True
+            with task.lock:
+                task.finished = True
+            self._finish(task, None)
+            return
+        with self._pressure_lock:
+            if self._open_files >= self.max_open_files and not self.cancelled:
+                # 打开的文件已达上限：放回等待堆，有文件解析结束时再排队
+                with task.lock:
+                    task.parse_started = False
+                # 队列中可能还有同一文件较早提交的解析任务，已在堆中时不重复加入
+                if not task.waiting:
+                    self._push_waiting(task)
+                return
+            self._open_files += 1
+        self._deliver(self._call, self._on_progress, task.path, "解析中...")
+        if self.file_timeout > 0:
+            task.deadline = time.monotonic() + self.file_timeout
+        try:
+            task.slide_count, slides = self.parse_file(task.path)
+            task.slide_iter = iter(slides)
+        except Exception as e:
+            self._end_parse(task)
+            self._parse_failed(task, e)
+            return
+        self._sample_memory(task)
+        self._parse_slides(task)
+
+    def _parse_slides(self, task):
+        """逐页解析并提交图片任务；待处理的图片过多时暂停，由 _store 在回落后重新排队继续"""
+        slides = task.slide_iter
+        try:
+            for slide_items in slides:
+                if self.cancelled:
+                    # 剩余的页不再解析，已解析的页照常交付
+                    task.cancelled = True
+                    close = getattr(slides, "close", None)
+                    if close is not None:
+                        close()
+                    break
+                self._add_slide(task, slide_items)
+                if self._pause_parse(task):
+                    return
+        except Exception as e:
+            self._end_parse(task)
+            self._parse_failed(task, e)
+            return
+
+        self._end_parse(task)
+        with task.lock:
+            task.parsed = True
+        self._emit_ready(task)
+
+    def _parse_failed(self, task, e):
+        with task.lock:
+            if task.finished:
+                return
+            task.finished = True
+        self._deliver(self._call, self._on_error, task.path, e)
+        self._finish(task, "")
+
+    def _pause_parse(self, task) -> bool:
+        with self._pressure_lock:
+            if not self.max_pending_images or self._pending_images < self.max_pending_images:
+                return False
+            self._paused.append(task)
+            return True
+
+    def _end_parse(self, task):
+        """文件解析结束（或出错）：归还打开文件名额，让等待最久的高优先级文件开始解析"""
+        task.slide_iter = None
+        waiting = None
+        with self._pressure_lock:
+            self._open_files -= 1
+            # 调整优先级后堆中会留下作废的条目，跳过
+            while self._waiting_open:
+                _, _, gen, candidate = heapq.heappop(self._waiting_open)
+                if candidate.waiting and gen == candidate.wait_gen:
+                    candidate.waiting = False
+                    waiting = candidate
+                    break
+        if waiting is not None:
+            self._submit(waiting, _KIND_PARSE, self._parse_job, waiting)
+
+    def _push_waiting(self, task):
+        # 调用方持有 _pressure_lock
+        task.waiting = True
+        task.wait_gen += 1
+        heapq.heappush(self._waiting_open, ((task.priority, task.index), next(self._seq), task.wait_gen, task))
+
+    def _sample_memory(self, task):
+        rss = current_rss()
+        if rss is not None and (task.peak_rss is None or rss > task.peak_rss):
+            task.peak_rss = rss
+
+    def _add_slide(self, task, slide_items):
+        results = [None] * len(slide_items)
+        images = []
+        for item_idx, (kind, value) in enumerate(slide_items):
+            if kind == "image":
+                images.append((item_idx, value))
+            else:
+                results[item_idx] = value
+
+        with task.lock:
+            slide_idx = len(task.slides)
+            task.slides.append(_SlideState(results, len(images)))
+        if images:
+            with self._pressure_lock:
+                self._pending_images += len(images)
+        self._sample_memory(task)
+
+        if not images:
+            self._emit_ready(task)
+        for item_idx, value in images:
+            self._submit(task, _KIND_IMAGE, self._image_job, task, slide_idx, item_idx, value)
+
+    def _image_job(self, task, slide_idx, item_idx, value):
+        if self.cancelled:
+            task.cancelled = True
+            self._store(task, slide_idx, item_idx, self.skip_image(value, SKIP_CANCELLED))
+            return
+        if task.deadline is not None and time.monotonic() > task.deadline:
+            self._store(task, slide_idx, item_idx, self.skip_image(value, SKIP_TIMEOUT))
+            return
+        try:
+            result = self.ocr_image(value)
+        except Exception as e:
+            self._deliver(self._call, self._on_error, task.path, e)
+            result = None
+        if isinstance(result, Future):
+            result.add_done_callback(lambda f: self._store_future(task, slide_idx, item_idx, value, f))
+            return
+        self._store(task, slide_idx, item_idx, result)
+
+    def _store_future(self, task, slide_idx, item_idx, value, future):
+        if future.cancelled():
+            task.cancelled = True
+            self._store(task, slide_idx, item_idx, self.skip_image(value, SKIP_CANCELLED))
+            return
+        try:
+            result = future.result()
+        except Exception as e:
+            self._deliver(self._call, self._on_error, task.path, e)
+            result = None
+        self._store(task, slide_idx, item_idx, result)
+
+    def _store(self, task, slide_idx, item_idx, result):
+        self._image_done(task)
+        with task.lock:
+            slide = task.slides[slide_idx]
+            if slide is None:
+                return
+            slide.results[item_idx] = result
+            slide.pending -= 1
+        self._emit_ready(task)
+
+    def _image_done(self, task):
+        # 待处理的图片回落到上限的一半时，继续所有暂停的解析（继续后各自再检查一次）
+        self._sample_memory(task)
+        with self._pressure_lock:
+            self._pending_images -= 1
+            if not self._paused or self._pending_images > self.max_pending_images // 2:
+                return
+            paused, self._paused = self._paused, []
+        for paused_task in paused:
+            self._submit(paused_task, _KIND_PARSE, self._parse_slides, paused_task)
+
+    def _emit_ready(self, task):
+        # 在文件锁内按顺序交给写出线程，保证 on_slide 的调用顺序与幻灯片顺序一致
+        with task.lock:
+            if task.finished:
+                return
+            while len(task.emitted) < len(task.slides):
+                slide_idx = len(task.emitted)
+                slide = task.slides[slide_idx]
+                if slide.pending:
+                    break
+                task.emitted.append(slide.results)
+                task.slides[slide_idx] = None
+                self._deliver(self._call, self._on_slide, task.path, slide_idx, task.slide_count, slide.results)
+                self._deliver(self._call, self._on_progress, task.path, f"第 {slide_idx + 1}/{task.slide_count} 页")
+
+            if not task.parsed or len(task.emitted) < len(task.slides):
+                return
+            task.finished = True
+            slides = task.emitted
+            task.emitted = []
+            task.slides = []
+
+        if task.cancelled:
+            self._finish(task, None)
+            return
+        # 拼接整份文本也放在写出线程中
+        self._sample_memory(task)
+        self._deliver(self._assemble, task, slides)
+
+    def _assemble(self, task, slides):
+        try:
+            text = self.assemble(slides)
+        except Exception as e:
+            self._call(self._on_error, task.path, e)
+            text = ""
+        self._complete(task, text)
+
+    def _finish(self, task, text):
+        # text 为None表示因取消而未处理完
+        self._sample_memory(task)
+        self._deliver(self._complete, task, text)
+
+    def _complete(self, task, text):
+        # 在写出线程中执行，此前交付的逐页结果与消息都已处理完
+        if text is None:
+            self._call(self._on_cancelled, task.path)
+        else:
+            self._call(self._on_finished, task.path, text)
+        with self._all_done:
+            self._remaining -= 1
+            self._all_done.notify_all()
@@ -0,0 +1,375 @@
+import os
+import sys
+import json
+import time
+import signal
+import argparse
+import threading
+import subprocess
+import urllib.error
+import urllib.parse
+import urllib.request
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from ocr_jobs import (
+    DEFAULT_JOBS_DB, DEFAULT_LEASE_SECONDS, FINAL_STATES, CANCELLED, JobQueue, worker_name,
+)
+from ocr_scheduler import PRIORITY_NORMAL
+
+
+DEFAULT_HOST = "127.0.0.1"
+DEFAULT_PORT = int(os.environ.get("PPTEXOCR_SERVER_PORT", "8765"))
+# 客户端连接的服务地址，设置后界面与命令行把文件提交给服务处理
+DEFAULT_SERVER_URL = os.environ.get("PPTEXOCR_SERVER", "")
+# 工作进程数；每个进程各自加载一次公式模型，内存占用随进程数增加
+DEFAULT_SERVER_WORKERS = int(os.environ.get("PPTEXOCR_SERVER_WORKERS", "0")) or max(1, min((os.cpu_count() or 1) // 2, 4))
+# 工作进程空闲时查询新任务的间隔（秒）
+POLL_INTERVAL = 0.5
+
+
+# ---- 工作进程 ----
+
+def process_job(queue: JobQueue, job: dict, worker: str, lease: float):
+    """用进程内的工作池处理一个文件；续约失败（任务被取消）时停止"""
+    from ocr_core import make_scheduler
+    from ocr_output import build_document, slide_record
+
+    scheduler = make_scheduler()
+    slides = []
+    errors = []
+    outcome = {}
+    stop = threading.Event()
+
+    def keep_alive():
+        while not stop.wait(lease / 3):
+            try:
+                alive = queue.heartbeat(job["id"], worker, lease)
+            except Exception:
+                continue
+            if not alive:
+                scheduler.cancel()
+                return
+
+    def on_slide(path, slide_idx, slide_count, results):
+        slides.append(slide_record(slide_idx, results))
+
+    heartbeat = threading.Thread(target=keep_alive, daemon=True)
+    heartbeat.start()
+    start = time.perf_counter()
+    try:
+        scheduler.run(
+            [job["path"]],
+            on_finished=lambda path, text: outcome.setdefault("text", text),
+            on_error=lambda path, e: errors.append(str(e)),
+            on_slide=on_slide,
+            on_cancelled=lambda path: outcome.setdefault("cancelled", True),
+        )
+    finally:
+        stop.set()
+        heartbeat.join()
+
+    if outcome.get("cancelled"):
+        return
+    text = outcome.get("text", "")
+    if errors and not text:
+        queue.fail(job["id"], worker, errors[0])
+        return
+    document = build_document(job["path"], slides, (time.perf_counter() - start) * 1000,
+                              scheduler.peak_rss(job["path"]))
+    queue.complete(job["id"], worker, text, document)
+
+
+def worker_main(db_path: str, lease: float):
+    """工作进程：加载一次模型，循环领取并处理任务，收到终止信号后处理完当前任务再退出"""
+    from ocr_models import warmup_latex_model
+
+    stopping = threading.Event()
+    # 终端中的 Ctrl+C 由服务进程处理，服务停止时再通知工作进程
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+    signal.signal(signal.SIGTERM, lambda *_: stopping.set())
+    worker = worker_name()
+    parent = os.getppid()
+    queue = JobQueue(db_path)
+    warmup_latex_model()
+    # 服务进程意外退出时不再领取新任务
+    while not stopping.is_set() and os.getppid() == parent:
+        job = queue.claim(worker, lease)
+        if job is None:
+            stopping.wait(POLL_INTERVAL)
+            continue
+        try:
+            process_job(queue, job, worker, lease)
+        except Exception as e:
+            queue.fail(job["id"], worker, str(e))
+    queue.close()
+
+
+# ---- 服务与工作进程管理 ----
+
+class WorkerPool:
+    """启动并看护工作进程：进程退出后回收其任务并重新启动"""
+
+    def __init__(self, db_path: str, count: int, lease: float, log):
+        self.db_path = db_path
+        self.count = max(1, count)
+        self.lease = lease
+        self.log = log
+        self.queue = JobQueue(db_path)
+        self.procs = []
+        self._stopping = threading.Event()
+        self._thread = None
+
+    def _env(self):
+        # 多个工作进程共享CPU：未显式设置时按进程数分配torch线程与tesseract进程数
+        env = dict(os.environ)
+        share = max(1, (os.cpu_count() or 1) // self.count)
+        env.setdefault("PPTEXOCR_TORCH_THREADS", str(max(1, share // 2)))
+        env.setdefault("PPTEXOCR_TESSERACT_PROCS", str(share))
+        env.setdefault("PPTEXOCR_WORKERS", str(share))
+        return env
+
+    def _spawn(self):
+        return subprocess.Popen(
+            [sys.executable, os.path.abspath(__file__), "--worker", "--db", self.db_path, "--lease", str(self.lease)],
+            env=self._env(),
+        )
+
+    def start(self):
+        self.procs = [self._spawn() for _ in range(self.count)]
+        self._thread = threading.Thread(target=self._watch, daemon=True)
+        self._thread.start()
+
+    def _watch(self):
+        while not self._stopping.wait(1.0):
+            for i, proc in enumerate(self.procs):
+                code = proc.poll()
+                if code is None:
+                    continue
+                released = self.queue.release_worker(worker_name(proc.pid))
+                self.log(f"工作进程 {proc.pid} 退出（退出码 {code}），重新排队 {released} 个任务并重启")
+                self.procs[i] = self._spawn()
+
+    def alive(self) -> int:
+        return sum(1 for proc in self.procs if proc.poll() is None)
+
+    def stop(self):
+        self._stopping.set()
+        if self._thread is not None:
+            self._thread.join()
+        for proc in self.procs:
+            if proc.poll() is None:
+                proc.terminate()
+        for proc in self.procs:
+            try:
+                proc.wait(timeout=60)
+            except subprocess.TimeoutExpired:
+                proc.kill()
+            self.queue.release_worker(worker_name(proc.pid))
+
+
+class _Handler(BaseHTTPRequestHandler):
+    """JSON接口：
+    POST /jobs {"paths": [...], "priority": 0} 提交文件；GET /jobs?status=&limit= 列出任务；
+    GET /jobs/<id> 查询状态；GET /jobs/<id>/result 取结果；DELETE /jobs/<id> 取消；GET /health 队列与工作进程状况
+    """
+
+    server_version = "PPTexOCR"
+
+    def log_message(self, fmt, *args):
+        if not self.server.quiet:
+            super().log_message(fmt, *args)
+
+    def _send(self, status: int, data):
+        body = json.dumps(data, ensure_ascii=False).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json; charset=utf-8")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def _job_id(self, parts):
+        try:
+            return int(parts[1])
+        except (IndexError, ValueError):
+            return None
+
+    def do_GET(self):
+        url = urllib.parse.urlparse(self.path)
+        parts = [p for p in url.path.split("/") if p]
+        queue = self.server.queue
+        if parts == ["health"]:
+            self._send(200, {"jobs": queue.counts(), "workers": self.server.pool.alive()})
+        elif parts == ["jobs"]:
+            query = urllib.parse.parse_qs(url.query)
+            status = query.get("status", [None])[0]
+            try:
+                limit = int(query.get("limit", ["100"])[0])
+                if limit < 1:
+                    raise ValueError(limit)
+            except ValueError:
+                self._send(400, {"error": "limit 必须是正整数"})
+                return
+            self._send(200, {"jobs": queue.list_jobs(status, limit)})
+        elif parts[:1] == ["jobs"] and self._job_id(parts) is not None and parts[2:] in ([], ["result"]):
+            with_result = parts[2:] == ["result"]
+            job = queue.get(self._job_id(parts), with_result=with_result)
+            if job is None:
+                self._send(404, {"error": "任务不存在"})
+            elif with_result and job["status"] not in FINAL_STATES:
+                self._send(409, {"error": "任务尚未完成", "status": job["status"]})
+            else:
+                self._send(200, job)
+        else:
+            self._send(404, {"error": "未知路径"})
+
+    def do_POST(self):
+        if self.path.rstrip("/") != "/jobs":
+            self._send(404, {"error": "未知路径"})
+            return
+        try:
+            length = int(self.headers.get("Content-Length", "0"))
+            data = json.loads(self.rfile.read(length) or b"{}")
+            if not isinstance(data, dict):
+                raise TypeError("请求体必须是JSON对象")
+            paths = data.get("paths") or ([data["path"]] if data.get("path") else [])
+            if not isinstance(paths, list):
+                raise TypeError("paths 必须是列表")
+            priority = int(data.get("priority", PRIORITY_NORMAL))
+        except (ValueError, TypeError, KeyError) as e:
+            self._send(400, {"error": f"请求格式错误: {e}"})
+            return
+        # 工作进程与服务在同一台机器上，路径必须是服务可以读取的绝对路径
+        missing = [p for p in paths if not (isinstance(p, str) and os.path.isabs(p) and os.path.isfile(p))]
+        if not paths or missing:
+            self._send(400, {"error": "需要可读取的pptx绝对路径", "invalid": missing})
+            return
+        jobs = [{"id": self.server.queue.submit(p, priority), "path": p} for p in paths]
+        self._send(201, {"jobs": jobs})
+
+    def do_DELETE(self):
+        parts = [p for p in urllib.parse.urlparse(self.path).path.split("/") if p]
+        job_id = self._job_id(parts) if parts[:1] == ["jobs"] and len(parts) == 2 else None
+        if job_id is None:
+            self._send(404, {"error": "未知路径"})
+            return
+        if self.server.queue.cancel(job_id):
+            self._send(200, {"id": job_id, "status": CANCELLED})
+        else:
+            job = self.server.queue.get(job_id)
+            self._send(404 if job is None else 409, {"error": "任务不存在或已结束"})
+
+
+def serve(host, port, db_path, workers, lease, quiet=False):
+    def log(msg):
+        print(msg, file=sys.stderr, flush=True)
+
+    pool = WorkerPool(db_path, workers, lease, log)
+    httpd = ThreadingHTTPServer((host, port), _Handler)
+    httpd.queue = JobQueue(db_path)
+    httpd.pool = pool
+    httpd.quiet = quiet
+    # 收到终止信号时与 Ctrl+C 一样先停止接收请求，再等待工作进程处理完当前任务
+    signal.signal(signal.SIGTERM, lambda *_: threading.Thread(target=httpd.shutdown, daemon=True).start())
+    pool.start()
+    log(f"识别服务 http://{host}:{port}，工作进程 {pool.count} 个，任务库 {db_path}")
+    try:
+        httpd.serve_forever()
+    except KeyboardInterrupt:
+        log("正在停止，等待工作进程处理完当前任务...")
+    finally:
+        httpd.server_close()
+        pool.stop()
+
+
+# ---- 客户端 ----
+
+class JobClient:
+    """识别服务的HTTP客户端"""
+
+    def __init__(self, url: str, timeout: float = 30):
+        self.url = url.rstrip("/")
+        self.timeout = timeout
+
+    def _request(self, method, path, data=None):
+        body = json.dumps(data).encode("utf-8") if data is not None else None
+        req = urllib.request.Request(self.url + path, data=body, method=method,
+                                     headers={"Content-Type": "application/json"})
+        try:
+            with urllib.request.urlopen(req, timeout=self.timeout) as resp:
+                return json.loads(resp.read())
+        except urllib.error.HTTPError as e:
+            try:
+                message = json.loads(e.read()).get("error", e.reason)
+            except ValueError:
+                message = e.reason
+            raise RuntimeError(f"识别服务返回 {e.code}: {message}") from None
+
+    def submit(self, paths, priority: int = PRIORITY_NORMAL) -> list:
+        """提交文件，返回任务编号列表（与 paths 顺序一致）"""
+        jobs = self._request("POST", "/jobs", {"paths": [os.path.abspath(p) for p in paths], "priority": priority})
+        return [job["id"] for job in jobs["jobs"]]
+
+    def status(self, job_id: int) -> dict:
+        return self._request("GET", f"/jobs/{job_id}")
+
+    def result(self, job_id: int) -> dict:
+        """已结束任务的状态、文本与结构化结果"""
+        return self._request("GET", f"/jobs/{job_id}/result")
+
+    def cancel(self, job_id: int) -> bool:
+        try:
+            self._request("DELETE", f"/jobs/{job_id}")
+            return True
+        except (OSError, RuntimeError):
+            return False
+
+    def health(self) -> dict:
+        return self._request("GET", "/health")
+
+    def wait(self, job_ids, on_done, on_status=None, interval=1.0, stop=None):
+        """轮询直到所有任务结束，每个任务结束时调用 on_done(job_id, 含结果的任务)
+
+        on_status(job_id, status) 在状态变化时调用；stop 为 threading.Event，被设置后提前返回。
+        """
+        pending = {job_id: None for job_id in job_ids}
+        while pending and not (stop is not None and stop.is_set()):
+            for job_id in list(pending):
+                status = self.status(job_id)["status"]
+                if status != pending[job_id] and on_status is not None:
+                    on_status(job_id, status)
+                pending[job_id] = status
+                if status in FINAL_STATES:
+                    del pending[job_id]
+                    on_done(job_id, self.result(job_id))
+            if pending:
+                if stop is not None:
+                    stop.wait(interval)
+                else:
+                    time.sleep(interval)
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description="本机识别服务：持久化任务队列 + 多个工作进程")
+    parser.add_argument("--host", default=DEFAULT_HOST, help=f"监听地址（默认 {DEFAULT_HOST}）")
+    parser.add_argument("--port", type=int, default=DEFAULT_PORT, help=f"端口（默认 {DEFAULT_PORT}）")
+    parser.add_argument("-w", "--workers", type=int, default=DEFAULT_SERVER_WORKERS,
+                        help=f"工作进程数（默认 {DEFAULT_SERVER_WORKERS}）")
+    parser.add_argument("--db", default=DEFAULT_JOBS_DB, help="任务库路径")
+    parser.add_argument("--lease", type=float, default=DEFAULT_LEASE_SECONDS,
+                        help="任务租约秒数，工作进程崩溃后任务在租约到期时重新排队")
+    parser.add_argument("-q", "--quiet", action="store_true", help="不输出访问日志")
+    parser.add_argument("--worker", action="store_true", help=argparse.SUPPRESS)
+    args = parser.parse_args(argv)
+
+    if args.worker:
+        worker_main(args.db, args.lease)
+        return 0
+    if args.workers < 1:
+        print("错误: 工作进程数必须大于0", file=sys.stderr)
+        return 2
+    serve(args.host, args.port, args.db, args.workers, args.lease, args.quiet)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
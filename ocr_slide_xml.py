@@ -0,0 +1,289 @@
+import weakref
+import zipfile
+import posixpath
+import threading
+
+from lxml import etree
+
+
+# OOXML 命名空间
+NS_P = "http://schemas.openxmlformats.org/presentationml/2006/main"
+NS_A = "http://schemas.openxmlformats.org/drawingml/2006/main"
+NS_R = "http://schemas.openxmlformats.org/officeDocument/2006/relationships"
+NS_MC = "http://schemas.openxmlformats.org/markup-compatibility/2006"
+NS_PKG_RELS = "http://schemas.openxmlformats.org/package/2006/relationships"
+
+RT_OFFICE_DOCUMENT = "http://schemas.openxmlformats.org/officeDocument/2006/relationships/officeDocument"
+
+
+def _p(tag):
+    return f"{{{NS_P}}}{tag}"
+
+
+def _a(tag):
+    return f"{{{NS_A}}}{tag}"
+
+
+P_SP, P_PIC, P_GRPSP, P_GRAPHICFRAME = _p("sp"), _p("pic"), _p("grpSp"), _p("graphicFrame")
+P_TXBODY, P_CNVPR, P_NVPR, P_PH = _p("txBody"), _p("cNvPr"), _p("nvPr"), _p("ph")
+A_P, A_T, A_BR, A_TR, A_TC, A_TXBODY = _a("p"), _a("t"), _a("br"), _a("tr"), _a("tc"), _a("txBody")
+MC_ALTERNATE, MC_FALLBACK = f"{{{NS_MC}}}AlternateContent", f"{{{NS_MC}}}Fallback"
+R_EMBED = f"{{{NS_R}}}embed"
+R_ID = f"{{{NS_R}}}id"
+
+# 只需读取结构，不解析DTD与外部实体
+_PARSER = etree.XMLParser(resolve_entities=False, no_network=True, huge_tree=True)
+
+
+class Rel:
+    """部件间的关系；内部关系的 target 为包内部件路径（无前导斜杠）"""
+
+    __slots__ = ("rId", "reltype", "target", "external")
+
+    def __init__(self, rId, reltype, target, external):
+        self.rId = rId
+        self.reltype = reltype
+        self.target = target
+        self.external = external
+
+    @property
+    def is_media(self) -> bool:
+        return not self.external and (self.target.startswith("ppt/media/") or self.reltype.endswith("/image"))
+
+
+def resolve_target(source_part: str, target: str) -> str:
+    """把关系中的相对路径解析为包内部件路径"""
+    if target.startswith("/"):
+        return target[1:]
+    return posixpath.normpath(posixpath.join(posixpath.dirname(source_part), target))
+
+
+def read_rels(zf, part: str) -> dict:
+    """读取部件的关系文件，返回 {rId: Rel}；没有关系文件时为空。zf 为 ZipFile 或 PresentationXml"""
+    rels_path = posixpath.join(posixpath.dirname(part), "_rels", posixpath.basename(part) + ".rels")
+    try:
+        root = etree.fromstring(zf.read(rels_path), _PARSER)
+    except KeyError:
+        return {}
+    rels = {}
+    for el in root.iter(f"{{{NS_PKG_RELS}}}Relationship"):
+        external = el.get("TargetMode") == "External"
+        target = el.get("Target", "")
+        rels[el.get("Id")] = Rel(el.get("Id"), el.get("Type", ""), target if external else resolve_target(part, target),
+                                 external)
+    return rels
+
+
+class MediaRef:
+    """图片形状引用的媒体部件；同一文件中指向同一部件的形状共用一个对象，字节在识别时才读取"""
+
+    __slots__ = ("presentation", "partname", "size", "crc", "__weakref__")
+
+    def __init__(self, presentation, partname: str, info: zipfile.ZipInfo):
+        self.presentation = presentation
+        self.partname = partname
+        self.size = info.file_size
+        self.crc = info.CRC
+
+    def read(self) -> bytes:
+        return self.presentation.read(self.partname)
+
+
+class XmlSlide:
+    """单页幻灯片的原始XML与关系"""
+
+    def __init__(self, presentation, partname: str):
+        self.partname = partname
+        self.xml = presentation.read(partname)
+        self.rels = read_rels(presentation, partname)
+        self._presentation = presentation
+
+    def media(self, partname: str):
+        """媒体部件的引用，部件不存在时为None"""
+        return self._presentation.media(partname)
+
+    def root(self):
+        return etree.fromstring(self.xml, _PARSER)
+
+
+class PresentationXml:
+    """直接读取pptx的XML部件：按 presentation.xml 中的顺序逐页产生 XmlSlide
+
+    解析结束后调用 close()；已交出的媒体引用（MediaRef）都读取完或释放后才真正关闭文件，
+    这样图片字节与清单指纹中的CRC、大小来自同一次打开，也不必为每张图片重新解析zip目录。
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        self._zf = zipfile.ZipFile(path)
+        # 可重入：引用在持有锁时被回收也能执行释放回调
+        self._lock = threading.RLock()
+        self._media = {}
+        self._live_media = 0    # 尚未释放的 MediaRef 数
+        self._closing = False
+        try:
+            self._infos = {info.filename: info for info in self._zf.infolist()}
+            main = next((r.target for r in read_rels(self._zf, "").values()
+                         if r.reltype == RT_OFFICE_DOCUMENT), "ppt/presentation.xml")
+            rels = read_rels(self._zf, main)
+            root = etree.fromstring(self._zf.read(main), _PARSER)
+            self.slide_parts = [
+                rels[el.get(R_ID)].target
+                for el in root.iterfind(f"{_p('sldIdLst')}/{_p('sldId')}")
+                if el.get(R_ID) in rels
+            ]
+        except Exception:
+            self._zf.close()
+            raise
+
+    def __len__(self):
+        return len(self.slide_parts)
+
+    def __iter__(self):
+        for partname in self.slide_parts:
+            yield XmlSlide(self, partname)
+
+    def media(self, partname: str):
+        info = self._infos.get(partname)
+        if info is None:
+            return None
+        with self._lock:
+            ref = self._media.get(partname)
+            if ref is None:
+                ref = self._media[partname] = MediaRef(self, partname, info)
+                self._live_media += 1
+                weakref.finalize(ref, self._media_released)
+        return ref
+
+    def _media_released(self):
+        with self._lock:
+            self._live_media -= 1
+            if self._closing and not self._live_media:
+                self._zf.close()
+
+    def read(self, partname: str) -> bytes:
+        with self._lock:
+            if self._zf.fp is not None:
+                return self._zf.read(partname)
+        # 正常情况下不会发生：仍有引用时文件保持打开
+        with zipfile.ZipFile(self.path) as zf:
+            return zf.read(partname)
+
+    def close(self):
+        """解析结束：没有未释放的媒体引用时立即关闭文件，否则在最后一个引用释放时关闭"""
+        with self._lock:
+            self._closing = True
+            media, self._media = self._media, {}
+        # 在锁外释放，引用计数归零时的回调需要获取锁
+        del media
+        with self._lock:
+            if not self._live_media:
+                self._zf.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+def _int_attr(el, name):
+    value = el.get(name) if el is not None else None
+    return int(value) if value is not None else None
+
+
+def shape_meta(el, shape_type: str) -> dict:
+    """形状的编号、类型、名称与位置（EMU），位置继承自版式时为None"""
+    nv = el[0] if len(el) else None
+    c_nv_pr = nv.find(P_CNVPR) if nv is not None else None
+    nv_pr = nv.find(P_NVPR) if nv is not None else None
+    if nv_pr is not None and nv_pr.find(P_PH) is not None:
+        shape_type = "PLACEHOLDER"
+    # 图形框的位置在 p:xfrm，其他形状在 p:spPr/a:xfrm
+    xfrm = el.find(_p("xfrm")) if el.tag == P_GRAPHICFRAME else el.find(f"{_p('spPr')}/{_a('xfrm')}")
+    off = xfrm.find(_a("off")) if xfrm is not None else None
+    ext = xfrm.find(_a("ext")) if xfrm is not None else None
+    return {
+        "shape_id": _int_attr(c_nv_pr, "id"),
+        "shape_type": shape_type,
+        "name": c_nv_pr.get("name", "") if c_nv_pr is not None else "",
+        "position": {
+            "left": _int_attr(off, "x"),
+            "top": _int_attr(off, "y"),
+            "width": _int_attr(ext, "cx"),
+            "height": _int_attr(ext, "cy"),
+        },
+    }
+
+
+def paragraph_text(p) -> str:
+    """段落文本：文本串与域的 a:t 依次拼接，换行符 a:br 转为换行"""
+    return "".join("\n" if node.tag == A_BR else (node.text or "") for node in p.iter(A_T, A_BR))
+
+
+def text_body_text(tx_body) -> str:
+    """文本框中非空段落按行拼接"""
+    if tx_body is None:
+        return ""
+    texts = [t for t in (paragraph_text(p) for p in tx_body.iterfind(A_P)) if t.strip()]
+    return "\n".join(texts)
+
+
+def table_text(tbl) -> str:
+    """表格按行输出，单元格以制表符分隔；被合并的单元格跳过"""
+    rows = []
+    for tr in tbl.iterfind(A_TR):
+        cells = [
+            text_body_text(tc.find(A_TXBODY)).replace("\n", " ")
+            for tc in tr.iterfind(A_TC)
+            if tc.get("hMerge") != "1" and tc.get("vMerge") != "1"
+        ]
+        if any(c.strip() for c in cells):
+            rows.append("\t".join(cells))
+    return "\n".join(rows)
+
+
+def _text_item(el, shape_type, text):
+    return "text", dict(shape_meta(el, shape_type), kind="text", engine="pptx", text=text)
+
+
+def _walk(container, slide: XmlSlide, items: list):
+    for el in container:
+        tag = el.tag
+        if tag == P_SP:
+            text = text_body_text(el.find(P_TXBODY))
+            if text:
+                c_nv_sp_pr = el.find(f"{_p('nvSpPr')}/{_p('cNvSpPr')}")
+                is_text_box = c_nv_sp_pr is not None and c_nv_sp_pr.get("txBox") in ("1", "true")
+                items.append(_text_item(el, "TEXT_BOX" if is_text_box else "AUTO_SHAPE", text))
+        elif tag == P_PIC:
+            blip = el.find(f"{_p('blipFill')}/{_a('blip')}")
+            rel = slide.rels.get(blip.get(R_EMBED)) if blip is not None else None
+            media = slide.media(rel.target) if rel is not None and not rel.external else None
+            if media is not None:
+                items.append(("image", (media, dict(shape_meta(el, "PICTURE"), media=media.partname))))
+        elif tag == P_GRPSP:
+            _walk(el, slide, items)
+        elif tag == P_GRAPHICFRAME:
+            tbl = el.find(f"{_a('graphic')}/{_a('graphicData')}/{_a('tbl')}")
+            if tbl is not None:
+                text = table_text(tbl)
+                if text:
+                    items.append(_text_item(el, "TABLE", text))
+        elif tag == MC_ALTERNATE:
+            # 兼容内容取回退版本，其中通常是普通图片或形状
+            fallback = el.find(MC_FALLBACK)
+            if fallback is not None:
+                _walk(fallback, slide, items)
+
+
+def slide_items(slide: XmlSlide) -> list:
+    """按形状的文档顺序返回单页条目 [(kind, value), ...]，递归进入组合形状
+
+    文本框、占位符与表格的 value 即结构化结果，图片（含占位符中的图片）的 value 为 (MediaRef, 形状信息)。
+    """
+    tree = slide.root().find(f"{_p('cSld')}/{_p('spTree')}")
+    items = []
+    if tree is not None:
+        _walk(tree, slide, items)
+    return items
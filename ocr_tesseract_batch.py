@@ -0,0 +1,194 @@
+import os
+import time
+import shlex
+import queue
+import tempfile
+import threading
+import subprocess
+from concurrent.futures import Future, ThreadPoolExecutor
+
+from PIL import Image
+import pytesseract
+
+from ocr_metrics import metrics
+from ocr_budget import EngineTimeout, tesseract_timeout
+
+
+# 每次调用tesseract最多处理的图片数，不大于1时逐张调用
+DEFAULT_BATCH_SIZE = int(os.environ.get("PPTEXOCR_TESSERACT_BATCH", "16"))
+DEFAULT_MAX_WAIT = float(os.environ.get("PPTEXOCR_TESSERACT_WAIT_MS", "50")) / 1000
+# 同时运行的tesseract进程数
+DEFAULT_PROCESSES = int(os.environ.get("PPTEXOCR_TESSERACT_PROCS", "0")) or max(1, min(os.cpu_count() or 1, 4))
+
+
+def split_tsv(tsv: str, page_count: int) -> list:
+    """把多页TSV输出按 page_num 拆分为每张图片一个 image_to_data 风格的字典
+
+    与 pytesseract 的解析一致：除 text 外的列都转为整数（置信度取整）。
+    """
+    lines = tsv.splitlines()
+    if not lines:
+        raise RuntimeError("tesseract 没有输出")
+    columns = lines[0].split("\t")
+    pages = [{c: [] for c in columns} for _ in range(page_count)]
+    page_col = columns.index("page_num")
+    for line in lines[1:]:
+        if not line:
+            continue
+        values = line.split("\t")
+        # text 列可能为空，被截掉的尾部补齐
+        values += [""] * (len(columns) - len(values))
+        page = int(values[page_col]) - 1
+        if not 0 <= page < page_count:
+            raise RuntimeError(f"tesseract 输出的页号 {page + 1} 超出范围")
+        data = pages[page]
+        for column, value in zip(columns, values):
+            data[column].append(value if column == "text" else int(float(value)))
+    return pages
+
+
+def run_tesseract_batch(images: list, lang: str, config: str = "", timeout=None) -> list:
+    """把多张图片写入临时目录，用列表文件调用一次tesseract，返回每张图片的识别数据
+
+    只启动一个进程、只加载一次语言数据；结果与逐张调用 image_to_data 相同。
+    超过 timeout 秒时进程被终止并抛出 subprocess.TimeoutExpired。
+    """
+    with tempfile.TemporaryDirectory(prefix="pptexocr-tess-") as tmp:
+        names = []
+        for i, img in enumerate(images):
+            name = os.path.join(tmp, f"{i:05d}.png")
+            img.save(name, format="PNG")
+            names.append(name)
+        list_file = os.path.join(tmp, "images.txt")
+        with open(list_file, "w", encoding="utf-8") as f:
+            f.write("\n".join(names) + "\n")
+
+        cmd = [pytesseract.pytesseract.tesseract_cmd, list_file, "stdout", "-l", lang]
+        cmd += shlex.split(config) + ["tsv"]
+        proc = subprocess.run(cmd, stdout=subprocess.PIPE, stderr=subprocess.PIPE, timeout=timeout)
+        if proc.returncode != 0:
+            message = proc.stderr.decode("utf-8", "replace").strip().splitlines()
+            raise RuntimeError(f"tesseract 退出码 {proc.returncode}: {message[-1] if message else ''}")
+    return split_tsv(proc.stdout.decode("utf-8", "replace"), len(images))
+
+
+def image_to_data(img: Image.Image, lang: str, config: str = "") -> dict:
+    """逐张调用，与批量结果格式一致；超过单张图片的时间预算时抛出 EngineTimeout"""
+    try:
+        return pytesseract.image_to_data(img, lang=lang, config=config, output_type=pytesseract.Output.DICT,
+                                         timeout=tesseract_timeout() or 0)
+    except RuntimeError as e:
+        # pytesseract 超时时终止进程并抛出 RuntimeError("Tesseract process timeout")
+        if "timeout" in str(e).lower():
+            raise EngineTimeout("tesseract") from e
+        raise
+
+
+class TesseractBatcher:
+    """收集文字OCR请求，凑满一批或等待超时后合并为一次tesseract调用
+
+    相同 config 的请求才会合并；多批可在 processes 个进程中并行执行。
+    整批调用失败或超时时退回逐张调用，单张图片的错误或超时不影响同批的其他图片。
+    """
+
+    def __init__(self, lang: str, batch_size=DEFAULT_BATCH_SIZE, max_wait=DEFAULT_MAX_WAIT,
+                 processes=DEFAULT_PROCESSES):
+        self.lang = lang
+        self.batch_size = max(1, batch_size)
+        self.max_wait = max(0.0, max_wait)
+        self._queue = queue.Queue()
+        # 已提交、尚未开始识别的请求，取消时包括已分好批、在进程池中排队的请求
+        self._waiting = set()
+        self._waiting_lock = threading.Lock()
+        self._executor = ThreadPoolExecutor(max_workers=max(1, processes), thread_name_prefix="tesseract")
+        self._thread = None
+        self._start_lock = threading.Lock()
+
+    def submit(self, img: Image.Image, config: str = "") -> Future:
+        """提交一张图片，返回结果为 image_to_data 字典的Future"""
+        future = Future()
+        with self._waiting_lock:
+            metrics.observe("queue_depth_tesseract", len(self._waiting))
+            self._waiting.add(future)
+        self._ensure_started()
+        self._queue.put((config, img, future))
+        return future
+
+    def _ensure_started(self):
+        with self._start_lock:
+            if self._thread is None or not self._thread.is_alive():
+                self._thread = threading.Thread(target=self._loop, daemon=True)
+                self._thread.start()
+
+    def _loop(self):
+        while True:
+            first = self._queue.get()
+            if first is None:
+                return
+            pending = [first]
+            stop = False
+            deadline = time.monotonic() + self.max_wait
+            while len(pending) < self.batch_size:
+                timeout = deadline - time.monotonic()
+                if timeout <= 0:
+                    break
+                try:
+                    item = self._queue.get(timeout=timeout)
+                except queue.Empty:
+                    break
+                if item is None:
+                    stop = True
+                    break
+                pending.append(item)
+
+            groups = {}
+            for config, img, future in pending:
+                groups.setdefault(config, []).append((img, future))
+            for config, items in groups.items():
+                self._executor.submit(self._process, config, items)
+            if stop:
+                return
+
+    def _process(self, config, items):
+        # 已被取消的请求不再识别，其余标记为运行中后不能再取消
+        with self._waiting_lock:
+            self._waiting.difference_update(future for _, future in items)
+        items = [(img, future) for img, future in items if future.set_running_or_notify_cancel()]
+        if not items:
+            return
+        if len(items) == 1:
+            # 单张图片无需列表文件
+            self._process_one(config, *items[0])
+            return
+        try:
+            with metrics.timer("tesseract_batch_seconds"):
+                results = run_tesseract_batch([img for img, _ in items], self.lang, config,
+                                              timeout=tesseract_timeout(len(items)))
+            metrics.observe("tesseract_batch_size", len(items))
+        except Exception:
+            metrics.inc("tesseract_batch_failures")
+            for img, future in items:
+                self._process_one(config, img, future)
+            return
+        for (_, future), data in zip(items, results):
+            future.set_result(data)
+
+    def _process_one(self, config, img, future):
+        try:
+            future.set_result(image_to_data(img, self.lang, config))
+        except Exception as e:
+            future.set_exception(e)
+
+    def cancel_pending(self) -> int:
+        """取消尚未开始识别的请求，返回取消的数量；已交给tesseract进程的批次照常完成"""
+        with self._waiting_lock:
+            waiting = list(self._waiting)
+            self._waiting.clear()
+        return sum(1 for future in waiting if future.cancel())
+
+    def close(self):
+        """处理完已提交的请求后停止"""
+        if self._thread is not None and self._thread.is_alive():
+            self._queue.put(None)
+            self._thread.join()
+        self._executor.shutdown(wait=True)